@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        # Keep the in-memory detected plate set in sync with the table
+        from . import signals  # noqa: F401
+        # Tune every new database connection (SQLite PRAGMAs)
+        from . import db  # noqa: F401
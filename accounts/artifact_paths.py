@@ -0,0 +1,96 @@
+"""
+Layout of detection artifacts on disk
+
+Snapshots and text files live under LICENSE_PLATE_STORAGE_ROOT (default
+BASE_DIR) in hourly UTC shards:
+
+    snapshots/2026/10/18/09/license_plate_1792315393_3f9c1a2b7d4e.jpg
+    detected_texts/2026/10/18/09/license_plate_1792315393_3f9c1a2b7d4e.txt
+
+The file id is the epoch second followed by a random suffix, so detections
+in the same second never overwrite each other. The second also drives the
+importer's high-water mark. Paths stored in the database are relative to the
+storage root, so the root can move without a data migration.
+"""
+import calendar
+import os
+import re
+import time
+import uuid
+
+from django.conf import settings
+
+
+SNAPSHOTS_DIRNAME = 'snapshots'
+DETECTED_TEXTS_DIRNAME = 'detected_texts'
+
+# license_plate_<epoch seconds>[_<suffix>].<ext>; legacy files have no suffix
+ARTIFACT_FILENAME = re.compile(r'^license_plate_(?P<timestamp>\d+)(?:_(?P<suffix>[0-9a-f]+))?\.(?P<ext>\w+)$')
+
+
+def get_storage_root():
+    return str(getattr(settings, 'LICENSE_PLATE_STORAGE_ROOT', settings.BASE_DIR))
+
+
+def get_snapshot_dir():
+    return os.path.join(get_storage_root(), SNAPSHOTS_DIRNAME)
+
+
+def get_detected_texts_dir():
+    return os.path.join(get_storage_root(), DETECTED_TEXTS_DIRNAME)
+
+
+def shard_for(timestamp):
+    """'YYYY/MM/DD/HH' (UTC) for an epoch timestamp"""
+    return time.strftime('%Y/%m/%d/%H', time.gmtime(timestamp))
+
+
+def new_artifact_paths(timestamp=None):
+    """
+    Return (snapshot_path, text_path) for a new detection, relative to the
+    storage root
+    """
+    if timestamp is None:
+        timestamp = time.time()
+    timestamp = int(timestamp)
+    name = f'license_plate_{timestamp}_{uuid.uuid4().hex[:12]}'
+    shard = shard_for(timestamp)
+    return (os.path.join(SNAPSHOTS_DIRNAME, shard, f'{name}.jpg'),
+            os.path.join(DETECTED_TEXTS_DIRNAME, shard, f'{name}.txt'))
+
+
+def to_absolute(relative_path):
+    return os.path.join(get_storage_root(), relative_path)
+
+
+def to_relative(absolute_path):
+    """Path relative to the storage root, or unchanged if it lies outside it"""
+    root = get_storage_root()
+    relative_path = os.path.relpath(absolute_path, root)
+    if relative_path.startswith(os.pardir):
+        return absolute_path
+    return relative_path
+
+
+def shard_end(parts):
+    """
+    Epoch second at which the shard named by ``parts`` ends
+
+    ``parts`` is a prefix of (year, month, day, hour). Returns None if they
+    are not a valid shard name.
+    """
+    try:
+        values = [int(part) for part in parts]
+    except ValueError:
+        return None
+    year, month, day, hour = (values + [None, None, None, None])[:4]
+
+    try:
+        if month is None:
+            return calendar.timegm((year + 1, 1, 1, 0, 0, 0))
+        if day is None:
+            return calendar.timegm((year + month // 12, month % 12 + 1, 1, 0, 0, 0))
+        start = calendar.timegm((year, month, day, hour or 0, 0, 0))
+    except (ValueError, OverflowError):
+        return None
+    return start + (86400 if hour is None else 3600)
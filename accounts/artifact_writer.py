@@ -0,0 +1,179 @@
+"""
+Background writer for detection snapshots and text sidecars
+
+Encoding a full resolution JPEG and writing it to a slow edge disk used to
+happen on the inference thread. The detector now hands the annotated frame to
+writer threads through a bounded queue and carries on; when the queue is
+full, submit() waits, so artifacts are never dropped.
+
+Snapshots are encoded in memory with cv2.imencode and saved through the
+``snapshots`` storage (accounts.storage), so they can go to local disk or an
+object store. Text sidecars are local files, which the importer reads. The
+two are written independently: a failed snapshot upload is logged and the
+text sidecar is still written, so the importer does not lose the detection.
+
+Call flush() when every queued artifact must be on disk (management commands
+do before exiting); close() is also registered with atexit.
+
+Settings (all optional):
+    LICENSE_PLATE_ARTIFACT_QUEUE_SIZE   queued artifacts before submit() blocks, default 64
+    LICENSE_PLATE_SNAPSHOT_JPEG_QUALITY JPEG quality 0-100, default 90
+    LICENSE_PLATE_SNAPSHOT_MAX_WIDTH    downscale wider snapshots to this width, default None
+    LICENSE_PLATE_WRITE_TEXT_FILES      write the .txt sidecar, default True
+    LICENSE_PLATE_ARTIFACT_WRITER_THREADS  concurrent writers, default 1
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+
+import cv2
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from .metrics import stage_timer
+from .storage import get_snapshot_storage
+
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class ArtifactWriter:
+    def __init__(self, queue_size=None, jpeg_quality=None, max_width=None, write_text=None,
+                 threads=None, storage=None):
+        if queue_size is None:
+            queue_size = getattr(settings, 'LICENSE_PLATE_ARTIFACT_QUEUE_SIZE', 64)
+        if jpeg_quality is None:
+            jpeg_quality = getattr(settings, 'LICENSE_PLATE_SNAPSHOT_JPEG_QUALITY', 90)
+        if max_width is None:
+            max_width = getattr(settings, 'LICENSE_PLATE_SNAPSHOT_MAX_WIDTH', None)
+        if write_text is None:
+            write_text = getattr(settings, 'LICENSE_PLATE_WRITE_TEXT_FILES', True)
+        if threads is None:
+            threads = getattr(settings, 'LICENSE_PLATE_ARTIFACT_WRITER_THREADS', 1)
+
+        self.jpeg_quality = int(jpeg_quality)
+        self.max_width = max_width
+        self.write_text = write_text
+        self.storage = storage or get_snapshot_storage()
+        self.failures = 0
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = False
+        # Text shard directories already created, to skip repeated makedirs calls
+        self._known_dirs = set()
+        self._threads = [
+            threading.Thread(target=self._run, name=f'plate-artifact-writer-{index}', daemon=True)
+            for index in range(max(int(threads), 1))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, frame, snapshot_name, text=None, text_path=None):
+        """
+        Queue a snapshot (and optionally its text sidecar) for writing
+
+        ``snapshot_name`` is the name in the snapshot storage and
+        ``text_path`` a local path. Blocks while the queue is full. The
+        caller must not modify ``frame`` afterwards.
+        """
+        if self._closed:
+            raise RuntimeError("Artifact writer is closed")
+        self._queue.put((frame, snapshot_name, text, text_path))
+
+    def flush(self):
+        """Wait until everything queued so far has been written"""
+        self._queue.join()
+
+    def close(self):
+        """Write what is queued, then stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def prepare_snapshot(self, frame):
+        """Downscale the frame if it is wider than max_width"""
+        if self.max_width and frame.shape[1] > self.max_width:
+            scale = self.max_width / frame.shape[1]
+            size = (self.max_width, max(int(round(frame.shape[0] * scale)), 1))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        return frame
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                self._write(*item)
+            except Exception:
+                self.failures += 1
+                logger.exception("Failed to write detection artifacts")
+            finally:
+                self._queue.task_done()
+
+    def _ensure_dir(self, path):
+        directory = os.path.dirname(path)
+        if directory not in self._known_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._known_dirs.add(directory)
+
+    def _write(self, frame, snapshot_name, text, text_path):
+        try:
+            self._write_snapshot(frame, snapshot_name)
+        except Exception:
+            self.failures += 1
+            logger.exception("Failed to write snapshot %s", snapshot_name)
+
+        if self.write_text and text_path is not None:
+            try:
+                self._write_text(text, text_path)
+            except Exception:
+                self.failures += 1
+                logger.exception("Failed to write text file %s", text_path)
+
+    def _write_snapshot(self, frame, snapshot_name):
+        with stage_timer('snapshot_encode'):
+            frame = self.prepare_snapshot(frame)
+            ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise IOError(f"Could not encode snapshot {snapshot_name}")
+        with stage_timer('snapshot_write'):
+            self.storage.save(snapshot_name, ContentFile(buffer.tobytes()))
+
+    def _write_text(self, text, text_path):
+        with stage_timer('text_write'):
+            self._ensure_dir(text_path)
+            # Write then rename, so the importer never reads half a file
+            tmp_path = text_path + '.tmp'
+            with open(tmp_path, 'w') as text_file:
+                text_file.write(text or '')
+            os.replace(tmp_path, text_path)
+
+
+_lock = threading.Lock()
+_writer = None
+
+
+def get_artifact_writer():
+    """The process-wide writer, started on first use"""
+    global _writer
+    if _writer is None:
+        with _lock:
+            if _writer is None:
+                _writer = ArtifactWriter()
+                atexit.register(_writer.close)
+    return _writer
+
+
+def flush_artifacts():
+    """Block until every queued artifact is on disk (no-op if nothing was queued)"""
+    if _writer is not None:
+        _writer.flush()
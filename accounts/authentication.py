@@ -0,0 +1,130 @@
+"""
+Request identity for the plate APIs, resolved with as few queries as possible
+
+Token authentication normally loads the token and its user on every request
+(one query). CachedTokenAuthentication keeps what it needs about the user in
+a small in-process cache for LICENSE_PLATE_AUTH_CACHE_TTL seconds, so
+repeated requests with the same token skip that query. Saving a user (e.g.
+VerifyOTP flipping is_verified) or deleting a token evicts its entries in
+this process through signals (see accounts.signals); other processes see
+the change once their entries expire.
+
+The plate APIs identify the user by the "email" in the request.
+resolve_user() looks that user up once per request and keeps it on the
+request, so IsVerifiedUser and the view share the result. When the email is
+the token's own user, no query is made at all.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import router
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .models import User
+
+
+# Fields kept per token, covering every field the views and permissions read;
+# any other field costs a query on first access
+CACHED_USER_FIELDS = ['id', 'email', 'is_verified', 'is_active', 'is_staff', 'is_superuser']
+
+
+class TokenIdentityCache:
+    """token key -> (expires_at, {field: value} of CACHED_USER_FIELDS)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._keys_by_user = {}
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'LICENSE_PLATE_AUTH_CACHE_TTL', 30)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, values = entry
+        if time.monotonic() >= expires_at:
+            self.evict(key)
+            return None
+        return values
+
+    def set(self, key, values):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, values)
+            self._keys_by_user.setdefault(values['id'], set()).add(key)
+
+    def evict(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                user_id = entry[1]['id']
+                keys = self._keys_by_user.get(user_id)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._keys_by_user[user_id]
+
+    def evict_user(self, user_id):
+        with self._lock:
+            for key in self._keys_by_user.pop(user_id, ()):
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+
+token_identities = TokenIdentityCache()
+
+
+def _cached_user(values):
+    # Only the cached fields are set; any other field is loaded from the
+    # database if a view reads it. from_db wants them in model field order.
+    field_names = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db(router.db_for_read(User), field_names, [values[name] for name in field_names])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that skips the token query while it is cached"""
+
+    def authenticate_credentials(self, key):
+        values = token_identities.get(key)
+        if values is not None:
+            user = _cached_user(values)
+            return user, Token(key=key, user=user)
+
+        user, token = super().authenticate_credentials(key)
+        token_identities.set(key, {field: getattr(user, field) for field in CACHED_USER_FIELDS})
+        return user, token
+
+
+_UNRESOLVED = object()
+
+
+def resolve_user(request):
+    """
+    The user named by the request's "email", or None if there is no such
+    user. Looked up at most once per request.
+    """
+    user = getattr(request, '_plate_api_user', _UNRESOLVED)
+    if user is not _UNRESOLVED:
+        return user
+
+    email = request.data.get('email') or request.query_params.get('email')
+    user = None
+    if email:
+        authenticated = getattr(request, 'user', None)
+        if authenticated is not None and authenticated.is_authenticated and authenticated.email == email:
+            user = authenticated
+        else:
+            user = User.objects.filter(email=email).first()
+
+    request._plate_api_user = user
+    return user
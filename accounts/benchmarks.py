@@ -0,0 +1,381 @@
+"""
+Benchmarks for the detection and API hot paths
+
+Run through ``python manage.py benchmark``. Each benchmark times individual
+calls and reports throughput, p50/p95/p99 latency and the process's peak RSS
+so far; results are written as JSON so runs can be compared (--compare).
+
+* process_frame  LicensePlateDetector._process_frame with StubModel, a fake
+                 model returning synthetic character boxes, so no weights or
+                 ultralytics are needed
+* images         detect_batch over a directory of generated JPEGs, as
+                 ``detect_license_plates --mode images`` does, including the
+                 DB rows and snapshot writes
+* verify         POST /api/auth/verify-plate
+* list           GET /api/auth/ai-detected-plates, following the cursor
+* concurrent     several threads mixing verify-plate calls with single-row
+                 detection inserts, as web workers and a detector process do;
+                 run it once per DATABASE_PROFILE (and with --sqlite-defaults)
+                 and compare the results
+
+The API benchmarks run against a separate SQLite database seeded with
+AIDetectedLicense rows (see seed_database), never the development one.
+"""
+import json
+import os
+import platform
+import random
+import resource
+import string
+import subprocess
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.db import OperationalError, connection, connections, transaction
+from django.utils import timezone
+
+from accounts.db import get_sqlite_pragmas
+from accounts.license_detector import LicensePlateDetector
+from accounts.models import AIDetectedLicense, User
+from accounts.plates import normalize_plate
+from accounts.roi import get_inference_size, get_roi
+
+
+BENCHMARK_EMAIL = 'benchmark@example.com'
+STUB_LABELS = list('0123456789ABCDEFGHJKLMNPRSTUVWXYZ')
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MiB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def summarize(latencies, elapsed, units):
+    """Statistics for per-call latencies (seconds) and ``units`` of work done"""
+    latencies_ms = np.asarray(latencies, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99]) if len(latencies_ms) else (0.0, 0.0, 0.0)
+    return {
+        'calls': len(latencies_ms),
+        'units': units,
+        'elapsed_s': round(elapsed, 4),
+        'throughput_per_s': round(units / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'mean_ms': round(float(latencies_ms.mean()), 3) if len(latencies_ms) else 0.0,
+        'max_ms': round(float(latencies_ms.max()), 3) if len(latencies_ms) else 0.0,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def measure(calls, warmup=0):
+    """
+    Time each callable in ``calls``; the first ``warmup`` are not counted
+
+    Each callable returns the units of work it did (e.g. images), or None
+    for one.
+    """
+    calls = list(calls)
+    for call in calls[:warmup]:
+        call()
+
+    latencies = []
+    units = 0
+    started = time.perf_counter()
+    for call in calls[warmup:]:
+        call_started = time.perf_counter()
+        done = call()
+        latencies.append(time.perf_counter() - call_started)
+        units += 1 if done is None else done
+    return summarize(latencies, time.perf_counter() - started, units)
+
+
+class StubModel:
+    """
+    Stand-in for the YOLO model returning synthetic detections
+
+    Every image gets one plate of ``characters`` boxes in a row near its
+    centre plus ``noise`` boxes below the confidence threshold, in the shape
+    ultralytics results have (``result.boxes.xyxy/cls/conf``).
+    """
+
+    def __init__(self, characters=7, noise=3, num_classes=len(STUB_LABELS), seed=0):
+        self.characters = characters
+        self.noise = noise
+        self.num_classes = num_classes
+        self.random = np.random.RandomState(seed)
+
+    def __call__(self, source, **kwargs):
+        images = source if isinstance(source, list) else [source]
+        return [self._result(image.shape[:2]) for image in images]
+
+    def _result(self, shape):
+        height, width = shape
+        char_width = max(width * 0.03, 2.0)
+        char_height = char_width * 2
+        x_start = width / 2 - char_width * self.characters / 2
+        y_min = height / 2 - char_height / 2
+
+        x_min = x_start + np.arange(self.characters) * char_width * 1.1
+        plate = np.stack([x_min, np.full(self.characters, y_min),
+                          x_min + char_width, np.full(self.characters, y_min + char_height)], axis=1)
+        noise_corner = self.random.uniform(0, 1, (self.noise, 2)) * [width - char_width, height - char_height]
+        noise = np.hstack([noise_corner, noise_corner + [char_width, char_height]])
+
+        count = self.characters + self.noise
+        return SimpleNamespace(boxes=SimpleNamespace(
+            xyxy=np.vstack([plate, noise]).astype(np.float32),
+            cls=self.random.randint(0, self.num_classes, count).astype(np.float32),
+            conf=np.concatenate([self.random.uniform(0.5, 0.99, self.characters),
+                                 self.random.uniform(0.01, 0.1, self.noise)]).astype(np.float32),
+        ))
+
+
+class StubDetector(LicensePlateDetector):
+    """LicensePlateDetector running StubModel instead of the real weights"""
+
+    def __init__(self, model=None, source=None):
+        self.stub_model = model or StubModel()
+        self.engine = 'stub'
+        self.class_labels = STUB_LABELS
+        self.label_array = np.array(STUB_LABELS)
+        self.min_confidence = getattr(settings, 'LICENSE_PLATE_MIN_CONFIDENCE', 0.25)
+        self.roi = get_roi(source)
+        self.inference_size = get_inference_size()
+        self.source_name = ''
+
+    @property
+    def model(self):
+        return self.stub_model
+
+
+def synthetic_frames(count, width, height, seed=0):
+    """Noise frames of the given size"""
+    random_state = np.random.RandomState(seed)
+    return [random_state.randint(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def generate_images(directory, count, width, height, seed=0):
+    """Write ``count`` JPEGs into ``directory`` and return their paths"""
+    paths = []
+    for index, frame in enumerate(synthetic_frames(count, width, height, seed)):
+        path = os.path.join(directory, f'bench_{index:05d}.jpg')
+        cv2.imwrite(path, frame)
+        paths.append(path)
+    return paths
+
+
+def random_plate(random_state):
+    letters = ''.join(random_state.choice(string.ascii_uppercase) for _ in range(3))
+    digits = ''.join(random_state.choice(string.digits) for _ in range(4))
+    return f'{letters} {digits}'
+
+
+def seed_database(rows, chunk_size=10000, seed=0, stdout=None):
+    """
+    Make sure there are at least ``rows`` AIDetectedLicense rows and a
+    verified benchmark user; returns a sample of the seeded plate numbers
+    """
+    random_state = random.Random(seed)
+    User.objects.get_or_create(email=BENCHMARK_EMAIL, defaults={'is_verified': True})
+
+    existing = AIDetectedLicense.objects.count()
+    missing = max(rows - existing, 0)
+    if missing and stdout:
+        stdout.write(f'Seeding {missing} detections ({existing} already there)...')
+
+    while missing:
+        batch = []
+        for _ in range(min(chunk_size, missing)):
+            plate_number = random_plate(random_state)
+            # bulk_create skips save(), so plate_key is set here
+            batch.append(AIDetectedLicense(plate_number=plate_number, plate_key=normalize_plate(plate_number),
+                                           snapshot_path=None))
+        with transaction.atomic():
+            AIDetectedLicense.objects.bulk_create(batch)
+        missing -= len(batch)
+
+    # Sample plates for verify lookups
+    return list(AIDetectedLicense.objects.order_by('?').values_list('plate_number', flat=True)[:1000])
+
+
+def bench_process_frame(detector, frames, iterations, warmup=5):
+    def process(frame):
+        # _process_frame draws on the frame, so work on a copy
+        detector._process_frame(frame.copy())
+
+    calls = [lambda frame=frames[index % len(frames)]: process(frame) for index in range(iterations + warmup)]
+    return measure(calls, warmup=warmup)
+
+
+def bench_images(detector, paths, batch_size):
+    """detect_batch over ``paths``, one timed call per batch, artifacts flushed at the end"""
+    from accounts.artifact_writer import flush_artifacts
+
+    def run_batch(chunk):
+        detections = detector.detect_batch(chunk, batch_size=batch_size)
+        errors = [detection['error'] for detection in detections if detection['error']]
+        if errors:
+            raise RuntimeError(errors[0])
+        return len(chunk)
+
+    calls = [lambda chunk=paths[start:start + batch_size]: run_batch(chunk)
+             for start in range(0, len(paths), batch_size)]
+    # The last call waits for the background writer, so its time counts
+    calls.append(lambda: flush_artifacts() or 0)
+    return measure(calls)
+
+
+def _check_response(response, expected):
+    status = response.json().get('status')
+    if status not in expected:
+        raise RuntimeError(f'Unexpected API response: {response.content[:200]!r}')
+
+
+def bench_verify(client, plates, iterations, warmup=20, seed=0):
+    """Half of the lookups are seeded plates, half random (mostly misses)"""
+    random_state = random.Random(seed)
+
+    def verify(plate_number):
+        response = client.post('/api/auth/verify-plate',
+                               {'email': BENCHMARK_EMAIL, 'plate_number': plate_number}, format='json')
+        _check_response(response, (200, 404))
+
+    calls = []
+    for index in range(iterations + warmup):
+        plate_number = random_state.choice(plates) if index % 2 else random_plate(random_state)
+        calls.append(lambda plate_number=plate_number: verify(plate_number))
+    return measure(calls, warmup=warmup)
+
+
+def bench_list(client, iterations, page_size=100, warmup=5):
+    """Page through the listing, restarting from the first page when it runs out"""
+    cursor = {'next': None}
+
+    def list_page():
+        params = {'email': BENCHMARK_EMAIL, 'limit': page_size}
+        if cursor['next']:
+            params['cursor'] = cursor['next']
+        response = client.get('/api/auth/ai-detected-plates', params)
+        _check_response(response, (200,))
+        cursor['next'] = response.json().get('next_cursor')
+
+    return measure([list_page] * (iterations + warmup), warmup=warmup)
+
+
+def bench_concurrent(plates, threads, operations, insert_ratio=0.5, seed=0):
+    """
+    ``threads`` workers each run ``operations`` calls, a verify-plate request
+    or an AIDetectedLicense insert in its own transaction. Failed calls
+    (e.g. "database is locked") are counted, not raised.
+    """
+    from rest_framework.test import APIClient
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(index):
+        random_state = random.Random(seed + index)
+        client = APIClient()
+        own_latencies = []
+        own_errors = 0
+        try:
+            for _ in range(operations):
+                started = time.perf_counter()
+                try:
+                    if random_state.random() < insert_ratio:
+                        AIDetectedLicense.objects.create(plate_number=random_plate(random_state))
+                    else:
+                        response = client.post('/api/auth/verify-plate', {
+                            'email': BENCHMARK_EMAIL,
+                            'plate_number': random_state.choice(plates) if plates else random_plate(random_state),
+                        }, format='json')
+                        if response.json().get('status') not in (200, 404):
+                            own_errors += 1
+                except OperationalError:
+                    own_errors += 1
+                own_latencies.append(time.perf_counter() - started)
+        finally:
+            connections.close_all()
+            with lock:
+                latencies.extend(own_latencies)
+                errors.append(own_errors)
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    stats = summarize(latencies, time.perf_counter() - started, len(latencies))
+    stats['threads'] = threads
+    stats['errors'] = sum(errors)
+    return stats
+
+
+def environment():
+    """What the results were measured on"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, cwd=settings.BASE_DIR, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+
+    import django
+    return {
+        'created': timezone.now().isoformat(),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'database': connection.vendor,
+        'database_profile': getattr(settings, 'DATABASE_PROFILE', None),
+        'sqlite_pragmas': get_sqlite_pragmas() if connection.vendor == 'sqlite' else None,
+    }
+
+
+def compare(results, baseline, max_regression=None):
+    """
+    Compare two result documents
+
+    Returns (lines, regressions): a human readable line per benchmark found
+    in both, and the names whose p95 or throughput got worse by more than
+    ``max_regression`` percent.
+    """
+    lines = []
+    regressions = []
+    for name, current in results['benchmarks'].items():
+        previous = baseline.get('benchmarks', {}).get(name)
+        if not previous:
+            continue
+        p95_change = _change(previous['p95_ms'], current['p95_ms'])
+        throughput_change = _change(previous['throughput_per_s'], current['throughput_per_s'])
+        lines.append(f'{name}: p95 {previous["p95_ms"]} -> {current["p95_ms"]} ms ({p95_change:+.1f}%), '
+                     f'throughput {previous["throughput_per_s"]} -> {current["throughput_per_s"]}/s '
+                     f'({throughput_change:+.1f}%)')
+        if max_regression is not None and (p95_change > max_regression or -throughput_change > max_regression):
+            regressions.append(name)
+    return lines, regressions
+
+
+def _change(before, after):
+    return (after - before) / before * 100 if before else 0.0
+
+
+def load_results(path):
+    with open(path) as results_file:
+        return json.load(results_file)
@@ -0,0 +1,46 @@
+"""
+Per-connection database tuning
+
+The detector processes and the web workers write to the same database. On
+SQLite the defaults (rollback journal, a full fsync per commit, no busy
+wait) make concurrent writers fail with "database is locked", so every new
+SQLite connection runs the PRAGMAs in SQLITE_PRAGMAS:
+
+    journal_mode=WAL       readers no longer block the writer, or vice versa
+    synchronous=NORMAL     fsync at checkpoints instead of every commit (safe in WAL)
+    busy_timeout=<ms>      wait for the write lock instead of failing at once
+    mmap_size=<bytes>      read pages through a memory map
+
+Set SQLITE_PRAGMAS in settings to override them, or to {} to keep SQLite's
+defaults. Postgres needs nothing here; see the DATABASE_PROFILE switch in
+settings.
+
+journal_mode=WAL is persistent: it is written into the database file's
+header, and SQLite keeps -wal/-shm files next to it. The dev db.sqlite3 and
+those files are git-ignored for that reason.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+}
+
+
+def get_sqlite_pragmas():
+    return getattr(settings, 'SQLITE_PRAGMAS', DEFAULT_SQLITE_PRAGMAS)
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in get_sqlite_pragmas().items():
+            # Names and values come from settings, never from requests
+            cursor.execute(f'PRAGMA {name}={value}')
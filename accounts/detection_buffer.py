@@ -0,0 +1,231 @@
+"""
+Write-behind buffer for AIDetectedLicense rows
+
+Creating each detection with its own objects.create() commits one
+transaction per plate, which on SQLite means one fsync per plate. The
+detector adds rows to this buffer instead, and they are written with a
+single bulk_create per flush:
+
+* as soon as LICENSE_PLATE_DB_BATCH_SIZE rows are waiting (in the thread
+  that added the last one),
+* by a background thread once the oldest waiting row is
+  LICENSE_PLATE_DB_FLUSH_INTERVAL_MS old,
+* whenever flush_detections() is called. One-shot detections, batches and
+  the end of a stream call it, and so do management commands before
+  exiting. close() is also registered with atexit.
+
+If a batch cannot be written, its rows are retried one by one, so a single
+row the database rejects (e.g. too long for the column) does not hold up the
+rest; rows that still fail on their own are logged and dropped. If no row
+can be written at all the database is probably unavailable (e.g. "database
+is locked"), and the rows are kept for the next flush, up to
+LICENSE_PLATE_DB_MAX_PENDING rows (the oldest are dropped beyond that).
+add() and the background thread only log such failures (add() then waits
+for another batch before trying again), so an outage never reaches the
+detector; an explicit flush() raises only once rows have been dropped
+since the last successful write.
+
+bulk_create skips save() and the post_save signal, so plate_key is set here
+and the in-memory plate set (accounts.plate_cache) is updated after commit.
+detection_timestamp is still set by the database write, so it can trail the
+detection by up to the flush interval.
+
+Settings (all optional):
+    LICENSE_PLATE_DB_BATCH_SIZE         rows per bulk insert, default 100
+    LICENSE_PLATE_DB_FLUSH_INTERVAL_MS  max wait before a row is written, default 500
+    LICENSE_PLATE_DB_MAX_PENDING        max rows kept while writes fail, default 10000
+"""
+import atexit
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+
+from .metrics import stage_timer
+from .models import AIDetectedLicense
+from .plate_cache import detected_plates
+from .plates import normalize_plate
+
+
+class DetectionBuffer:
+    def __init__(self, batch_size=None, flush_interval_ms=None, max_pending=None):
+        if batch_size is None:
+            batch_size = getattr(settings, 'LICENSE_PLATE_DB_BATCH_SIZE', 100)
+        if flush_interval_ms is None:
+            flush_interval_ms = getattr(settings, 'LICENSE_PLATE_DB_FLUSH_INTERVAL_MS', 500)
+        if max_pending is None:
+            max_pending = getattr(settings, 'LICENSE_PLATE_DB_MAX_PENDING', 10000)
+
+        self.batch_size = max(int(batch_size), 1)
+        self.max_pending = max(int(max_pending), self.batch_size)
+        # 0 disables the background flush; rows then wait for a full batch
+        # or an explicit flush()
+        self.flush_interval = flush_interval_ms / 1000 if flush_interval_ms else None
+        self.rows_written = 0
+        self.flushes = 0
+        self.failures = 0
+        self.dropped = 0
+
+        self._pending = []
+        self._oldest = None
+        # add() writes once this many rows are waiting; raised after a
+        # failed write so a database outage isn't retried on every add
+        self._flush_at = self.batch_size
+        # Rows dropped by _trim() since the last successful write
+        self._overflowed = 0
+        self._lock = threading.Lock()
+        # Held while writing, so flush() returns only once earlier rows are in
+        self._write_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = None
+        if self.flush_interval:
+            self._thread = threading.Thread(target=self._run, name='plate-detection-buffer', daemon=True)
+            self._thread.start()
+
+    def add(self, plate_number, snapshot_path=None, source=''):
+        """Queue one detection; writes the batch if it is now full"""
+        if self._closed.is_set():
+            raise RuntimeError("Detection buffer is closed")
+        row = AIDetectedLicense(plate_number=plate_number, plate_key=normalize_plate(plate_number),
+                                snapshot_path=snapshot_path, source=source)
+        with self._lock:
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append(row)
+            self._trim()
+            full = len(self._pending) >= self._flush_at
+        if full:
+            self._flush()
+
+    def flush(self):
+        """
+        Write every row added so far; returns how many were written
+
+        If nothing could be written the rows are kept for the next attempt.
+        Raises the write error only if rows have been dropped to stay within
+        max_pending since the last successful write.
+        """
+        written, error, dropped = self._flush()
+        if error is not None and dropped:
+            raise error
+        return written
+
+    def close(self):
+        """Stop the background thread and write what is left"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        left = self.pending()
+        if left:
+            print(f"Detection buffer closed with {left} rows that could not be written")
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _flush(self):
+        """
+        Write the pending rows; returns (rows written, error if nothing
+        could be written, rows dropped since the last successful write)
+        """
+        with self._write_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+                self._oldest = None
+            if not rows:
+                return 0, None, 0
+            try:
+                self._write(rows)
+                self._flush_at = self.batch_size
+                self._overflowed = 0
+                return len(rows), None, 0
+            except Exception as e:
+                self.failures += 1
+                batch_error = e
+
+            # Find the rows the database rejects
+            written, rejected = 0, []
+            for row in rows:
+                try:
+                    self._write([row])
+                    written += 1
+                except OperationalError as e:
+                    if not written:
+                        # The database itself is failing, not this row
+                        break
+                    rejected.append((row, e))
+                except Exception as e:
+                    rejected.append((row, e))
+
+            if not written:
+                # Nothing went in; keep the rows for the next attempt
+                with self._lock:
+                    self._pending[:0] = rows
+                    self._oldest = self._oldest or time.monotonic()
+                    self._trim()
+                    dropped = self._overflowed
+                    self._flush_at = min(len(self._pending) + self.batch_size, self.max_pending)
+                print(f"Failed to write {len(rows)} buffered detections, keeping them for the next flush: {batch_error}")
+                return 0, batch_error, dropped
+
+            for row, error in rejected:
+                print(f"Dropping detection {row.plate_number!r} the database rejected: {error}")
+            self.dropped += len(rejected)
+            self._flush_at = self.batch_size
+            self._overflowed = 0
+            return written, None, 0
+
+    def _trim(self):
+        # Called with self._lock held
+        excess = len(self._pending) - self.max_pending
+        if excess > 0:
+            print(f"Detection buffer full, dropping the {excess} oldest rows")
+            del self._pending[:excess]
+            self.dropped += excess
+            self._overflowed += excess
+
+    def _write(self, rows):
+        with stage_timer('db_insert'), transaction.atomic():
+            AIDetectedLicense.objects.bulk_create(rows, batch_size=self.batch_size)
+            plate_keys = [row.plate_key for row in rows]
+            transaction.on_commit(lambda: detected_plates.add_many(plate_keys))
+        self.rows_written += len(rows)
+        self.flushes += 1
+
+    def _run(self):
+        try:
+            while not self._closed.wait(self.flush_interval / 2):
+                with self._lock:
+                    due = self._oldest is not None and time.monotonic() - self._oldest >= self.flush_interval
+                if due:
+                    # Failures are logged and the rows kept
+                    self._flush()
+        finally:
+            # This thread opened its own DB connection
+            connections.close_all()
+
+
+_lock = threading.Lock()
+_buffer = None
+
+
+def get_detection_buffer():
+    """The process-wide buffer, started on first use"""
+    global _buffer
+    if _buffer is None:
+        with _lock:
+            if _buffer is None:
+                _buffer = DetectionBuffer()
+                atexit.register(_buffer.close)
+    return _buffer
+
+
+def flush_detections():
+    """Write every buffered detection now (no-op if nothing was buffered)"""
+    if _buffer is not None:
+        return _buffer.flush()
+    return 0
@@ -0,0 +1,81 @@
+"""
+Streaming NDJSON/CSV export of detections and user submitted plates
+
+Rows are read with ``.values_list().iterator(chunk_size=...)`` and encoded as
+they are produced, so memory stays flat whatever the table size.
+"""
+import csv
+import json
+from datetime import datetime
+
+from .models import AIDetectedLicense, LicensePlate
+
+
+EXPORTS = {
+    'detections': (AIDetectedLicense, 'detection_timestamp',
+                   ['id', 'plate_number', 'detection_timestamp', 'snapshot_path', 'source']),
+    'plates': (LicensePlate, 'timestamp',
+               ['id', 'plate_number', 'user__email', 'timestamp', 'verified']),
+}
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# Encoded rows are joined into one chunk before being handed to the caller
+ROWS_PER_CHUNK = 500
+
+
+class _Echo:
+    """File-like object whose write() just returns the value, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def _to_text(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def export_rows(model_name, since=None, chunk_size=2000):
+    """Return (fields, row iterator) for one of EXPORTS"""
+    model, timestamp_field, fields = EXPORTS[model_name]
+    queryset = model.objects.order_by('id')
+    if since is not None:
+        queryset = queryset.filter(**{f'{timestamp_field}__gte': since})
+    return fields, queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+def iter_ndjson(fields, rows):
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps(dict(zip(fields, map(_to_text, row)))))
+        if len(chunk) >= ROWS_PER_CHUNK:
+            yield '\n'.join(chunk) + '\n'
+            chunk = []
+    if chunk:
+        yield '\n'.join(chunk) + '\n'
+
+
+def iter_csv(fields, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    chunk = []
+    for row in rows:
+        chunk.append(writer.writerow([_to_text(value) for value in row]))
+        if len(chunk) >= ROWS_PER_CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def stream_export(model_name, export_format, since=None, chunk_size=2000):
+    """Yield the encoded export as text chunks"""
+    fields, rows = export_rows(model_name, since=since, chunk_size=chunk_size)
+    if export_format == 'csv':
+        return iter_csv(fields, rows)
+    return iter_ndjson(fields, rows)
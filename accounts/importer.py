@@ -0,0 +1,203 @@
+"""
+Incremental import of detected plate text files into AIDetectedLicense
+
+The detector writes one ``license_plate_<timestamp>_<id>.txt`` per detection,
+with one plate number per line, into hourly shards (see
+accounts.artifact_paths). An import reads only the files newer than the
+high-water mark left by the previous run (kept in ``.import_state.json`` next
+to the text files), skipping whole shards that are older. It skips plates
+that are already known and writes the rest with bulk_create in a single
+transaction.
+
+The table has no unique key to fall back on, so plates are deduplicated by
+that lookup alone. Runs on the same directory therefore hold an exclusive
+lock on ``.import_state.lock`` from reading the state to saving it; a run
+that crashed before saving its state is safe to repeat, since the rows it
+inserted are then known.
+
+The mark comes from the timestamp in the file names, but the background
+writer can create a file well after that time (e.g. behind a slow snapshot
+upload). So each run also rescans the LICENSE_PLATE_IMPORT_LOOKBACK_SECONDS
+before the mark, and the state records the files already imported in that
+window so they are not read twice.
+"""
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.files import locks
+from django.db import transaction
+
+from .artifact_paths import ARTIFACT_FILENAME, get_detected_texts_dir, get_snapshot_dir, shard_end, to_relative
+from .models import AIDetectedLicense
+from .plate_cache import detected_plates
+from .plates import normalize_plate
+from .storage import get_snapshot_storage
+
+
+STATE_FILENAME = '.import_state.json'
+LOCK_FILENAME = '.import_state.lock'
+
+
+def get_default_dirs():
+    return get_detected_texts_dir(), get_snapshot_dir()
+
+
+def load_state(detected_dir):
+    try:
+        with open(os.path.join(detected_dir, STATE_FILENAME), 'r') as state_file:
+            return json.load(state_file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_state(detected_dir, state):
+    # Write then rename so a crash never leaves a truncated state file
+    state_path = os.path.join(detected_dir, STATE_FILENAME)
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w') as state_file:
+        json.dump(state, state_file)
+    os.replace(tmp_path, state_path)
+
+
+def iter_new_text_files(detected_dir, after_timestamp, until_timestamp, _shard=()):
+    """
+    Yield (timestamp, relative path) for text files in (after_timestamp, until_timestamp]
+
+    Walks the YYYY/MM/DD/HH shards, skipping any shard that ended before the
+    high-water mark, plus legacy files at the top level. The timestamp comes
+    from the file name; only files without one (legacy names) are stat'ed for
+    their mtime.
+    """
+    with os.scandir(os.path.join(detected_dir, *_shard)) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                if len(_shard) >= 4:
+                    continue
+                end = shard_end(_shard + (entry.name,))
+                if end is not None and end > after_timestamp:
+                    yield from iter_new_text_files(detected_dir, after_timestamp, until_timestamp,
+                                                   _shard + (entry.name,))
+                continue
+
+            match = ARTIFACT_FILENAME.match(entry.name)
+            if match and match.group('ext') == 'txt':
+                timestamp = int(match.group('timestamp'))
+            elif entry.name.endswith('.txt'):
+                timestamp = int(entry.stat().st_mtime)
+            else:
+                continue
+
+            if after_timestamp < timestamp <= until_timestamp:
+                yield timestamp, os.path.join(*_shard, entry.name)
+
+
+def import_detected_texts(detected_dir=None, snapshot_dir=None, full=False,
+                          chunk_size=1000, settle_seconds=None, lookback_seconds=None):
+    """
+    Import text files written since the last run
+
+    ``full`` ignores the high-water mark and rescans everything. Files from
+    the last ``settle_seconds`` are left for the next run, since the detector
+    may still be writing them. Files named up to ``lookback_seconds`` before
+    the mark that were not imported yet are picked up too. Returns a dict of
+    counters.
+    """
+    default_detected_dir, default_snapshot_dir = get_default_dirs()
+    detected_dir = detected_dir or default_detected_dir
+    snapshot_dir = snapshot_dir or default_snapshot_dir
+    if settle_seconds is None:
+        settle_seconds = getattr(settings, 'LICENSE_PLATE_IMPORT_SETTLE_SECONDS', 5)
+    if lookback_seconds is None:
+        lookback_seconds = getattr(settings, 'LICENSE_PLATE_IMPORT_LOOKBACK_SECONDS', 3600)
+
+    if not os.path.isdir(detected_dir):
+        raise FileNotFoundError(f'Directory {detected_dir} not found')
+
+    # Another run would find the same plates missing and insert them twice
+    with open(os.path.join(detected_dir, LOCK_FILENAME), 'a') as lock_file:
+        locks.lock(lock_file, locks.LOCK_EX)
+        try:
+            return _import(detected_dir, snapshot_dir, full, chunk_size, settle_seconds, lookback_seconds)
+        finally:
+            locks.unlock(lock_file)
+
+
+def _import(detected_dir, snapshot_dir, full, chunk_size, settle_seconds, lookback_seconds):
+    state = {} if full else load_state(detected_dir)
+    after_timestamp = state.get('last_timestamp', -1)
+    until_timestamp = int(time.time()) - settle_seconds
+    # relative path -> name timestamp of files imported within the lookback
+    recent_files = state.get('recent_files', {})
+    scan_from = after_timestamp - lookback_seconds if after_timestamp >= 0 else after_timestamp
+
+    snapshot_storage = get_snapshot_storage()
+
+    # Read the new files, deduplicating within this run
+    candidates = {}
+    scanned = 0
+    plates_read = 0
+    for timestamp, relative_path in sorted(iter_new_text_files(detected_dir, scan_from, until_timestamp)):
+        if relative_path in recent_files:
+            continue
+        recent_files[relative_path] = timestamp
+        scanned += 1
+        # One plate per line (frames with several vehicles have several)
+        with open(os.path.join(detected_dir, relative_path), 'r') as file:
+            plate_numbers = [line.strip().upper() for line in file]
+
+        snapshot_path = None
+        for plate_number in plate_numbers:
+            plate_key = normalize_plate(plate_number)
+            if not plate_key:
+                continue
+            plates_read += 1
+            if plate_key in candidates:
+                continue
+
+            # Check for the snapshot with the same name in the same shard
+            if snapshot_path is None:
+                snapshot_path = to_relative(os.path.join(snapshot_dir, os.path.splitext(relative_path)[0] + '.jpg'))
+                if os.path.isabs(snapshot_path):
+                    # A snapshot directory outside the storage root
+                    found = os.path.exists(snapshot_path)
+                else:
+                    found = snapshot_storage.exists(snapshot_path)
+                if not found:
+                    snapshot_path = ''
+
+            candidates[plate_key] = AIDetectedLicense(
+                plate_number=plate_number,
+                plate_key=plate_key,
+                snapshot_path=snapshot_path or None,
+            )
+
+    # Drop plates already in the table, one query per chunk, then insert
+    imported_keys = []
+    with transaction.atomic():
+        keys = list(candidates)
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            existing = set(AIDetectedLicense.objects
+                           .filter(plate_key__in=chunk)
+                           .values_list('plate_key', flat=True))
+            new_rows = [candidates[key] for key in chunk if key not in existing]
+            AIDetectedLicense.objects.bulk_create(new_rows, batch_size=chunk_size)
+            imported_keys.extend(row.plate_key for row in new_rows)
+
+        # bulk_create skips post_save, so update the membership set by hand
+        transaction.on_commit(lambda: detected_plates.add_many(imported_keys))
+
+    last_timestamp = max(after_timestamp, until_timestamp)
+    save_state(detected_dir, {
+        'last_timestamp': last_timestamp,
+        'recent_files': {path: timestamp for path, timestamp in recent_files.items()
+                         if timestamp > last_timestamp - lookback_seconds},
+    })
+
+    return {
+        'scanned': scanned,
+        'imported': len(imported_keys),
+        'skipped': plates_read - len(imported_keys),
+    }
@@ -0,0 +1,191 @@
+"""
+Inference engines for the license plate model
+
+LICENSE_PLATE_INFERENCE_ENGINE picks how the model is run:
+
+    torch     best.pt through ultralytics.YOLO (eager PyTorch), the default
+    onnx      an ONNX export run by ONNX Runtime on the CPU
+    openvino  an OpenVINO IR export run by the OpenVINO runtime
+
+The exported engines need neither torch nor ultralytics at run time, start
+much faster and are quicker on CPU-only machines. Create the export once
+with ``python manage.py export_model --format onnx`` (or openvino).
+
+Every backend is called like the ultralytics model, ``model(frame_or_frames,
+verbose=False, imgsz=...)``, and returns one result per image with
+``result.boxes.xyxy``, ``.cls`` and ``.conf`` in input image coordinates, so
+LicensePlateDetector parses them the same way. The exported backends do
+their own letterboxing, YOLOv8-style output decoding and per-class NMS.
+"""
+import os
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+
+ENGINES = ('torch', 'onnx', 'openvino')
+
+DEFAULT_IMAGE_SIZE = 640
+# ultralytics predict() defaults
+DEFAULT_CONFIDENCE = 0.25
+DEFAULT_IOU = 0.7
+DEFAULT_MAX_DETECTIONS = 300
+
+
+def exported_model_path(model_path, engine):
+    """Where ``export_model`` puts the export of ``model_path`` for ``engine``"""
+    stem, _ = os.path.splitext(str(model_path))
+    if engine == 'onnx':
+        return f'{stem}.onnx'
+    if engine == 'openvino':
+        # ultralytics writes <stem>_openvino_model/<stem>.xml
+        return os.path.join(f'{stem}_openvino_model', f'{os.path.basename(stem)}.xml')
+    return str(model_path)
+
+
+def load_backend(engine, model_path):
+    if engine == 'torch':
+        from ultralytics import YOLO
+        return YOLO(model_path)
+    if engine == 'onnx':
+        return OnnxRuntimeBackend(model_path)
+    if engine == 'openvino':
+        return OpenVinoBackend(model_path)
+    raise ValueError(f"Unknown inference engine {engine!r}, expected one of {', '.join(ENGINES)}")
+
+
+def letterbox(image, size):
+    """
+    Resize ``image`` to fit a ``size`` x ``size`` square, keeping its aspect
+    ratio, and pad the rest with grey (as ultralytics does)
+
+    Returns the padded image, the scale and the (left, top) padding.
+    """
+    height, width = image.shape[:2]
+    gain = min(size / height, size / width)
+    new_width, new_height = int(round(width * gain)), int(round(height * gain))
+    if (new_width, new_height) != (width, height):
+        image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+
+    left = (size - new_width) // 2
+    top = (size - new_height) // 2
+    padded = cv2.copyMakeBorder(image, top, size - new_height - top, left, size - new_width - left,
+                                cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return padded, gain, (left, top)
+
+
+def to_blob(images):
+    """BGR uint8 images -> RGB float32 NCHW in [0, 1]"""
+    batch = np.stack(images)[..., ::-1].transpose(0, 3, 1, 2)
+    return np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+
+
+def decode_predictions(output, gain, padding, image_shape, conf=DEFAULT_CONFIDENCE,
+                       iou=DEFAULT_IOU, max_det=DEFAULT_MAX_DETECTIONS):
+    """
+    Decode one image's YOLOv8 output, (4 + classes, anchors) of centre
+    x/y, width, height and class scores, into an ultralytics-like result
+    """
+    predictions = output.T
+    class_scores = predictions[:, 4:]
+    class_ids = class_scores.argmax(axis=1)
+    scores = class_scores[np.arange(len(class_ids)), class_ids]
+
+    keep = scores >= conf
+    centres = predictions[keep, :4]
+    class_ids = class_ids[keep]
+    scores = scores[keep]
+
+    # Per-class NMS on top-left x/y, width, height boxes
+    boxes = np.empty_like(centres)
+    boxes[:, :2] = centres[:, :2] - centres[:, 2:] / 2
+    boxes[:, 2:] = centres[:, 2:]
+    if len(boxes):
+        kept = cv2.dnn.NMSBoxesBatched(boxes.tolist(), scores.tolist(), class_ids.tolist(), conf, iou)
+        kept = np.asarray(kept, dtype=np.intp).reshape(-1)[:max_det]
+    else:
+        kept = np.empty(0, dtype=np.intp)
+
+    # Undo the letterbox
+    xyxy = np.concatenate([boxes[kept, :2], boxes[kept, :2] + boxes[kept, 2:]], axis=1)
+    xyxy -= np.array([padding[0], padding[1], padding[0], padding[1]], dtype=np.float32)
+    xyxy /= gain
+    height, width = image_shape[:2]
+    xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, width)
+    xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, height)
+
+    return SimpleNamespace(boxes=SimpleNamespace(
+        xyxy=xyxy.astype(np.float32),
+        cls=class_ids[kept].astype(np.float32),
+        conf=scores[kept].astype(np.float32),
+    ))
+
+
+class _ExportedBackend:
+    """
+    Shared pre- and post-processing for exported YOLO models
+
+    Subclasses set ``fixed_size`` (the square input side, or None when the
+    export takes any size), ``dynamic_batch`` and implement ``_run(blob)``,
+    which returns the raw (batch, 4 + classes, anchors) output.
+    """
+    fixed_size = None
+    dynamic_batch = False
+
+    def __call__(self, source, verbose=False, imgsz=None, conf=DEFAULT_CONFIDENCE, iou=DEFAULT_IOU, **kwargs):
+        images = source if isinstance(source, list) else [source]
+        size = self.fixed_size or _stride_multiple(imgsz or DEFAULT_IMAGE_SIZE)
+        prepared = [letterbox(image, size) for image in images]
+
+        if self.dynamic_batch:
+            outputs = self._run(to_blob([padded for padded, _, _ in prepared]))
+        else:
+            outputs = np.concatenate([self._run(to_blob([padded])) for padded, _, _ in prepared])
+
+        return [
+            decode_predictions(output, gain, padding, image.shape, conf=conf, iou=iou)
+            for output, image, (_, gain, padding) in zip(outputs, images, prepared)
+        ]
+
+    def _run(self, blob):
+        raise NotImplementedError
+
+
+class OnnxRuntimeBackend(_ExportedBackend):
+    def __init__(self, model_path, threads=None):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(str(model_path), sess_options=options,
+                                                    providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        batch, _, height, _ = model_input.shape
+        # Dynamic axes are reported as names or None
+        self.fixed_size = height if isinstance(height, int) else None
+        self.dynamic_batch = not isinstance(batch, int)
+
+    def _run(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoBackend(_ExportedBackend):
+    def __init__(self, model_path, device='CPU'):
+        import openvino
+
+        core = openvino.Core()
+        model = core.read_model(str(model_path))
+        model_input = model.inputs[0].get_partial_shape()
+        self.fixed_size = model_input[2].get_length() if model_input[2].is_static else None
+        self.dynamic_batch = not model_input[0].is_static
+        self.compiled = core.compile_model(model, device, {'PERFORMANCE_HINT': 'LATENCY'})
+
+    def _run(self, blob):
+        return self.compiled(blob)[self.compiled.output(0)]
+
+
+def _stride_multiple(size, stride=32):
+    return max(int(np.ceil(size / stride)) * stride, stride)
@@ -0,0 +1,67 @@
+"""
+Bounded worker pool for running plate inference off the request thread
+
+At most LICENSE_PLATE_INFERENCE_WORKERS tasks run at once and at most
+LICENSE_PLATE_INFERENCE_QUEUE more may wait. Anything beyond that is refused
+immediately with InferencePoolBusy so the API can answer 429 instead of
+letting requests pile up behind the model.
+"""
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+class InferencePoolBusy(Exception):
+    """Raised when every worker and queue slot is taken"""
+
+
+_lock = threading.Lock()
+_executor = None
+_slots = None
+
+
+def _get_executor():
+    global _executor, _slots
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                workers = getattr(settings, 'LICENSE_PLATE_INFERENCE_WORKERS', 2)
+                backlog = getattr(settings, 'LICENSE_PLATE_INFERENCE_QUEUE', 4)
+                _slots = threading.BoundedSemaphore(workers + backlog)
+                _executor = ThreadPoolExecutor(max_workers=workers,
+                                               thread_name_prefix='plate-inference')
+    return _executor
+
+
+def submit(fn, *args, **kwargs):
+    """
+    Schedule ``fn`` on the pool and return its Future
+
+    Raises InferencePoolBusy without waiting if the pool is saturated.
+    """
+    executor = _get_executor()
+    slots = _slots
+    if not slots.acquire(blocking=False):
+        raise InferencePoolBusy("Inference pool is saturated")
+
+    try:
+        # Run in the caller's context, so stage timings reach its request
+        future = executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+    except Exception:
+        slots.release()
+        raise
+
+    # The slot is held until the task finishes, even if the caller gave up
+    future.add_done_callback(lambda _: slots.release())
+    return future
+
+
+def shutdown(wait=True):
+    global _executor, _slots
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+        _executor = None
+        _slots = None
@@ -1,45 +1,74 @@
-from ultralytics import YOLO
 import cv2
+import numpy as np
 import time
 import os
+from collections import namedtuple
 from django.conf import settings
-from accounts.models import AIDetectedLicense
+from accounts import model_registry
+from accounts.artifact_paths import new_artifact_paths, to_absolute
+from accounts.artifact_writer import get_artifact_writer
+from accounts.detection_buffer import flush_detections, get_detection_buffer
+from accounts.metrics import stage_timer
+from accounts.plate_grouping import group_characters, primary_plate
+from accounts.roi import get_inference_size, get_roi, prepare_input, to_frame_coords
+
+# Post-processed detections for one frame: boxes is an (N, 4) int array of
+# x_min, y_min, x_max, y_max ordered left to right, scores an (N,) float
+# array and labels an (N,) array of str. plates holds the characters grouped
+# into plates (see accounts.plate_grouping) and text is the main plate's text.
+FrameResult = namedtuple('FrameResult', ['text', 'boxes', 'scores', 'labels', 'plates'])
+
+
+def _to_numpy(values):
+    """Pull a tensor (or array-like) across to NumPy in one go"""
+    if hasattr(values, 'cpu'):
+        values = values.cpu().numpy()
+    return np.asarray(values)
+
+
+def decode_image(data):
+    """
+    Decode encoded image bytes (JPEG, PNG, ...) in memory
+
+    Returns None if the bytes are not a readable image.
+    """
+    if not data:
+        return None
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+
+def _plate_texts(frame_result):
+    """Text of every plate in the frame, main plate first"""
+    others = [plate.text for plate in frame_result.plates if plate.text != frame_result.text]
+    return [frame_result.text] + others
+
 
 class LicensePlateDetector:
-    def __init__(self):
-        # Use absolute paths based on your project structure
-        base_dir = settings.BASE_DIR
-        model_path = os.path.join(base_dir, 'best.pt')
-        
-        # Check if file exists
+    def __init__(self, source=None, engine=None, source_name=''):
+        # Weights are loaded lazily through the process-wide registry, so
+        # constructing a detector is cheap; fail early if they are missing.
+        # engine overrides LICENSE_PLATE_INFERENCE_ENGINE (torch, onnx, openvino)
+        self.engine = engine or model_registry.get_engine()
+        model_path = model_registry.get_model_path(self.engine)
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"Model file not found at {model_path}")
-            
-        # Print for debugging
-        print(f"Loading model from: {model_path}")
-        
-        # For labels, check if file exists in project root or use hardcoded labels if needed
-        labels_path = os.path.join(base_dir, 'labels.txt')
-        if os.path.exists(labels_path):
-            with open(labels_path, 'r') as file:
-                self.class_labels = [line.strip() for line in file.readlines()]
-        else:
-            # Fallback to digits and letters if file not found
-            self.class_labels = [str(i) for i in range(10)] + [chr(i) for i in range(65, 91)]
-            print(f"Labels file not found at {labels_path}, using default labels")
-        
-        # Ensure directories exist
-        self.snapshot_dir = os.path.join(base_dir, 'snapshots')
-        self.detected_texts_dir = os.path.join(base_dir, 'detected_texts')
-        
-        if not os.path.exists(self.snapshot_dir):
-            os.makedirs(self.snapshot_dir)
         
-        if not os.path.exists(self.detected_texts_dir):
-            os.makedirs(self.detected_texts_dir)
-            
-        # Load the YOLO model
-        self.model = YOLO(model_path)
+        self.class_labels = model_registry.get_class_labels()
+        self.label_array = model_registry.get_label_array()
+        self.min_confidence = getattr(settings, 'LICENSE_PLATE_MIN_CONFIDENCE', 0.25)
+
+        # Frames are cropped to the source's ROI and shrunk before inference
+        # (see accounts.roi); boxes are mapped back to the full frame
+        self.roi = get_roi(source)
+        self.inference_size = get_inference_size()
+        # Saved as AIDetectedLicense.source
+        self.source_name = source_name or ''
+
+    @property
+    def model(self):
+        """The shared model, loaded and warmed up on first use"""
+        return model_registry.get_model(self.engine)
     
     # Rest of your methods remain the same
     def detect_from_camera(self, save_to_db=True):
@@ -58,25 +87,12 @@ class LicensePlateDetector:
             if not ret:
                 raise Exception("Failed to grab frame")
 
-            license_plate_text = self._process_frame(frame)
-
-            timestamp = int(time.time())
-            snapshot_filename = f"license_plate_{timestamp}.jpg"
-            snapshot_path = os.path.join(self.snapshot_dir, snapshot_filename)
-            cv2.imwrite(snapshot_path, frame)
+            frame_result = self._process_frame(frame)
+            snapshot_path = self._save_detection(frame, _plate_texts(frame_result), save_to_db)
+            if save_to_db:
+                flush_detections()
 
-            text_filename = f"license_plate_{timestamp}.txt"
-            text_path = os.path.join(self.detected_texts_dir, text_filename)
-            with open(text_path, 'w') as text_file:
-                text_file.write(license_plate_text)
-
-            if save_to_db and license_plate_text:
-                AIDetectedLicense.objects.create(
-                    plate_number=license_plate_text,
-                    snapshot_path=snapshot_path
-                )
-
-            return license_plate_text, snapshot_path
+            return frame_result.text, snapshot_path
 
         finally:
             cap.release()
@@ -86,67 +102,187 @@ class LicensePlateDetector:
         Detect license plate from an image file
         """
         # Read the image
-        frame = cv2.imread(image_path)
+        with stage_timer('decode'):
+            frame = cv2.imread(image_path)
         if frame is None:
             raise Exception(f"Could not read image from {image_path}")
         
         # Process the frame and get the text
-        license_plate_text = self._process_frame(frame)
+        frame_result = self._process_frame(frame)
         
-        # Generate timestamp for filenames
-        timestamp = int(time.time())
+        snapshot_path = self._save_detection(frame, _plate_texts(frame_result), save_to_db)
+        if save_to_db:
+            flush_detections()
         
-        # Save snapshot (copy of the original)
-        snapshot_filename = f"license_plate_{timestamp}.jpg"
-        snapshot_path = os.path.join(self.snapshot_dir, snapshot_filename)
-        cv2.imwrite(snapshot_path, frame)
+        return frame_result.text, snapshot_path
+    
+    def detect_frame(self, frame, save_to_db=True):
+        """
+        Detect a license plate in an already decoded frame
+
+        Returns a dict with the plate text, boxes, confidences and snapshot path.
+        """
+        return self.detect_batch([frame], batch_size=1, save_to_db=save_to_db)[0]
+
+    def detect_batch(self, paths_or_frames, batch_size=8, save_to_db=True):
+        """
+        Detect license plates in many images, running one model call per batch
+
+        Accepts image paths and/or already decoded frames. Returns one dict
+        per input, in input order, with the plate text, boxes and confidences.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        items = list(paths_or_frames)
+        detections = []
+
+        for start in range(0, len(items), batch_size):
+            chunk = items[start:start + batch_size]
+
+            # Decode the chunk, keeping unreadable images out of the model call
+            frames = []
+            chunk_results = []
+            for item in chunk:
+                source = item if isinstance(item, str) else None
+                result = {
+                    'source': source,
+                    'plate_text': '',
+                    'boxes': [],
+                    'confidences': [],
+                    'plates': [],
+                    'snapshot_path': None,
+                    'error': None,
+                }
+                if source is not None:
+                    with stage_timer('decode'):
+                        frame = cv2.imread(item)
+                else:
+                    frame = item
+                if frame is None:
+                    result['error'] = f"Could not read image from {item}"
+                else:
+                    frames.append((frame, result))
+                chunk_results.append(result)
+
+            if frames:
+                # A single YOLO call for the whole chunk
+                with stage_timer('preprocess'):
+                    inputs = [self._prepare_input(frame) for frame, _ in frames]
+                with stage_timer('inference'):
+                    model_results = self._predict([model_input for model_input, _ in inputs])
+                for (frame, result), (_, transform), model_result in zip(frames, inputs, model_results):
+                    with stage_timer('postprocess'):
+                        frame_result = self._parse_result(frame, model_result, transform)
+                    result['plate_text'] = frame_result.text
+                    result['boxes'] = frame_result.boxes.tolist()
+                    result['confidences'] = [round(score, 4) for score in frame_result.scores.tolist()]
+                    result['plates'] = [
+                        {'text': plate.text, 'box': list(plate.box), 'score': round(plate.score, 4)}
+                        for plate in frame_result.plates
+                    ]
+                    result['snapshot_path'] = self._save_detection(frame, _plate_texts(frame_result), save_to_db)
+
+            detections.extend(chunk_results)
+
+        # Rows are written in bulk as batches fill up; write the rest now
+        if save_to_db:
+            flush_detections()
+
+        return detections
+
+    def _save_detection(self, frame, plate_texts, save_to_db=True):
+        """
+        Queue the annotated snapshot and text file, and optionally save DB rows
+
+        ``plate_texts`` has one entry per plate in the frame; each becomes a
+        line of the text file and its own AIDetectedLicense row. Rows go
+        through the write-behind buffer (accounts.detection_buffer); callers
+        flush it when they need them in the database.
+        """
+        # Unique, hour-sharded names relative to the storage root
+        snapshot_path, text_path = new_artifact_paths()
         
-        # Save text to file
-        text_filename = f"license_plate_{timestamp}.txt"
-        text_path = os.path.join(self.detected_texts_dir, text_filename)
-        with open(text_path, 'w') as text_file:
-            text_file.write(license_plate_text)
+        # Snapshot and text file are written by the background artifact
+        # writer; the paths are final as soon as they are queued. Queueing
+        # only waits when the writer falls behind.
+        with stage_timer('snapshot_queue'):
+            get_artifact_writer().submit(frame, snapshot_path,
+                                         '\n'.join(plate_texts), to_absolute(text_path))
         
         # Save to database if requested
-        if save_to_db and license_plate_text:
-            AIDetectedLicense.objects.create(
-                plate_number=license_plate_text,
-                snapshot_path=snapshot_path
-            )
+        if save_to_db:
+            detection_buffer = get_detection_buffer()
+            for license_plate_text in plate_texts:
+                if license_plate_text:
+                    detection_buffer.add(license_plate_text, snapshot_path, self.source_name)
         
-        return license_plate_text, snapshot_path
-    
+        return snapshot_path
+
     def _process_frame(self, frame):
         """
         Process a single frame to detect license plate text
+
+        Returns a FrameResult with the text, boxes and scores.
         """
-        # Perform detection
-        results = self.model(frame)
+        # Perform detection on the cropped, downscaled input
+        with stage_timer('preprocess'):
+            model_input, transform = self._prepare_input(frame)
+        with stage_timer('inference'):
+            results = self._predict(model_input)
         
-        # Parse results
-        detections = []
-        for result in results:
-            boxes = result.boxes
-            for box in boxes:
-                # Extract coordinates and class
-                x_min, y_min, x_max, y_max = map(int, box.xyxy[0])
-                class_id = int(box.cls[0])
-                
-                # Add to detections list
-                detections.append((x_min, self.class_labels[class_id], 
-                                  (x_min, y_min, x_max, y_max)))
-                
-                # Draw bounding box (for visualization in saved image)
-                cv2.rectangle(frame, (x_min, y_min), (x_max, y_max), (0, 255, 0), 2)
+        # One frame in, one result out
+        with stage_timer('postprocess'):
+            return self._parse_result(frame, results[0], transform)
+
+    def _prepare_input(self, frame):
+        """Crop to the ROI and shrink to the inference size"""
+        return prepare_input(frame, self.roi, self.inference_size)
+
+    def _predict(self, source):
+        """Run the shared model, one caller at a time"""
+        model = self.model
+        options = {'verbose': False}
+        if self.inference_size:
+            options['imgsz'] = self.inference_size
+        with model_registry.inference_lock:
+            return model(source, **options)
+
+    def _parse_result(self, frame, result, transform=None):
+        """
+        Turn one YOLO result into a FrameResult
+
+        Coordinates, classes and confidences cross from the model's tensors to
+        NumPy once per frame; filtering, label lookup and left-to-right
+        ordering then run as array operations. ``transform`` maps boxes from
+        the model input back to ``frame``.
+        """
+        boxes = result.boxes
+        xyxy = to_frame_coords(_to_numpy(boxes.xyxy).reshape(-1, 4), transform)
+        class_ids = _to_numpy(boxes.cls).astype(np.intp).reshape(-1)
+        scores = _to_numpy(boxes.conf).astype(np.float32).reshape(-1)
+        
+        # Drop low confidence detections
+        keep = scores >= self.min_confidence
+        xyxy = xyxy[keep].astype(np.int32)
+        class_ids = class_ids[keep]
+        scores = scores[keep]
         
         # Sort detections by x-coordinate (left to right)
-        sorted_detections = sorted(detections, key=lambda x: x[0])
+        order = np.argsort(xyxy[:, 0], kind='stable')
+        xyxy = xyxy[order]
+        scores = scores[order]
+        labels = self.label_array[class_ids[order]]
         
-        # Extract license plate text
-        license_plate_text = ''.join([digit[1] for digit in sorted_detections])
+        # Group characters into plates and rows; report the main plate
+        plates = group_characters(xyxy, labels, scores)
+        main_plate = primary_plate(plates)
+        license_plate_text = main_plate.text if main_plate else ''
         
-        # Add text overlay to the frame
+        # Draw bounding boxes and text (for visualization in saved image)
+        for x_min, y_min, x_max, y_max in xyxy.tolist():
+            cv2.rectangle(frame, (x_min, y_min), (x_max, y_max), (0, 255, 0), 2)
         cv2.putText(frame, license_plate_text, (20, 50), 
                     cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 255, 0), 3)
         
-        return license_plate_text
\ No newline at end of file
+        return FrameResult(license_plate_text, xyxy, scores, labels, plates)
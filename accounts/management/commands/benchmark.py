@@ -0,0 +1,220 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from accounts import benchmarks
+from accounts.inference_backends import ENGINES
+
+BENCHMARKS = ['process_frame', 'images', 'verify', 'list', 'concurrent']
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the detection and API hot paths and write the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only',
+            type=str,
+            help=f'Comma separated benchmarks to run (default: all of {", ".join(BENCHMARKS)})'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=200,
+            help='Timed calls per benchmark (images mode times one call per batch)'
+        )
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=100000,
+            help='AIDetectedLicense rows seeded for the API benchmarks'
+        )
+        parser.add_argument(
+            '--images',
+            type=int,
+            default=64,
+            help='Generated images for the images mode benchmark'
+        )
+        parser.add_argument(
+            '--frame-size',
+            type=str,
+            default='1280x720',
+            help='Width x height of synthetic frames and images'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=8,
+            help='Images per model call in the images mode benchmark'
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=4,
+            help='Worker threads in the concurrent benchmark'
+        )
+        parser.add_argument(
+            '--sqlite-defaults',
+            action='store_true',
+            help="Run without the SQLite tuning (WAL, PRAGMAs, immediate transactions), for comparison"
+        )
+        parser.add_argument(
+            '--real-model',
+            action='store_true',
+            help='Use the real weights instead of the stub model (needs best.pt and ultralytics)'
+        )
+        parser.add_argument(
+            '--engine',
+            choices=ENGINES,
+            help='Inference engine for --real-model (default: LICENSE_PLATE_INFERENCE_ENGINE)'
+        )
+        parser.add_argument(
+            '--database',
+            type=str,
+            default=os.path.join(settings.BASE_DIR, 'benchmark.sqlite3'),
+            help='SQLite file for the seeded benchmark database'
+        )
+        parser.add_argument(
+            '--keepdb',
+            action='store_true',
+            help='Keep the seeded database for the next run instead of deleting it'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=os.path.join(settings.BASE_DIR, 'benchmark-results.json'),
+            help='Where to write the JSON results'
+        )
+        parser.add_argument(
+            '--compare',
+            type=str,
+            help='Earlier results file to compare against'
+        )
+        parser.add_argument(
+            '--max-regression',
+            type=float,
+            help='With --compare, fail if p95 latency or throughput got worse by more than this many percent'
+        )
+
+    def handle(self, *args, **options):
+        selected = BENCHMARKS
+        if options['only']:
+            selected = [name.strip() for name in options['only'].split(',') if name.strip()]
+            unknown = [name for name in selected if name not in BENCHMARKS]
+            if unknown:
+                raise CommandError(f'Unknown benchmarks: {", ".join(unknown)}')
+
+        try:
+            width, height = (int(value) for value in options['frame_size'].lower().split('x'))
+        except ValueError:
+            raise CommandError('--frame-size must look like 1280x720')
+
+        baseline = benchmarks.load_results(options['compare']) if options['compare'] else None
+
+        # Everything below runs against a separate database, and snapshots go
+        # to a temporary directory rather than the configured storage
+        connection = connections['default']
+        overrides = {}
+        if connection.vendor == 'sqlite':
+            connection.settings_dict['TEST']['NAME'] = options['database']
+            if options['sqlite_defaults']:
+                overrides['SQLITE_PRAGMAS'] = {}
+                connection.settings_dict['OPTIONS'].pop('transaction_mode', None)
+        old_name = connection.settings_dict['NAME']
+        artifact_root = tempfile.mkdtemp(prefix='plate-benchmark-')
+        storages = dict(settings.STORAGES, snapshots={
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+            'OPTIONS': {'location': artifact_root, 'allow_overwrite': True},
+        })
+
+        settings_override = override_settings(**overrides)
+        settings_override.enable()
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'], serialize=False)
+        try:
+            with override_settings(LICENSE_PLATE_STORAGE_ROOT=artifact_root, STORAGES=storages):
+                results = {
+                    'environment': benchmarks.environment(),
+                    'options': {
+                        key: options[key] for key in
+                        ('iterations', 'rows', 'images', 'frame_size', 'batch_size', 'real_model', 'engine',
+                         'threads', 'sqlite_defaults')
+                    },
+                    'benchmarks': self.run_benchmarks(selected, options, width, height, artifact_root),
+                }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+            settings_override.disable()
+            shutil.rmtree(artifact_root, ignore_errors=True)
+
+        with open(options['output'], 'w') as output:
+            json.dump(results, output, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+
+        if baseline is not None:
+            lines, regressions = benchmarks.compare(results, baseline, options['max_regression'])
+            for line in lines:
+                self.stdout.write(line)
+            if regressions:
+                raise CommandError(f'Regressions over {options["max_regression"]}%: {", ".join(regressions)}')
+
+    def run_benchmarks(self, selected, options, width, height, artifact_root):
+        results = {}
+
+        # Seed first, so the images benchmark's own rows do not count
+        if 'verify' in selected or 'list' in selected or 'concurrent' in selected:
+            plates = benchmarks.seed_database(options['rows'], stdout=self.stdout)
+
+        if 'process_frame' in selected or 'images' in selected:
+            if options['real_model']:
+                from accounts import model_registry
+                from accounts.license_detector import LicensePlateDetector
+                detector = LicensePlateDetector(engine=options['engine'])
+                model_registry.preload(engine=detector.engine)
+            else:
+                detector = benchmarks.StubDetector()
+
+        if 'process_frame' in selected:
+            frames = benchmarks.synthetic_frames(8, width, height)
+            results['process_frame'] = benchmarks.bench_process_frame(detector, frames, options['iterations'])
+            self.report('process_frame', results['process_frame'])
+
+        if 'images' in selected:
+            image_dir = os.path.join(artifact_root, 'input')
+            os.makedirs(image_dir)
+            paths = benchmarks.generate_images(image_dir, options['images'], width, height)
+            results['images'] = benchmarks.bench_images(detector, paths, options['batch_size'])
+            self.report('images', results['images'])
+
+        if 'verify' in selected or 'list' in selected:
+            from rest_framework.test import APIClient
+            client = APIClient()
+
+            if 'verify' in selected:
+                results['verify'] = benchmarks.bench_verify(client, plates, options['iterations'])
+                self.report('verify', results['verify'])
+            if 'list' in selected:
+                results['list'] = benchmarks.bench_list(client, options['iterations'])
+                self.report('list', results['list'])
+
+        if 'concurrent' in selected:
+            # The seeding connection would hold SQLite's lock open otherwise
+            connections.close_all()
+            results['concurrent'] = benchmarks.bench_concurrent(plates, options['threads'], options['iterations'])
+            self.report('concurrent', results['concurrent'])
+            self.stdout.write(f'concurrent: {results["concurrent"]["errors"]} failed calls '
+                              f'across {options["threads"]} threads')
+
+        return results
+
+    def report(self, name, stats):
+        self.stdout.write(
+            f'{name}: {stats["throughput_per_s"]}/s, p50 {stats["p50_ms"]} ms, p95 {stats["p95_ms"]} ms, '
+            f'p99 {stats["p99_ms"]} ms, peak RSS {stats["peak_rss_mb"]} MiB'
+        )
@@ -1,28 +1,78 @@
 from django.core.management.base import BaseCommand
+from accounts import model_registry
+from accounts.inference_backends import ENGINES
+from accounts.artifact_writer import flush_artifacts
+from accounts.detection_buffer import flush_detections
 from accounts.license_detector import LicensePlateDetector
+from accounts.plate_tracker import PlateTracker
+from accounts.stream_pipeline import StreamPipeline
 import os
 import glob
 
 class Command(BaseCommand):
-    help = 'Run license plate detection using camera or from image files'
+    help = 'Run license plate detection using camera, a video stream or from image files'
     
     def add_arguments(self, parser):
         parser.add_argument(
             '--mode',
-            choices=['camera', 'images', 'file'],
+            choices=['camera', 'images', 'file', 'stream'],
             default='camera',
-            help='Detection mode: camera, images (directory), or single file'
+            help='Detection mode: camera, images (directory), single file, or continuous stream'
         )
         parser.add_argument(
             '--path',
             type=str,
             help='Path to image file or directory with images'
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=8,
+            help='Number of images sent to the model per call in images mode'
+        )
+        parser.add_argument(
+            '--source',
+            type=str,
+            default='0',
+            help='Stream mode source: camera device index, video file or stream URL; '
+                 'also selects the LICENSE_PLATE_ROIS entry in camera and stream mode'
+        )
+        parser.add_argument(
+            '--source-name',
+            type=str,
+            default='',
+            help='Camera or gate name saved with each detection, for verify-plate "source" checks'
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            help='Stop stream mode after this many seconds (default: run until the stream ends)'
+        )
+        parser.add_argument(
+            '--frame-queue-size',
+            type=int,
+            default=2,
+            help='Frames buffered between capture and inference in stream mode'
+        )
+        parser.add_argument(
+            '--engine',
+            choices=ENGINES,
+            help='Inference engine (default: LICENSE_PLATE_INFERENCE_ENGINE)'
+        )
+        parser.add_argument(
+            '--track',
+            action='store_true',
+            help='Stream mode: skip unchanged frames and save one detection per vehicle pass'
+        )
     
     def handle(self, *args, **options):
         try:
-            detector = LicensePlateDetector()
             mode = options['mode']
+            # Fixed cameras get their own region of interest; other inputs
+            # use the 'default' one, if any
+            roi_source = options['source'] if mode in ('camera', 'stream') else None
+            detector = LicensePlateDetector(source=roi_source, engine=options['engine'],
+                                            source_name=options['source_name'])
             
             if mode == 'camera':
                 self.stdout.write('Running detection using camera...')
@@ -48,22 +98,65 @@ class Command(BaseCommand):
                 dir_path = options['path']
                 self.stdout.write(f'Processing all images in directory: {dir_path}')
                 
-                image_files = glob.glob(os.path.join(dir_path, '*.jpg')) + \
-                            glob.glob(os.path.join(dir_path, '*.jpeg')) + \
-                            glob.glob(os.path.join(dir_path, '*.png'))
+                image_files = sorted(glob.glob(os.path.join(dir_path, '*.jpg')) + \
+                                     glob.glob(os.path.join(dir_path, '*.jpeg')) + \
+                                     glob.glob(os.path.join(dir_path, '*.png')))
+                
+                batch_size = options['batch_size']
+                if batch_size < 1:
+                    self.stdout.write(self.style.ERROR('--batch-size must be at least 1'))
+                    return
                 
-                for img_file in image_files:
-                    self.stdout.write(f'Processing: {img_file}')
+                # One model call per chunk, reported as soon as it is done; a
+                # chunk that fails only loses its own images
+                for start in range(0, len(image_files), batch_size):
+                    chunk = image_files[start:start + batch_size]
                     try:
-                        plate_text, snapshot_path = detector.detect_from_image(img_file)
-                        self.stdout.write(
-                            f'Detected license plate: {plate_text}, saved to {snapshot_path}'
-                        )
+                        detections = detector.detect_batch(chunk, batch_size=batch_size)
                     except Exception as e:
-                        self.stdout.write(self.style.ERROR(f'Error processing {img_file}: {str(e)}'))
+                        for img_file in chunk:
+                            self.stdout.write(self.style.ERROR(f'Error processing {img_file}: {str(e)}'))
+                        continue
+                    
+                    for detection in detections:
+                        img_file = detection['source']
+                        if detection['error']:
+                            self.stdout.write(self.style.ERROR(f'Error processing {img_file}: {detection["error"]}'))
+                        else:
+                            self.stdout.write(
+                                f'Processed {img_file}: detected license plate: {detection["plate_text"]}, '
+                                f'saved to {detection["snapshot_path"]}'
+                            )
+            
+            elif mode == 'stream':
+                # Load and warm up the model before the clock starts
+                model_registry.preload(engine=detector.engine)
+                self.stdout.write(f'Running stream detection on {options["source"]} (Ctrl-C to stop)...')
+                pipeline = StreamPipeline(
+                    detector,
+                    options['source'],
+                    frame_queue_size=options['frame_queue_size'],
+                    tracker=PlateTracker(detector) if options['track'] else None,
+                )
+                try:
+                    stats = pipeline.run(duration=options['duration'])
+                    self.stdout.write(self.style.SUCCESS(
+                        f'Stream finished: {stats["frames_captured"]} frames captured, '
+                        f'{stats["frames_dropped"]} dropped, {stats["frames_processed"]} processed '
+                        f'({stats["frames_skipped"]} unchanged, skipped), '
+                        f'{stats["detections"]} detections in {stats["elapsed"]:.1f}s '
+                        f'({stats["inference_fps"]:.2f} FPS)'
+                    ))
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f'Error: {str(e)}'))
             
             else:
                 self.stdout.write(self.style.ERROR('Invalid command options'))
                 
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Setup error: {str(e)}'))
\ No newline at end of file
+            self.stdout.write(self.style.ERROR(f'Setup error: {str(e)}'))
+        
+        finally:
+            # Detections and snapshots are written in the background
+            flush_detections()
+            flush_artifacts()
\ No newline at end of file
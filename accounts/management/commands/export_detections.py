@@ -0,0 +1,57 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from accounts.exporters import EXPORTS, FORMATS, stream_export
+from accounts.pagination import parse_since
+
+
+class Command(BaseCommand):
+    help = 'Stream AI detected or user submitted license plates as NDJSON or CSV'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            choices=list(EXPORTS),
+            default='detections',
+            help='What to export: AI detections or user submitted plates'
+        )
+        parser.add_argument(
+            '--format',
+            choices=list(FORMATS),
+            default='ndjson',
+            help='Output format'
+        )
+        parser.add_argument(
+            '--since',
+            type=str,
+            help='Only rows at or after this ISO 8601 time'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='File to write to (default: stdout)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Rows fetched from the database per round trip'
+        )
+    
+    def handle(self, *args, **options):
+        try:
+            since = parse_since(options['since']) if options['since'] else None
+        except ValueError as e:
+            raise CommandError(str(e))
+        
+        chunks = stream_export(options['model'], options['format'], since=since,
+                               chunk_size=options['chunk_size'])
+        
+        if options['output']:
+            with open(options['output'], 'w', newline='') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+            self.stderr.write(self.style.SUCCESS(f'Exported {options["model"]} to {options["output"]}'))
+        else:
+            for chunk in chunks:
+                sys.stdout.write(chunk)
@@ -0,0 +1,75 @@
+import os
+import shutil
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from accounts import model_registry
+from accounts.inference_backends import DEFAULT_IMAGE_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Export best.pt once for the onnx or openvino inference engine'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=['onnx', 'openvino'],
+            default='onnx',
+            help='Export format, matching LICENSE_PLATE_INFERENCE_ENGINE'
+        )
+        parser.add_argument(
+            '--imgsz',
+            type=int,
+            help='Input size baked into the export (default: LICENSE_PLATE_INFERENCE_SIZE or 640)'
+        )
+        parser.add_argument(
+            '--dynamic',
+            action='store_true',
+            help='Allow any input size and batch size instead of a fixed square input'
+        )
+        parser.add_argument(
+            '--half',
+            action='store_true',
+            help='FP16 weights (openvino only; smaller, but check parity)'
+        )
+
+    def handle(self, *args, **options):
+        # ONNX Runtime's CPU provider has no FP16 kernels for most ops, so a
+        # half export would only be cast back to FP32 (or fail to load)
+        if options['half'] and options['format'] != 'openvino':
+            raise CommandError('--half is only supported with --format openvino')
+
+        # Exporting needs the full ultralytics/torch stack, running the export does not
+        try:
+            from ultralytics import YOLO
+        except ImportError:
+            raise CommandError('Exporting needs ultralytics installed')
+
+        weights_path = model_registry.get_weights_path()
+        if not os.path.exists(weights_path):
+            raise CommandError(f'Model file not found at {weights_path}')
+
+        imgsz = options['imgsz'] or getattr(settings, 'LICENSE_PLATE_INFERENCE_SIZE', None) or DEFAULT_IMAGE_SIZE
+        self.stdout.write(f'Exporting {weights_path} to {options["format"]} at {imgsz}px...')
+
+        exported = YOLO(weights_path).export(
+            format=options['format'],
+            imgsz=imgsz,
+            dynamic=options['dynamic'],
+            half=options['half'] and options['format'] == 'openvino',
+            simplify=options['format'] == 'onnx',
+        )
+
+        # Put the export where the registry looks for it
+        target = model_registry.get_model_path(options['format'])
+        if options['format'] == 'openvino':
+            # A directory holding <stem>.xml and <stem>.bin
+            target_dir = os.path.dirname(target)
+            if os.path.abspath(str(exported)) != os.path.abspath(target_dir):
+                shutil.copytree(str(exported), target_dir, dirs_exist_ok=True)
+        elif os.path.abspath(str(exported)) != os.path.abspath(target):
+            shutil.copyfile(str(exported), target)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported to {target}; set LICENSE_PLATE_INFERENCE_ENGINE={options["format"]} to use it'
+        ))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from accounts.importer import import_detected_texts
+
+
+class Command(BaseCommand):
+    help = 'Import AI detected license plates from the detected_texts files written since the last import'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            type=str,
+            help='Directory with the detected text files (default: BASE_DIR/detected_texts)'
+        )
+        parser.add_argument(
+            '--snapshots',
+            type=str,
+            help='Directory with the matching snapshots (default: BASE_DIR/snapshots)'
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Ignore the saved high-water mark and rescan every file'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Rows per existence query and bulk insert'
+        )
+    
+    def handle(self, *args, **options):
+        try:
+            result = import_detected_texts(
+                detected_dir=options['path'],
+                snapshot_dir=options['snapshots'],
+                full=options['full'],
+                chunk_size=options['chunk_size'],
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'Scanned {result["scanned"]} new files, imported {result["imported"]} '
+                f'new AI detected license plates ({result["skipped"]} already known)'
+            ))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Import failed: {str(e)}'))
@@ -0,0 +1,153 @@
+"""
+Timing metrics for detection stages and API requests
+
+stage_timer() records how long each step of a detection takes (decode,
+inference, post-processing, snapshot writing, DB inserts) and
+RequestMetricsMiddleware records latency and query counts per accounts API
+view. Everything is kept in process memory and served in the Prometheus text
+format by the /metrics view, so each worker process reports its own numbers.
+
+While a request is being handled, stage times are also collected for it, and
+with LICENSE_PLATE_SERVER_TIMING = True they are sent back in a Server-Timing
+header (visible in the browser's network panel).
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """A Prometheus style histogram with a fixed set of label names"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._lock = threading.Lock()
+        # label values -> [bucket counts, sum, count]
+        self._series = {}
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def collect(self):
+        """Lines of the text exposition format"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        for key, (counts, total, count) in series:
+            pairs = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(pairs + [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(pairs)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(pairs)} {count}')
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+STAGE_SECONDS = Histogram(
+    'license_plate_stage_seconds',
+    'Time spent in each license plate detection stage.',
+    ['stage'],
+)
+REQUEST_SECONDS = Histogram(
+    'license_plate_request_seconds',
+    'Latency of accounts API requests.',
+    ['view', 'method', 'status'],
+)
+REQUEST_QUERIES = Histogram(
+    'license_plate_request_queries',
+    'Database queries run by the request thread of an accounts API request.',
+    ['view'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+REQUEST_DB_SECONDS = Histogram(
+    'license_plate_request_db_seconds',
+    'Time spent in database queries by the request thread of an accounts API request.',
+    ['view'],
+)
+
+
+# Stage name -> seconds for the request being handled, or None outside one
+_request_stages = ContextVar('license_plate_request_stages', default=None)
+
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def stage_timer(stage):
+    """Time the block as one run of ``stage``"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+@contextmanager
+def collect_request_stages():
+    """Collect stage times for the current request; yields the dict they go into"""
+    stages = {}
+    token = _request_stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _request_stages.reset(token)
+
+
+def render():
+    """Every metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.collect())
+    return '\n'.join(lines) + '\n'
+
+
+def clear():
+    for metric in _registry:
+        metric.clear()
@@ -0,0 +1,68 @@
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from . import metrics
+
+
+class RequestMetricsMiddleware:
+    """
+    Time accounts API views and count their database queries
+
+    Only DRF views from the accounts app are recorded, labelled by view class.
+    Queries on other threads (e.g. the inference pool) are not counted here;
+    their time shows up in the detection stage metrics instead. With
+    LICENSE_PLATE_SERVER_TIMING = True the response gets a Server-Timing
+    header with the stages, database time and total time of the request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        queries = _QueryCounter()
+
+        with metrics.collect_request_stages() as stages, connection.execute_wrapper(queries):
+            response = self.get_response(request)
+
+        view_name = getattr(request, '_metrics_view_name', None)
+        if view_name is None:
+            return response
+
+        elapsed = time.perf_counter() - started
+        # The API reports errors in the body's status, often with HTTP 200
+        data = getattr(response, 'data', None)
+        status = data.get('status', response.status_code) if isinstance(data, dict) else response.status_code
+        metrics.REQUEST_SECONDS.observe(elapsed, view=view_name, method=request.method, status=status)
+        metrics.REQUEST_QUERIES.observe(queries.count, view=view_name)
+        metrics.REQUEST_DB_SECONDS.observe(queries.seconds, view=view_name)
+
+        if getattr(settings, 'LICENSE_PLATE_SERVER_TIMING', False):
+            entries = [f'{stage};dur={seconds * 1000:.2f}' for stage, seconds in stages.items()]
+            entries.append(f'db;dur={queries.seconds * 1000:.2f};desc="{queries.count} queries"')
+            entries.append(f'total;dur={elapsed * 1000:.2f}')
+            response['Server-Timing'] = ', '.join(entries)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        if view_class is not None and view_class.__module__.startswith('accounts.'):
+            request._metrics_view_name = view_class.__name__
+
+
+class _QueryCounter:
+    """connection.execute_wrapper that counts queries and their time"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:18
+
+import re
+
+from django.db import migrations, models
+
+
+# Frozen copy of accounts.plates.normalize_plate as of this migration, so
+# replaying it gives the same keys whatever that function becomes
+_NON_ALPHANUMERIC = re.compile(r'[\W_]+')
+
+
+def normalize_plate(plate_number):
+    if not plate_number:
+        return ''
+    return _NON_ALPHANUMERIC.sub('', plate_number).upper()
+
+
+def backfill_plate_keys(apps, schema_editor):
+    AIDetectedLicense = apps.get_model('accounts', 'AIDetectedLicense')
+    batch = []
+    for detection in AIDetectedLicense.objects.only('id', 'plate_number').iterator(chunk_size=2000):
+        detection.plate_key = normalize_plate(detection.plate_number)
+        batch.append(detection)
+        if len(batch) >= 2000:
+            AIDetectedLicense.objects.bulk_update(batch, ['plate_key'])
+            batch = []
+    if batch:
+        AIDetectedLicense.objects.bulk_update(batch, ['plate_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_aidetectedlicense_licenseplate'),
+    ]
+
+    operations = [
+        # Add the column unindexed, backfill it, then build the index once
+        migrations.AddField(
+            model_name='aidetectedlicense',
+            name='plate_key',
+            field=models.CharField(default='', editable=False, max_length=20),
+        ),
+        migrations.RunPython(backfill_plate_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='aidetectedlicense',
+            name='plate_key',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='licenseplate',
+            index=models.Index(fields=['user', 'plate_number'], name='licenseplate_user_plate_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_aidetectedlicense_plate_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aidetectedlicense',
+            index=models.Index(fields=['detection_timestamp', 'id'], name='aidetected_timestamp_id_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_aidetectedlicense_timestamp_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aidetectedlicense',
+            name='source',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='aidetectedlicense',
+            index=models.Index(fields=['plate_key', 'detection_timestamp'], name='aidetected_key_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='aidetectedlicense',
+            index=models.Index(fields=['plate_key', 'source', 'detection_timestamp'], name='aidetected_key_src_time_idx'),
+        ),
+        # Dropped only once the composite indexes exist
+        migrations.AlterField(
+            model_name='aidetectedlicense',
+            name='plate_key',
+            field=models.CharField(default='', editable=False, max_length=20),
+        ),
+    ]
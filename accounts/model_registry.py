@@ -0,0 +1,179 @@
+"""
+Process-wide registry for the license plate model
+
+The YOLO weights and class labels are loaded once per process, on first use
+rather than at Django import, and shared by every LicensePlateDetector. After
+loading, the model runs a few warm-up inferences on a dummy frame so the first
+real request does not pay for lazy initialisation inside the framework.
+
+The model is run by the engine named in LICENSE_PLATE_INFERENCE_ENGINE (see
+accounts.inference_backends); each engine is loaded at most once.
+
+Settings (all optional):
+    LICENSE_PLATE_INFERENCE_ENGINE  torch, onnx or openvino, default torch
+    LICENSE_PLATE_MODEL_PATH      path to the weights, default BASE_DIR/best.pt
+    LICENSE_PLATE_EXPORTED_MODEL_PATH  path to the onnx/openvino export,
+                                  default next to the weights (export_model)
+    LICENSE_PLATE_LABELS_PATH     path to labels.txt, default BASE_DIR/labels.txt
+    LICENSE_PLATE_WARMUP_RUNS     warm-up inferences after loading, default 1
+    LICENSE_PLATE_WARMUP_SIZE     side of the square dummy frame, default
+                                  LICENSE_PLATE_INFERENCE_SIZE or 640
+"""
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from .inference_backends import ENGINES, exported_model_path, load_backend
+
+
+_lock = threading.Lock()
+_ready = threading.Event()
+# engine -> loaded model
+_models = {}
+_class_labels = None
+_label_array = None
+
+# The ultralytics predictor keeps per-call state and is not safe to call from
+# several threads at once, so every inference on the shared model holds this
+inference_lock = threading.Lock()
+
+
+def get_engine():
+    engine = getattr(settings, 'LICENSE_PLATE_INFERENCE_ENGINE', 'torch')
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown LICENSE_PLATE_INFERENCE_ENGINE {engine!r}, expected one of {', '.join(ENGINES)}")
+    return engine
+
+
+def get_weights_path():
+    """The trained PyTorch weights (best.pt)"""
+    return str(getattr(settings, 'LICENSE_PLATE_MODEL_PATH',
+                       os.path.join(settings.BASE_DIR, 'best.pt')))
+
+
+def get_model_path(engine=None):
+    """The model file ``engine`` (default: the configured one) loads"""
+    engine = engine or get_engine()
+    if engine == 'torch':
+        return get_weights_path()
+    exported_path = getattr(settings, 'LICENSE_PLATE_EXPORTED_MODEL_PATH', None)
+    return str(exported_path or exported_model_path(get_weights_path(), engine))
+
+
+def get_labels_path():
+    return str(getattr(settings, 'LICENSE_PLATE_LABELS_PATH',
+                       os.path.join(settings.BASE_DIR, 'labels.txt')))
+
+
+def get_model(engine=None):
+    """
+    Return the shared model, loading and warming it up on first call
+
+    ``engine`` defaults to LICENSE_PLATE_INFERENCE_ENGINE.
+    """
+    default_engine = get_engine()
+    engine = engine or default_engine
+    model = _models.get(engine)
+    if model is None:
+        with _lock:
+            model = _models.get(engine)
+            if model is None:
+                model = _load_model(engine)
+                warm_up(model)
+                _models[engine] = model
+                if engine == default_engine:
+                    _ready.set()
+    return model
+
+
+def get_class_labels():
+    """Return the class labels, read from labels.txt once per process"""
+    global _class_labels
+    if _class_labels is None:
+        with _lock:
+            if _class_labels is None:
+                _class_labels = _load_class_labels()
+    return _class_labels
+
+
+def get_label_array():
+    """Class labels as a NumPy array, for vectorised class id lookups"""
+    global _label_array
+    if _label_array is None:
+        _label_array = np.array(get_class_labels(), dtype=object)
+    return _label_array
+
+
+def is_ready():
+    """True once the configured engine's model is loaded and warmed up"""
+    return _ready.is_set()
+
+
+def wait_until_ready(timeout=None):
+    return _ready.wait(timeout)
+
+
+def preload(background=False, engine=None):
+    """
+    Load and warm up the model ahead of the first request
+
+    With ``background=True`` loading happens on a daemon thread and callers
+    can poll ``is_ready()``.
+    """
+    if background:
+        thread = threading.Thread(target=get_model, args=(engine,), name='plate-model-preload', daemon=True)
+        thread.start()
+        return thread
+    return get_model(engine)
+
+
+def warm_up(model, runs=None, size=None):
+    """Run inference on a blank frame so lazy framework setup happens now"""
+    if runs is None:
+        runs = getattr(settings, 'LICENSE_PLATE_WARMUP_RUNS', 1)
+    inference_size = getattr(settings, 'LICENSE_PLATE_INFERENCE_SIZE', None)
+    if size is None:
+        size = getattr(settings, 'LICENSE_PLATE_WARMUP_SIZE', None) or inference_size or 640
+
+    # Warm up at the size real frames are run at
+    options = {'verbose': False}
+    if inference_size:
+        options['imgsz'] = inference_size
+
+    dummy_frame = np.zeros((size, size, 3), dtype=np.uint8)
+    with inference_lock:
+        for _ in range(runs):
+            model(dummy_frame, **options)
+
+
+def reset():
+    """Forget the loaded model and labels (for tests and reloads)"""
+    global _class_labels, _label_array
+    with _lock:
+        _models.clear()
+        _class_labels = None
+        _label_array = None
+        _ready.clear()
+
+
+def _load_model(engine):
+    model_path = get_model_path(engine)
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model file not found at {model_path}")
+
+    # Print for debugging
+    print(f"Loading {engine} model from: {model_path}")
+    return load_backend(engine, model_path)
+
+
+def _load_class_labels():
+    labels_path = get_labels_path()
+    if os.path.exists(labels_path):
+        with open(labels_path, 'r') as file:
+            return [line.strip() for line in file.readlines()]
+
+    # Fallback to digits and letters if file not found
+    print(f"Labels file not found at {labels_path}, using default labels")
+    return [str(i) for i in range(10)] + [chr(i) for i in range(65, 91)]
@@ -5,6 +5,7 @@ from django.db.models.signals import post_save
 from django.dispatch import receiver
 import uuid
 from .managers import UserManager
+from .plates import normalize_plate
 
 
 
@@ -35,6 +36,12 @@ class LicensePlate(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     verified = models.BooleanField(default=False)
     
+    class Meta:
+        indexes = [
+            # Serves the get_or_create(user=..., plate_number=...) lookup
+            models.Index(fields=['user', 'plate_number'], name='licenseplate_user_plate_idx'),
+        ]
+    
     def __str__(self):
         return self.plate_number
 
@@ -42,8 +49,37 @@ class LicensePlate(models.Model):
 class AIDetectedLicense(models.Model):
     """Model to store license plates detected by the AI model"""
     plate_number = models.CharField(max_length=20)
+    # Normalized plate_number (see accounts.plates.normalize_plate), used for lookups
+    # Plain plate_key lookups use the composite indexes below
+    plate_key = models.CharField(max_length=20, editable=False, default='')
     detection_timestamp = models.DateTimeField(auto_now_add=True)
     snapshot_path = models.CharField(max_length=255, null=True, blank=True)
+    # Camera or gate that saw the plate (detect_license_plates --source-name)
+    source = models.CharField(max_length=50, blank=True, default='')
+    
+    class Meta:
+        indexes = [
+            # Keyset pagination of the detections listing
+            models.Index(fields=['detection_timestamp', 'id'], name='aidetected_timestamp_id_idx'),
+            # Time-windowed verification: one range probe per plate, with or
+            # without a source
+            models.Index(fields=['plate_key', 'detection_timestamp'], name='aidetected_key_time_idx'),
+            models.Index(fields=['plate_key', 'source', 'detection_timestamp'], name='aidetected_key_src_time_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        self.plate_key = normalize_plate(self.plate_number)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'plate_number' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'plate_key'}
+        super().save(*args, **kwargs)
     
     def __str__(self):
-        return self.plate_number
\ No newline at end of file
+        return self.plate_number
+
+class DetectedPlateVersion(models.Model):
+    """
+    Single-row counter bumped whenever a detected plate may have been
+    removed, so every process reloads its plate set (accounts.plate_cache)
+    """
+    version = models.PositiveBigIntegerField(default=0)
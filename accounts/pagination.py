@@ -0,0 +1,60 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(timestamp, row_id):
+    """Opaque cursor for the row after which the next page starts"""
+    raw = f'{timestamp.isoformat()}|{row_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp, row_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeError) as e:
+        raise InvalidCursor('Invalid cursor') from e
+
+
+def parse_since(value):
+    """Parse an ISO 8601 ``since`` filter; naive values use the current timezone"""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f'Invalid datetime: {value}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def keyset_page(queryset, cursor=None, limit=100, timestamp_field='detection_timestamp'):
+    """
+    Return (rows, next_cursor) for one page ordered by (timestamp, id)
+
+    ``queryset`` should be a ``.values()`` queryset that includes the
+    timestamp and id. Uses a range condition instead of OFFSET, so every page
+    costs the same whatever its depth.
+    """
+    if cursor:
+        after_timestamp, after_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{f'{timestamp_field}__gt': after_timestamp}) |
+            Q(**{timestamp_field: after_timestamp, 'id__gt': after_id})
+        )
+
+    # Fetch one extra row to know whether there is a next page
+    rows = list(queryset.order_by(timestamp_field, 'id')[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[timestamp_field], last['id'])
+    return rows, next_cursor
@@ -1,14 +1,23 @@
+from django.conf import settings
 from rest_framework.permissions import BasePermission
-from accounts.models import User
+from accounts.authentication import resolve_user
 
 class IsVerifiedUser(BasePermission):
     def has_permission(self, request, view):
-        email = request.data.get('email') or request.query_params.get('email')
-        if not email:
-            return False
+        # Resolved once per request; the view reuses it
+        user = resolve_user(request)
+        return bool(user and user.is_verified)
 
-        try:
-            user = User.objects.get(email=email)
-            return user.is_verified
-        except User.DoesNotExist:
-            return False
\ No newline at end of file
+
+def can_save_detections(user):
+    """
+    Staff and device accounts (members of LICENSE_PLATE_DEVICE_GROUP) may
+    record detections; anyone else could verify their own plate by
+    uploading a photo of it
+    """
+    if not user.is_authenticated:
+        return False
+    if user.is_staff:
+        return True
+    group = getattr(settings, 'LICENSE_PLATE_DEVICE_GROUP', 'detection-devices')
+    return user.groups.filter(name=group).exists()
@@ -0,0 +1,250 @@
+"""
+Process-local set of every plate_key the AI has detected
+
+Verification asks "was this plate ever detected?" on every request, and most
+answers are "no". Keeping the detected keys in memory answers both cases
+without touching the database.
+
+Web workers load the set on a background thread at startup (preload(),
+called from auth_otp.wsgi and auth_otp.asgi); elsewhere it is loaded on
+first use. It is then kept current in three ways:
+
+* rows saved or deleted in this process update it through signals
+  (see accounts.signals);
+* every LICENSE_PLATE_CACHE_REFRESH seconds it pulls rows with an id above
+  the highest one it has seen, which picks up inserts made by other
+  processes (the detector command, other web workers) with a cheap
+  primary-key range query. Concurrent writers can commit a lower id after
+  a higher one, so it also re-reads rows detected since
+  LICENSE_PLATE_CACHE_REFRESH_MARGIN seconds before the previous refresh;
+* deletes and plate changes bump the counter in DetectedPlateVersion, a
+  single-row table, so every process sees them. A process that finds a
+  version it has not loaded reloads the whole set on a background thread.
+
+Refreshes never hold up readers: only the first load is waited for. After
+that, a thread that finds the set due for a refresh does it while other
+threads keep answering from the current set, and a full reload builds a
+new set and swaps it in when it is complete.
+
+search() finds keys close to a misread plate through a FuzzyPlateIndex
+(accounts.plate_fuzzy). It is built from the set on the first search and
+kept current alongside it, so processes that never search never pay for it.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .plate_fuzzy import FuzzyPlateIndex
+
+
+class DetectedPlateCache:
+    def __init__(self):
+        # Held while the set is loaded or refreshed; readers only wait for it
+        # before the first load
+        self._lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._reload_thread = None
+        self._keys = None
+        self._fuzzy_index = None
+        self._last_id = 0
+        # Rows detected after this are re-read on the next refresh
+        self._rescan_from = None
+        self._version = None
+        self._refreshed_at = 0.0
+
+    @property
+    def refresh_interval(self):
+        return getattr(settings, 'LICENSE_PLATE_CACHE_REFRESH', 5.0)
+
+    @property
+    def refresh_margin(self):
+        return timedelta(seconds=getattr(settings, 'LICENSE_PLATE_CACHE_REFRESH_MARGIN', 60))
+
+    def contains(self, plate_key):
+        """True if any AIDetectedLicense has this plate_key"""
+        if not plate_key:
+            return False
+        return plate_key in self._ensure_fresh()
+
+    def search(self, plate_key, max_cost=None, limit=None):
+        """
+        Detected keys within a confusion-weighted edit distance of
+        ``plate_key``, closest first, as (key, cost) pairs
+
+        ``max_cost`` defaults to LICENSE_PLATE_FUZZY_MAX_COST and is capped
+        by it.
+        """
+        if not plate_key:
+            return []
+        allowed_cost = getattr(settings, 'LICENSE_PLATE_FUZZY_MAX_COST', 1.0)
+        max_cost = allowed_cost if max_cost is None else min(max_cost, allowed_cost)
+
+        self._ensure_fresh()
+        index = self._fuzzy_index
+        if index is None:
+            with self._index_lock:
+                index = self._fuzzy_index
+                if index is None:
+                    # Publish the index before filling it, holding its lock,
+                    # so keys added meanwhile wait and then go in too
+                    index = FuzzyPlateIndex(max_edits=int(allowed_cost))
+                    with index.lock:
+                        self._fuzzy_index = index
+                        index.insert(list(self._keys or ()))
+        return index.search(plate_key, max_cost=max_cost, limit=limit)
+
+    def add(self, plate_key):
+        keys = self._keys
+        if plate_key and keys is not None:
+            keys.add(plate_key)
+            self._add_to_index([plate_key])
+
+    def add_many(self, plate_keys):
+        """Record keys written in bulk (bulk_create bypasses the signals)"""
+        keys = self._keys
+        if keys is not None:
+            plate_keys = [key for key in plate_keys if key]
+            keys.update(plate_keys)
+            self._add_to_index(plate_keys)
+
+    def _add_to_index(self, plate_keys):
+        index = self._fuzzy_index
+        if index is not None:
+            index.add_many(plate_keys)
+
+    def preload(self, background=False):
+        """
+        Load the set ahead of the first verify request
+
+        With ``background=True`` loading happens on a daemon thread, and
+        requests arriving before it finishes wait for it.
+        """
+        if background:
+            thread = threading.Thread(target=self._preload, name='plate-cache-preload', daemon=True)
+            thread.start()
+            return thread
+        self._ensure_fresh()
+
+    def invalidate(self):
+        """
+        Force every process to reload
+
+        Used when a key may have disappeared, which the incremental refresh
+        cannot see.
+        """
+        from accounts.models import DetectedPlateVersion
+
+        if not DetectedPlateVersion.objects.filter(pk=1).update(version=F('version') + 1):
+            DetectedPlateVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+        # This process notices on its next read
+        self._refreshed_at = 0.0
+
+    def clear(self):
+        """Drop the in-memory set in this process only (for tests)"""
+        with self._lock:
+            self._keys = None
+            self._fuzzy_index = None
+            self._version = None
+
+    def _ensure_fresh(self):
+        """Return the key set, refreshing it first if it is due"""
+        keys = self._keys
+        if keys is None:
+            # Nothing to answer from yet, so wait for the first load
+            with self._lock:
+                if self._keys is None:
+                    self._load_all(self._current_version())
+                    self._refreshed_at = time.monotonic()
+                return self._keys
+
+        if time.monotonic() - self._refreshed_at < self.refresh_interval:
+            return keys
+        # One thread refreshes; the others keep using the current set
+        if not self._lock.acquire(blocking=False):
+            return keys
+        try:
+            if self._keys is not None and time.monotonic() - self._refreshed_at >= self.refresh_interval:
+                version = self._current_version()
+                if version != self._version:
+                    self._start_reload()
+                else:
+                    self._load_since_last_id()
+                self._refreshed_at = time.monotonic()
+            return self._keys
+        finally:
+            self._lock.release()
+
+    def _current_version(self):
+        from accounts.models import DetectedPlateVersion
+
+        return DetectedPlateVersion.objects.filter(pk=1).values_list('version', flat=True).first()
+
+    def _start_reload(self):
+        # Called with self._lock held
+        if self._reload_thread is None or not self._reload_thread.is_alive():
+            self._reload_thread = threading.Thread(target=self._reload, name='plate-cache-reload', daemon=True)
+            self._reload_thread.start()
+
+    def _reload(self):
+        try:
+            with self._lock:
+                self._load_all(self._current_version())
+                self._refreshed_at = time.monotonic()
+        except Exception as e:
+            # The current set stays in use; the next refresh tries again
+            print(f"Failed to reload detected plates: {e}")
+        finally:
+            # This thread opened its own DB connection
+            connections.close_all()
+
+    def _preload(self):
+        try:
+            self._ensure_fresh()
+        except Exception as e:
+            print(f"Failed to preload detected plates: {e}")
+        finally:
+            connections.close_all()
+
+    def _load_all(self, version):
+        from accounts.models import AIDetectedLicense
+
+        rescan_from = timezone.now() - self.refresh_margin
+        keys = set()
+        last_id = 0
+        rows = AIDetectedLicense.objects.order_by('id').values_list('id', 'plate_key')
+        for row_id, plate_key in rows.iterator(chunk_size=5000):
+            if plate_key:
+                keys.add(plate_key)
+            last_id = row_id
+
+        # Readers switch to the new set in one step
+        self._keys, self._fuzzy_index = keys, None
+        self._last_id = last_id
+        self._rescan_from = rescan_from
+        self._version = version
+
+    def _load_since_last_id(self):
+        from accounts.models import AIDetectedLicense
+
+        rescan_from = timezone.now() - self.refresh_margin
+        # New ids, plus recent rows that may have committed after a higher id
+        rows = (AIDetectedLicense.objects
+                .filter(Q(id__gt=self._last_id) | Q(detection_timestamp__gte=self._rescan_from))
+                .order_by('id')
+                .values_list('id', 'plate_key'))
+        new_keys = []
+        for row_id, plate_key in rows.iterator(chunk_size=5000):
+            if plate_key and plate_key not in self._keys:
+                new_keys.append(plate_key)
+            self._last_id = max(self._last_id, row_id)
+        self._rescan_from = rescan_from
+        self._keys.update(new_keys)
+        self._add_to_index(new_keys)
+
+
+detected_plates = DetectedPlateCache()
@@ -0,0 +1,183 @@
+"""
+Fuzzy plate lookup that knows which characters the model confuses
+
+The detector often reads O as 0, I as 1, B as 8 and so on. Verifying the
+plate the user typed against what the model read therefore uses a weighted
+edit distance: substituting one character of a confusion pair costs its
+CONFUSION_COSTS weight, any other substitution, insertion or deletion
+costs 1.
+
+FuzzyPlateIndex finds every key within a cost budget without scanning all
+keys, using a deletion neighbourhood (as in SymSpell):
+
+* each key is first folded, mapping every character of a confusion group
+  to one representative, so confusions cost nothing in the index;
+* all variants of the folded key with up to ``max_edits`` characters
+  deleted point back to the key;
+* a query generates the same variants, and the keys they hit are the
+  candidates. Any key within the budget is among them, since it is at most
+  ``max_edits`` plain edits away after folding. Each candidate's real
+  weighted distance is then computed and checked against the budget.
+"""
+import threading
+
+
+# Substitution cost of characters the model mixes up (others cost 1)
+CONFUSION_COSTS = {
+    ('0', 'O'): 0.2,
+    ('0', 'D'): 0.4,
+    ('0', 'Q'): 0.4,
+    ('O', 'D'): 0.4,
+    ('O', 'Q'): 0.4,
+    ('1', 'I'): 0.2,
+    ('1', 'L'): 0.4,
+    ('1', 'T'): 0.6,
+    ('I', 'L'): 0.4,
+    ('8', 'B'): 0.3,
+    ('5', 'S'): 0.3,
+    ('2', 'Z'): 0.3,
+    ('6', 'G'): 0.4,
+    ('4', 'A'): 0.6,
+    ('7', 'T'): 0.6,
+    ('U', 'V'): 0.5,
+    ('M', 'N'): 0.6,
+    ('P', 'R'): 0.6,
+    ('E', 'F'): 0.6,
+}
+
+
+def _substitution_costs(pairs):
+    costs = {}
+    for (first, second), cost in pairs.items():
+        costs[first, second] = costs[second, first] = cost
+    return costs
+
+
+def _fold_table(pairs):
+    """Map each character to the representative of its confusion group"""
+    parent = {}
+
+    def find(char):
+        while parent.get(char, char) != char:
+            char = parent[char]
+        return char
+
+    for first, second in pairs:
+        root_first, root_second = find(first), find(second)
+        if root_first != root_second:
+            parent[max(root_first, root_second)] = min(root_first, root_second)
+    return str.maketrans({char: find(char) for char in parent})
+
+
+SUBSTITUTION_COSTS = _substitution_costs(CONFUSION_COSTS)
+FOLD_TABLE = _fold_table(CONFUSION_COSTS)
+
+
+def fold(plate_key):
+    return plate_key.translate(FOLD_TABLE)
+
+
+def weighted_distance(first, second, max_cost=None):
+    """
+    Confusion-weighted edit distance between two plate keys
+
+    Returns None as soon as the distance is known to exceed ``max_cost``.
+    """
+    previous = [float(index) for index in range(len(second) + 1)]
+    for row, first_char in enumerate(first, 1):
+        current = [float(row)]
+        for column, second_char in enumerate(second, 1):
+            if first_char == second_char:
+                substitution = 0.0
+            else:
+                substitution = SUBSTITUTION_COSTS.get((first_char, second_char), 1.0)
+            current.append(min(previous[column] + 1, current[column - 1] + 1,
+                               previous[column - 1] + substitution))
+        if max_cost is not None and min(current) > max_cost:
+            return None
+        previous = current
+    distance = previous[-1]
+    if max_cost is not None and distance > max_cost:
+        return None
+    return distance
+
+
+def deletion_variants(word, max_edits):
+    """``word`` and every string made by deleting up to ``max_edits`` characters"""
+    variants = {word}
+    frontier = {word}
+    for _ in range(max_edits):
+        frontier = {variant[:index] + variant[index + 1:] for variant in frontier for index in range(len(variant))}
+        variants |= frontier
+    return variants
+
+
+class FuzzyPlateIndex:
+    """
+    Deletion-neighbourhood index over plate keys
+
+    ``max_edits`` bounds the plain (non-confusion) edits a search can
+    tolerate; a search budget of ``max_cost`` needs ``max_edits >=
+    int(max_cost)``. Memory grows with the number of variants, about
+    (len(key) + 1) per key for one edit.
+    """
+
+    def __init__(self, plate_keys=(), max_edits=1):
+        self.max_edits = max_edits
+        # Held while keys are added or searched; insert() expects the caller
+        # to hold it
+        self.lock = threading.Lock()
+        # variant -> key, or a set of keys once several share the variant
+        self._variants = {}
+        self._keys = set()
+        self.add_many(plate_keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, plate_key):
+        self.add_many([plate_key])
+
+    def add_many(self, plate_keys):
+        with self.lock:
+            self.insert(plate_keys)
+
+    def insert(self, plate_keys):
+        for plate_key in plate_keys:
+            if not plate_key or plate_key in self._keys:
+                continue
+            self._keys.add(plate_key)
+            for variant in deletion_variants(fold(plate_key), self.max_edits):
+                entry = self._variants.get(variant)
+                if entry is None:
+                    self._variants[variant] = plate_key
+                elif isinstance(entry, set):
+                    entry.add(plate_key)
+                else:
+                    self._variants[variant] = {entry, plate_key}
+
+    def search(self, plate_key, max_cost=1.0, limit=None):
+        """
+        Keys within ``max_cost`` of ``plate_key``, closest first
+
+        Returns a list of (key, cost) pairs.
+        """
+        max_edits = min(int(max_cost), self.max_edits)
+        candidates = set()
+        with self.lock:
+            for variant in deletion_variants(fold(plate_key), max_edits):
+                entry = self._variants.get(variant)
+                if entry is None:
+                    continue
+                if isinstance(entry, set):
+                    candidates.update(entry)
+                else:
+                    candidates.add(entry)
+
+        matches = []
+        for candidate in candidates:
+            cost = weighted_distance(plate_key, candidate, max_cost)
+            if cost is not None:
+                matches.append((candidate, round(cost, 2)))
+        matches.sort(key=lambda match: (match[1], match[0]))
+        return matches[:limit] if limit else matches
@@ -0,0 +1,134 @@
+"""
+Group character detections into plates and plate rows
+
+The model detects individual characters. A frame can contain several plates
+(two vehicles) and a plate can have two rows of characters, so joining every
+character left to right mixes them up. group_characters() clusters the boxes
+into plates from their spacing and height, then splits each plate into rows
+by vertical position.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+
+# text is the plate's rows joined top to bottom, box its (x_min, y_min,
+# x_max, y_max) region, score the mean character confidence and rows the
+# text of each row
+Plate = namedtuple('Plate', ['text', 'box', 'score', 'rows'])
+
+# A character joins a plate if the horizontal gap to it is at most this many
+# character heights...
+MAX_GAP_HEIGHTS = 1.5
+# ...its vertical centre lies within this many heights of the plate region...
+MAX_ROW_OFFSET_HEIGHTS = 1.0
+# ...and its height is within this ratio of the plate's mean character height
+MAX_HEIGHT_RATIO = 2.0
+# Inside a plate, a new row starts when the centre drops this many heights
+ROW_SPLIT_HEIGHTS = 0.6
+
+
+class _Cluster:
+    __slots__ = ('members', 'x_min', 'y_min', 'x_max', 'y_max', 'height_sum')
+
+    def __init__(self, index, box):
+        self.members = [index]
+        self.x_min, self.y_min, self.x_max, self.y_max = box
+        self.height_sum = box[3] - box[1]
+
+    @property
+    def mean_height(self):
+        return self.height_sum / len(self.members)
+
+    def add(self, index, box):
+        self.members.append(index)
+        self.x_min = min(self.x_min, box[0])
+        self.y_min = min(self.y_min, box[1])
+        self.x_max = max(self.x_max, box[2])
+        self.y_max = max(self.y_max, box[3])
+        self.height_sum += box[3] - box[1]
+
+    def distance_to(self, box):
+        """Return how far ``box`` is from this plate, or None if it does not fit"""
+        height = max(box[3] - box[1], 1)
+        mean_height = max(self.mean_height, 1)
+        if not (1 / MAX_HEIGHT_RATIO <= height / mean_height <= MAX_HEIGHT_RATIO):
+            return None
+
+        gap = box[0] - self.x_max
+        if gap > MAX_GAP_HEIGHTS * mean_height:
+            return None
+
+        centre_y = (box[1] + box[3]) / 2
+        reach = MAX_ROW_OFFSET_HEIGHTS * mean_height
+        if not (self.y_min - reach <= centre_y <= self.y_max + reach):
+            return None
+
+        # Prefer the plate whose vertical span is closest, then the nearest
+        vertical = max(self.y_min - centre_y, centre_y - self.y_max, 0)
+        return vertical + max(gap, 0)
+
+
+def group_characters(boxes, labels, scores):
+    """
+    Cluster character boxes into plates
+
+    ``boxes`` is an (N, 4) array of x_min, y_min, x_max, y_max sorted by
+    x_min, with matching ``labels`` and ``scores``. Returns a list of Plate,
+    left to right.
+    """
+    boxes = np.asarray(boxes).reshape(-1, 4)
+    box_list = boxes.tolist()
+
+    # Single left-to-right sweep: each box joins the closest plate it fits
+    clusters = []
+    for index, box in enumerate(box_list):
+        best, best_distance = None, None
+        for cluster in clusters:
+            distance = cluster.distance_to(box)
+            if distance is not None and (best_distance is None or distance < best_distance):
+                best, best_distance = cluster, distance
+        if best is None:
+            clusters.append(_Cluster(index, box))
+        else:
+            best.add(index, box)
+
+    plates = []
+    for cluster in clusters:
+        rows = _split_rows(cluster, box_list)
+        row_texts = [''.join(labels[index] for index in row) for row in rows]
+        plates.append(Plate(
+            text=''.join(row_texts),
+            box=(cluster.x_min, cluster.y_min, cluster.x_max, cluster.y_max),
+            score=float(np.mean([scores[index] for index in cluster.members])),
+            rows=row_texts,
+        ))
+    return plates
+
+
+def primary_plate(plates):
+    """The plate with the most characters (then the most confident), or None"""
+    if not plates:
+        return None
+    return max(plates, key=lambda plate: (len(plate.text), plate.score))
+
+
+def _split_rows(cluster, box_list):
+    """Split a plate's members into rows, top to bottom, each left to right"""
+    threshold = ROW_SPLIT_HEIGHTS * max(cluster.mean_height, 1)
+    by_centre = sorted(cluster.members, key=lambda index: box_list[index][1] + box_list[index][3])
+
+    rows = []
+    row_centre = None
+    for index in by_centre:
+        centre_y = (box_list[index][1] + box_list[index][3]) / 2
+        if row_centre is None or centre_y - row_centre > threshold:
+            rows.append([index])
+            row_centre = centre_y
+        else:
+            row = rows[-1]
+            row.append(index)
+            row_centre += (centre_y - row_centre) / len(row)
+
+    # Members were added in x order, so sorting indices restores it per row
+    return [sorted(row) for row in rows]
@@ -0,0 +1,160 @@
+"""
+Frame deduplication and temporal plate tracking for continuous capture
+
+A car in front of the camera stays there for dozens of frames. PlateTracker
+sits between the capture loop and LicensePlateDetector and does two things:
+
+* it skips inference on frames that look the same as the last processed one,
+  comparing a 64-bit difference hash (dHash) of a tiny grayscale thumbnail;
+* it follows each plate across frames, votes on its text (weighted by the
+  detector's confidence) and emits one TrackedDetection per vehicle pass once
+  the plate has not been seen for a while.
+"""
+from collections import namedtuple, defaultdict
+
+import cv2
+import numpy as np
+
+
+# text is the winning reading and confidence its share of the vote weight.
+# frames is how many frames saw the plate (unchanged frames skipped while it
+# was in view count too), frame the annotated frame with the best reading (for
+# the snapshot) and readings the weight per text.
+TrackedDetection = namedtuple('TrackedDetection', ['text', 'confidence', 'frames', 'frame', 'readings'])
+
+
+def frame_hash(frame, hash_size=8):
+    """64-bit difference hash of a frame, as an array of bools"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    thumbnail = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    return (thumbnail[:, 1:] > thumbnail[:, :-1]).ravel()
+
+
+def hash_distance(first, second):
+    return int(np.count_nonzero(first != second))
+
+
+class _Track:
+    def __init__(self, plate, frame):
+        self.box = plate.box
+        self.weights = defaultdict(float)
+        self.best = {}
+        self.frames = 0
+        self.missed = 0
+        self.update(plate, frame)
+
+    def update(self, plate, frame):
+        self.box = plate.box
+        self.weights[plate.text] += plate.score
+        if plate.score > self.best.get(plate.text, (0, None))[0]:
+            self.best[plate.text] = (plate.score, frame)
+        self.frames += 1
+        self.missed = 0
+
+    def seen_again(self):
+        """Count an unchanged frame that still shows this plate"""
+        self.frames += 1
+
+    def matches(self, plate, max_shift):
+        """Same text, or a box near where this plate was last seen"""
+        if plate.text in self.weights:
+            return True
+        x1, y1, x2, y2 = self.box
+        px1, py1, px2, py2 = plate.box
+        size = max(x2 - x1, y2 - y1, 1)
+        shift = abs((px1 + px2) - (x1 + x2)) / 2 + abs((py1 + py2) - (y1 + y2)) / 2
+        return shift <= max_shift * size
+
+    def consolidate(self):
+        text = max(self.weights, key=self.weights.get)
+        total = sum(self.weights.values())
+        return TrackedDetection(
+            text=text,
+            confidence=self.weights[text] / total if total else 0.0,
+            frames=self.frames,
+            frame=self.best[text][1],
+            readings=dict(self.weights),
+        )
+
+
+class PlateTracker:
+    """
+    Deduplicate frames and consolidate plate readings across a vehicle pass
+
+    ``hash_threshold`` is the number of differing dHash bits below which a
+    frame counts as unchanged. A track ends after ``max_missed`` frames
+    without its plate (unchanged frames count too, once the plate is gone),
+    and tracks seen on fewer than ``min_frames`` frames are discarded as
+    noise; an unchanged frame counts as a sighting of every plate in view, so
+    a vehicle standing still is kept. ``max_shift`` is how far, in plate sizes,
+    a plate may move between processed frames and still be the same vehicle.
+    """
+
+    def __init__(self, detector, hash_threshold=3, max_missed=5, min_frames=2, max_shift=3.0):
+        self.detector = detector
+        self.hash_threshold = hash_threshold
+        self.max_missed = max_missed
+        self.min_frames = min_frames
+        self.max_shift = max_shift
+
+        self._last_hash = None
+        self._tracks = []
+        self.frames_skipped = 0
+        self.frames_processed = 0
+
+    def process(self, frame):
+        """
+        Feed one frame; returns the TrackedDetections of passes that ended
+
+        Near-duplicate frames return immediately without running the model.
+        """
+        signature = frame_hash(frame)
+        if self._last_hash is not None and hash_distance(signature, self._last_hash) <= self.hash_threshold:
+            self.frames_skipped += 1
+            # An unchanged frame shows the same plates as the last processed
+            # one: tracks in view are seen again, missing ones stay missing
+            in_view = [track for track in self._tracks if not track.missed]
+            for track in in_view:
+                track.seen_again()
+            return self._age_tracks(set(id(track) for track in in_view))
+        self._last_hash = signature
+
+        frame_result = self.detector._process_frame(frame)
+        self.frames_processed += 1
+
+        matched = set()
+        for plate in frame_result.plates:
+            if not plate.text:
+                continue
+            track = next((track for track in self._tracks
+                          if id(track) not in matched and track.matches(plate, self.max_shift)), None)
+            if track is None:
+                track = _Track(plate, frame)
+                self._tracks.append(track)
+            else:
+                track.update(plate, frame)
+            matched.add(id(track))
+
+        return self._age_tracks(matched)
+
+    def _age_tracks(self, seen):
+        """Count a miss for every track not in ``seen``; emit the expired ones"""
+        finished = []
+        for track in self._tracks:
+            if id(track) not in seen:
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    finished.append(track)
+        return self._emit(finished)
+
+    def flush(self):
+        """End every open track (e.g. when the stream stops)"""
+        return self._emit(list(self._tracks))
+
+    def _emit(self, finished):
+        detections = []
+        for track in finished:
+            self._tracks.remove(track)
+            if track.frames >= self.min_frames:
+                detections.append(track.consolidate())
+        return detections
@@ -0,0 +1,17 @@
+import re
+
+
+# Anything that is not a letter or digit: spaces, dashes, dots, slashes, ...
+_NON_ALPHANUMERIC = re.compile(r'[\W_]+')
+
+
+def normalize_plate(plate_number):
+    """
+    Build the lookup key for a plate number
+
+    Case, whitespace and separators are ignored, so 'dhk-12 34', 'DHK 1234'
+    and 'DHK1234' all map to 'DHK1234'.
+    """
+    if not plate_number:
+        return ''
+    return _NON_ALPHANUMERIC.sub('', plate_number).upper()
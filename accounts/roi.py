@@ -0,0 +1,102 @@
+"""
+Region of interest and input size for inference
+
+Plates only ever appear in a fixed part of a camera's view, so the detector
+can crop each frame to that region and shrink it before inference; the model
+then works on far fewer pixels. Box coordinates are mapped back to the full
+frame afterwards, so snapshots and API responses are unaffected.
+
+Settings (all optional):
+    LICENSE_PLATE_ROIS            {source: (x_min, y_min, x_max, y_max)}, default {}
+    LICENSE_PLATE_INFERENCE_SIZE  longest side of the model input in pixels, default None
+
+ROI keys are sources as given to detect_license_plates --source (a camera
+index such as '0', a video path or a stream URL); the 'default' entry covers
+every source without its own. Integer coordinates are pixels, floats are
+fractions of the frame size. With no ROI the whole frame is used, and with no
+inference size the model's own default applies. Inputs are only ever shrunk,
+never enlarged. The inference size should be a multiple of 32.
+"""
+from collections import namedtuple
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+
+DEFAULT_ROI_KEY = 'default'
+
+# Maps model coordinates back to the frame: frame = model / scale + offset
+InputTransform = namedtuple('InputTransform', ['scale', 'offset_x', 'offset_y'])
+
+IDENTITY = InputTransform(1.0, 0, 0)
+
+
+def get_roi(source=None):
+    """Configured ROI for a source, falling back to the 'default' entry"""
+    rois = getattr(settings, 'LICENSE_PLATE_ROIS', {}) or {}
+    if source is not None and str(source) in rois:
+        return rois[str(source)]
+    return rois.get(DEFAULT_ROI_KEY)
+
+
+def get_inference_size():
+    return getattr(settings, 'LICENSE_PLATE_INFERENCE_SIZE', None)
+
+
+def resolve_roi(roi, frame_shape):
+    """
+    ROI in pixels, clipped to the frame
+
+    Returns None when there is no ROI or it covers the whole frame.
+    """
+    if roi is None:
+        return None
+    height, width = frame_shape[:2]
+    if len(roi) != 4:
+        raise ValueError(f"ROI must be (x_min, y_min, x_max, y_max), got {roi!r}")
+
+    if all(isinstance(value, float) for value in roi):
+        x_min, y_min, x_max, y_max = (roi[0] * width, roi[1] * height, roi[2] * width, roi[3] * height)
+    else:
+        x_min, y_min, x_max, y_max = roi
+    x_min, x_max = (int(np.clip(round(value), 0, width)) for value in (x_min, x_max))
+    y_min, y_max = (int(np.clip(round(value), 0, height)) for value in (y_min, y_max))
+
+    if x_max <= x_min or y_max <= y_min:
+        raise ValueError(f"ROI {roi!r} is empty for a {width}x{height} frame")
+    if (x_min, y_min, x_max, y_max) == (0, 0, width, height):
+        return None
+    return x_min, y_min, x_max, y_max
+
+
+def prepare_input(frame, roi=None, inference_size=None):
+    """
+    Crop ``frame`` to the ROI and shrink it to ``inference_size``
+
+    Returns the model input and the InputTransform that maps its
+    coordinates back to ``frame``. The crop is a view, not a copy.
+    """
+    offset_x = offset_y = 0
+    region = resolve_roi(roi, frame.shape)
+    if region is not None:
+        offset_x, offset_y, x_max, y_max = region
+        frame = frame[offset_y:y_max, offset_x:x_max]
+
+    scale = 1.0
+    longest_side = max(frame.shape[:2])
+    if inference_size and longest_side > inference_size:
+        scale = inference_size / longest_side
+        size = (max(int(round(frame.shape[1] * scale)), 1), max(int(round(frame.shape[0] * scale)), 1))
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+    return frame, InputTransform(scale, offset_x, offset_y)
+
+
+def to_frame_coords(xyxy, transform):
+    """Map an (N, 4) array of model boxes back to frame coordinates"""
+    if transform is None or transform == IDENTITY:
+        return xyxy
+    xyxy = np.asarray(xyxy, dtype=np.float32) / transform.scale
+    return xyxy + np.array([transform.offset_x, transform.offset_y,
+                            transform.offset_x, transform.offset_y], dtype=np.float32)
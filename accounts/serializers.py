@@ -21,5 +21,5 @@ class LicensePlateSerializer(serializers.ModelSerializer):
 class AIDetectedLicenseSerializer(serializers.ModelSerializer):
     class Meta:
         model = AIDetectedLicense
-        fields = ['id', 'plate_number', 'detection_timestamp', 'snapshot_path']
+        fields = ['id', 'plate_number', 'detection_timestamp', 'snapshot_path', 'source']
         read_only_fields = ['id', 'detection_timestamp']
\ No newline at end of file
@@ -0,0 +1,38 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_identities
+from .models import AIDetectedLicense, User
+from .plate_cache import detected_plates
+
+
+@receiver(post_save, sender=AIDetectedLicense)
+def add_detected_plate(sender, instance, created, **kwargs):
+    # Only once committed: a rolled back row must not count as detected, and
+    # other processes must not reload before they can see the change
+    if created:
+        plate_key = instance.plate_key
+        transaction.on_commit(lambda: detected_plates.add(plate_key))
+    else:
+        # The plate number may have changed, so the old key could be gone
+        transaction.on_commit(detected_plates.invalidate)
+
+
+@receiver(post_delete, sender=AIDetectedLicense)
+def remove_detected_plate(sender, instance, **kwargs):
+    # Other rows may share the key; let every process reload from the DB
+    transaction.on_commit(detected_plates.invalidate)
+
+
+@receiver(post_save, sender=User)
+def evict_user_tokens(sender, instance, **kwargs):
+    # is_verified or is_active may have changed (VerifyOTP, RegisterApi)
+    token_identities.evict_user(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def evict_deleted_token(sender, instance, **kwargs):
+    token_identities.evict(instance.key)
@@ -0,0 +1,128 @@
+"""
+Storage backends for detection snapshots
+
+Snapshots are saved through the ``snapshots`` alias of Django's STORAGES
+setting, under names relative to the storage root (see
+accounts.artifact_paths). The local setup is a FileSystemStorage rooted at
+LICENSE_PLATE_STORAGE_ROOT. Multi-node deployments point the alias at
+S3CompatibleStorage instead, which talks to AWS S3 or any S3-API server
+(MinIO, Ceph RGW, ...).
+"""
+import mimetypes
+import posixpath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage, storages
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import cached_property
+
+
+SNAPSHOT_STORAGE_ALIAS = 'snapshots'
+
+
+def get_snapshot_storage():
+    return storages[SNAPSHOT_STORAGE_ALIAS]
+
+
+@deconstructible(path='accounts.storage.S3CompatibleStorage')
+class S3CompatibleStorage(Storage):
+    """
+    Storage on an S3-compatible object store
+
+    Needs boto3, which is only imported when the storage is first used.
+    Uploads go through boto3's transfer manager: objects above
+    ``multipart_threshold`` are sent as multipart uploads, with up to
+    ``max_concurrency`` parts in flight at once.
+    """
+
+    def __init__(self, bucket_name, endpoint_url=None, access_key=None, secret_key=None,
+                 region_name=None, location='', multipart_threshold=8 * 1024 * 1024,
+                 multipart_chunksize=8 * 1024 * 1024, max_concurrency=4,
+                 querystring_expire=3600, client=None):
+        self.bucket_name = bucket_name
+        self.endpoint_url = endpoint_url
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region_name = region_name
+        self.location = location.strip('/')
+        self.multipart_threshold = multipart_threshold
+        self.multipart_chunksize = multipart_chunksize
+        self.max_concurrency = max_concurrency
+        self.querystring_expire = querystring_expire
+        self._client = client
+
+    @cached_property
+    def client(self):
+        if self._client is not None:
+            return self._client
+        import boto3
+
+        return boto3.client(
+            's3',
+            endpoint_url=self.endpoint_url,
+            aws_access_key_id=self.access_key,
+            aws_secret_access_key=self.secret_key,
+            region_name=self.region_name,
+        )
+
+    @cached_property
+    def transfer_config(self):
+        from boto3.s3.transfer import TransferConfig
+
+        return TransferConfig(
+            multipart_threshold=self.multipart_threshold,
+            multipart_chunksize=self.multipart_chunksize,
+            max_concurrency=self.max_concurrency,
+            use_threads=True,
+        )
+
+    def _key(self, name):
+        name = name.replace('\\', '/')
+        return posixpath.join(self.location, name) if self.location else name
+
+    def _open(self, name, mode='rb'):
+        response = self.client.get_object(Bucket=self.bucket_name, Key=self._key(name))
+        return ContentFile(response['Body'].read(), name=name)
+
+    def _save(self, name, content):
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        self.client.upload_fileobj(
+            content,
+            self.bucket_name,
+            self._key(name),
+            ExtraArgs={'ContentType': content_type},
+            Config=self.transfer_config,
+        )
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # Artifact names are unique already, and the caller has recorded the
+        # name it asked for, so never rename
+        return name
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket_name, Key=self._key(name))
+
+    def exists(self, name):
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket_name, Key=self._key(name))
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def size(self, name):
+        response = self.client.head_object(Bucket=self.bucket_name, Key=self._key(name))
+        return response['ContentLength']
+
+    def url(self, name):
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket_name, 'Key': self._key(name)},
+            ExpiresIn=self.querystring_expire,
+        )
@@ -0,0 +1,255 @@
+import queue
+import threading
+import time
+
+import cv2
+from django.db import connections
+
+from .artifact_writer import flush_artifacts
+from .detection_buffer import flush_detections
+
+
+# Marks the end of the stream on the stage queues
+_END_OF_STREAM = object()
+
+
+def parse_source(source):
+    """
+    Turn a command line source into something cv2.VideoCapture accepts
+
+    Digits are a device index, anything else is a file path or stream URL.
+    """
+    if isinstance(source, int):
+        return source
+    source = str(source).strip()
+    if source.isdigit():
+        return int(source)
+    return source
+
+
+def is_live_source(source):
+    """Devices and network streams are live, local video files are not"""
+    if isinstance(source, int):
+        return True
+    return '://' in source
+
+
+class StreamPipeline:
+    """
+    Long-running detection over a camera, video file or stream URL
+
+    Capture, inference and persistence each run on their own thread and are
+    connected by bounded queues. For live sources the capture stage drops the
+    oldest queued frame when inference falls behind, so the model always works
+    on the most recent frame. Video files are read with backpressure instead,
+    so every frame gets processed.
+
+    With a ``tracker`` (accounts.plate_tracker.PlateTracker) near-duplicate
+    frames skip inference and each vehicle pass is persisted once, with its
+    consolidated reading, instead of once per frame.
+    """
+
+    def __init__(self, detector, source, frame_queue_size=2, result_queue_size=32,
+                 save_to_db=True, reconnect_delay=1.0, max_reconnects=5, tracker=None):
+        self.detector = detector
+        self.tracker = tracker
+        self.source = parse_source(source)
+        self.live = is_live_source(self.source)
+        self.save_to_db = save_to_db
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnects = max_reconnects
+
+        self.frame_queue = queue.Queue(maxsize=frame_queue_size)
+        self.result_queue = queue.Queue(maxsize=result_queue_size)
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._errors = []
+
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.frames_processed = 0
+        self.detections = 0
+        self.started_at = None
+        self.finished_at = None
+
+    def start(self):
+        """Start the capture, inference and persistence threads"""
+        self.started_at = time.monotonic()
+        self._threads = [
+            threading.Thread(target=self._run_stage, args=(self._capture_loop,),
+                             name='plate-capture', daemon=True),
+            threading.Thread(target=self._run_stage, args=(self._inference_loop,),
+                             name='plate-inference', daemon=True),
+            threading.Thread(target=self._run_stage, args=(self._persistence_loop,),
+                             name='plate-persistence', daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Ask the capture stage to stop; queued work is still drained"""
+        self._stop_event.set()
+
+    def join(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+        if self.finished_at is None:
+            self.finished_at = time.monotonic()
+        if self._errors:
+            raise self._errors[0]
+
+    def run(self, duration=None):
+        """Run until the stream ends, ``duration`` seconds pass or Ctrl-C"""
+        self.start()
+        try:
+            deadline = time.monotonic() + duration if duration else None
+            while any(thread.is_alive() for thread in self._threads):
+                if deadline is not None and time.monotonic() >= deadline:
+                    self.stop()
+                    deadline = None
+                time.sleep(0.2)
+        except KeyboardInterrupt:
+            self.stop()
+        finally:
+            self.join()
+        return self.stats()
+
+    def stats(self):
+        end = self.finished_at or time.monotonic()
+        elapsed = max(end - (self.started_at or end), 1e-9)
+        return {
+            'frames_captured': self.frames_captured,
+            'frames_dropped': self.frames_dropped,
+            'frames_processed': self.frames_processed,
+            'frames_skipped': self.tracker.frames_skipped if self.tracker else 0,
+            'detections': self.detections,
+            'elapsed': elapsed,
+            'capture_fps': self.frames_captured / elapsed,
+            'inference_fps': self.frames_processed / elapsed,
+        }
+
+    def _run_stage(self, target):
+        try:
+            target()
+        except Exception as e:
+            self._errors.append(e)
+            self.stop()
+
+    def _open_capture(self):
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            cap.release()
+            return None
+        return cap
+
+    def _capture_loop(self):
+        cap = self._open_capture()
+        if cap is None:
+            self._put_blocking(self.frame_queue, _END_OF_STREAM)
+            raise Exception(f"Unable to open video source {self.source}")
+
+        reconnects = 0
+        try:
+            while not self._stop_event.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    # Network streams hiccup; files and unplugged devices just end
+                    if self.live and reconnects < self.max_reconnects:
+                        reconnects += 1
+                        cap.release()
+                        time.sleep(self.reconnect_delay)
+                        cap = self._open_capture() or cv2.VideoCapture()
+                        continue
+                    break
+
+                reconnects = 0
+                self.frames_captured += 1
+                if self.live:
+                    self._put_latest(frame)
+                else:
+                    self._put_blocking(self.frame_queue, frame)
+        finally:
+            cap.release()
+            self._put_blocking(self.frame_queue, _END_OF_STREAM, force=True)
+
+    def _inference_loop(self):
+        try:
+            while True:
+                frame = self.frame_queue.get()
+                if frame is _END_OF_STREAM:
+                    break
+
+                self.frames_processed += 1
+                if self.tracker is not None:
+                    self._queue_tracked(self.tracker.process(frame))
+                    continue
+
+                frame_result = self.detector._process_frame(frame)
+                if frame_result.plates:
+                    plate_texts = [plate.text for plate in frame_result.plates]
+                    self._put_blocking(self.result_queue, (frame, plate_texts), force=True)
+
+            if self.tracker is not None:
+                # Vehicle passes still open when the stream ends
+                self._queue_tracked(self.tracker.flush())
+        finally:
+            self._put_blocking(self.result_queue, _END_OF_STREAM, force=True)
+
+    def _queue_tracked(self, detections):
+        for detection in detections:
+            self._put_blocking(self.result_queue, (detection.frame, [detection.text]), force=True)
+
+    def _persistence_loop(self):
+        try:
+            while True:
+                try:
+                    item = self.result_queue.get(timeout=0.2)
+                except queue.Empty:
+                    # Nothing upstream will send the end marker after a crash
+                    if self._errors:
+                        break
+                    continue
+                if item is _END_OF_STREAM:
+                    break
+
+                frame, plate_texts = item
+                self.detector._save_detection(frame, plate_texts, self.save_to_db)
+                self.detections += len(plate_texts)
+        finally:
+            try:
+                # Write the rows still buffered, from this thread's connection
+                flush_detections()
+            finally:
+                # Make sure the snapshots queued by this stream are on disk
+                flush_artifacts()
+                # This thread opened its own DB connection
+                connections.close_all()
+
+    def _put_latest(self, frame):
+        """Queue a frame, discarding the oldest one if inference is behind"""
+        while True:
+            try:
+                self.frame_queue.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    self.frame_queue.get_nowait()
+                    self.frames_dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _put_blocking(self, target_queue, item, force=False):
+        """
+        Queue an item, waiting for space
+
+        Unless ``force`` is set, gives up once the pipeline is stopping so a
+        stalled downstream stage cannot hang the capture thread. Forced puts
+        only give up if a stage has crashed and nothing will drain the queue.
+        """
+        while True:
+            try:
+                target_queue.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                if self._errors or (self._stop_event.is_set() and not force):
+                    return False
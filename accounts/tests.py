@@ -1,3 +1,1144 @@
-from django.test import TestCase
+import calendar
+import csv
+import glob
+import importlib
+import importlib.util
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
 
-# Create your tests here.
+import cv2
+import numpy as np
+from django.core.files import locks
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.core.files.storage import FileSystemStorage
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.db import IntegrityError, OperationalError, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from . import inference_pool, model_registry
+from .authentication import CachedTokenAuthentication, token_identities
+from .artifact_writer import ArtifactWriter, flush_artifacts
+from .inference_backends import OnnxRuntimeBackend
+from .license_detector import LicensePlateDetector
+from .artifact_paths import new_artifact_paths, shard_end, to_relative
+from .detection_buffer import DetectionBuffer
+from .importer import import_detected_texts
+from .models import AIDetectedLicense, DetectedPlateVersion, LicensePlate, User
+from .plate_cache import DetectedPlateCache, detected_plates
+from .plate_fuzzy import FuzzyPlateIndex
+from . import metrics
+from .benchmarks import StubDetector, StubModel, bench_process_frame, generate_images, synthetic_frames
+from .stream_pipeline import StreamPipeline
+from .plate_grouping import Plate, group_characters, primary_plate
+from .plate_tracker import PlateTracker
+from .plates import normalize_plate
+from .roi import prepare_input, to_frame_coords
+from .storage import S3CompatibleStorage
+
+try:
+    import boto3
+    from moto.server import ThreadedMotoServer
+except ImportError:
+    boto3 = None
+
+try:
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+except ImportError:
+    onnx = None
+
+
+def _installed(*modules):
+    return all(importlib.util.find_spec(module) is not None for module in modules)
+
+
+class SnapshotStorageTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def test_writer_saves_snapshot_and_text_sidecar(self):
+        storage = FileSystemStorage(location=self.root, allow_overwrite=True)
+        writer = ArtifactWriter(storage=storage, threads=2, max_width=32)
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)
+        text_path = os.path.join(self.root, 'detected_texts', '2026', 'plate.txt')
+
+        writer.submit(frame, 'snapshots/2026/plate.jpg', 'AB12', text_path)
+        writer.close()
+
+        self.assertEqual(writer.failures, 0)
+        self.assertTrue(storage.exists('snapshots/2026/plate.jpg'))
+        with open(text_path) as text_file:
+            self.assertEqual(text_file.read(), 'AB12')
+
+    @unittest.skipIf(boto3 is None, 'boto3 and moto[server] are needed for the S3 stand-in')
+    def test_s3_storage_against_local_stand_in(self):
+        server = ThreadedMotoServer(port=0)
+        server.start()
+        self.addCleanup(server.stop)
+        host, port = server.get_host_and_port()
+        endpoint_url = f'http://{host}:{port}'
+
+        boto3.client('s3', endpoint_url=endpoint_url, region_name='us-east-1',
+                     aws_access_key_id='test', aws_secret_access_key='test',
+                     ).create_bucket(Bucket='snapshots')
+        storage = S3CompatibleStorage(
+            bucket_name='snapshots', endpoint_url=endpoint_url, region_name='us-east-1',
+            access_key='test', secret_key='test', location='lane-1',
+            multipart_threshold=5 * 1024 * 1024, multipart_chunksize=5 * 1024 * 1024,
+        )
+
+        # Large enough to go through a concurrent multipart upload
+        payload = os.urandom(11 * 1024 * 1024)
+        name = storage.save('snapshots/2026/plate.jpg', ContentFile(payload))
+
+        self.assertEqual(name, 'snapshots/2026/plate.jpg')
+        self.assertTrue(storage.exists(name))
+        self.assertFalse(storage.exists('snapshots/2026/missing.jpg'))
+        self.assertEqual(storage.size(name), len(payload))
+        self.assertEqual(storage.open(name).read(), payload)
+        storage.delete(name)
+        self.assertFalse(storage.exists(name))
+
+
+class PlateTrackerTests(SimpleTestCase):
+    class FakeDetector:
+        def __init__(self):
+            self.plates = []
+            self.calls = 0
+
+        def _process_frame(self, frame):
+            self.calls += 1
+            return SimpleNamespace(plates=self.plates)
+
+    def test_one_detection_per_vehicle_pass(self):
+        detector = self.FakeDetector()
+        tracker = PlateTracker(detector, max_missed=2)
+        empty = np.zeros((48, 64, 3), dtype=np.uint8)
+        detections = []
+
+        for _ in range(3):
+            detections += tracker.process(empty)
+        for step, (text, score) in enumerate([('AB12', 0.9), ('A812', 0.4), ('AB12', 0.8), ('AB1', 0.3)]):
+            detector.plates = [Plate(text, (10 + step * 4, 20, 40 + step * 4, 30), score, [text])]
+            frame = np.random.RandomState(step).randint(0, 255, empty.shape, dtype=np.uint8)
+            detections += tracker.process(frame)
+        detector.plates = []
+        for _ in range(5):
+            detections += tracker.process(empty)
+
+        self.assertEqual(len(detections), 1)
+        self.assertEqual(detections[0].text, 'AB12')
+        self.assertEqual(detections[0].frames, 4)
+        # Repeated empty frames are hashed, not run through the model
+        self.assertEqual(detector.calls, 6)
+        self.assertEqual(tracker.frames_skipped, 6)
+        self.assertEqual(tracker.flush(), [])
+
+    def test_vehicle_standing_still_is_detected(self):
+        detector = self.FakeDetector()
+        tracker = PlateTracker(detector, max_missed=2, min_frames=2)
+        waiting = np.random.RandomState(0).randint(0, 255, (48, 64, 3), dtype=np.uint8)
+        detector.plates = [Plate('AB12', (10, 20, 40, 30), 0.9, ['AB12'])]
+        detections = []
+
+        # A car waiting at the barrier: the model runs on the first frame only
+        for _ in range(40):
+            detections += tracker.process(waiting)
+        detector.plates = []
+        for _ in range(10):
+            detections += tracker.process(np.zeros_like(waiting))
+
+        self.assertEqual(detector.calls, 2)
+        self.assertEqual(tracker.frames_skipped, 48)
+        self.assertEqual(len(detections), 1)
+        self.assertEqual(detections[0].text, 'AB12')
+        self.assertEqual(detections[0].frames, 40)
+
+
+class RegionOfInterestTests(SimpleTestCase):
+    def test_boxes_map_back_to_the_full_frame(self):
+        frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
+
+        # Bottom half of the frame, shrunk to 640 pixels wide
+        model_input, transform = prepare_input(frame, (0.0, 0.5, 1.0, 1.0), 640)
+
+        self.assertEqual(model_input.shape, (180, 640, 3))
+        np.testing.assert_allclose(
+            to_frame_coords(np.array([[10, 20, 30, 40]]), transform),
+            [[30, 600, 90, 660]],
+        )
+
+    def test_whole_frame_at_native_size_is_untouched(self):
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+
+        model_input, transform = prepare_input(frame, (0, 0, 640, 480), 640)
+
+        self.assertIs(model_input, frame)
+        self.assertEqual(transform.scale, 1.0)
+
+
+class BenchmarkHarnessTests(SimpleTestCase):
+    def test_stub_detector_runs_the_real_post_processing(self):
+        detector = StubDetector()
+        frame = synthetic_frames(1, 320, 240)[0]
+
+        stats = bench_process_frame(detector, [frame], iterations=5, warmup=1)
+
+        # Seven synthetic characters survive the confidence filter, the noise does not
+        self.assertEqual(len(detector._process_frame(frame.copy()).text), 7)
+        self.assertEqual(stats['calls'], 5)
+        self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+        self.assertGreater(stats['peak_rss_mb'], 0)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.clear()
+        User.objects.create(email='driver@example.com', is_verified=True)
+
+    @override_settings(LICENSE_PLATE_SERVER_TIMING=True)
+    def test_api_requests_are_timed_and_exported(self):
+        response = self.client.post('/api/auth/verify-plate',
+                                    {'email': 'driver@example.com', 'plate_number': 'AB 12'})
+        with metrics.stage_timer('inference'):
+            pass
+
+        self.assertIn('total;dur=', response['Server-Timing'])
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries"')
+
+        exported = self.client.get('/metrics').content.decode()
+        self.assertIn('license_plate_request_seconds_count{view="VerifyLicensePlateAPI",method="POST",status="404"} 1',
+                      exported)
+        self.assertIn('license_plate_stage_seconds_count{stage="inference"} 1', exported)
+        # The metrics endpoint does not time itself
+        self.assertNotIn('metrics_view', exported)
+
+
+class InferenceBackendTests(SimpleTestCase):
+    @unittest.skipIf(onnx is None or not _installed('onnxruntime'), 'onnx and onnxruntime are needed')
+    def test_onnx_backend_decodes_yolo_output(self):
+        # A graph that ignores its input and returns fixed YOLOv8 predictions:
+        # centre x/y, width, height, then one score per class, per anchor
+        predictions = np.zeros((1, 7, 3), dtype=np.float32)
+        predictions[0, :, 0] = [320, 320, 20, 40, 0, 0.9, 0]
+        predictions[0, :, 1] = [322, 321, 20, 40, 0, 0.8, 0]  # overlaps the first one
+        predictions[0, :, 2] = [100, 320, 20, 40, 0, 0, 0.1]  # below the threshold
+        graph = helper.make_graph(
+            [helper.make_node('ReduceSum', ['images'], ['total'], keepdims=0),
+             helper.make_node('Mul', ['total', 'zero'], ['nothing']),
+             helper.make_node('Add', ['predictions', 'nothing'], ['output0'])],
+            'fixed',
+            [helper.make_tensor_value_info('images', TensorProto.FLOAT, [1, 3, 640, 640])],
+            [helper.make_tensor_value_info('output0', TensorProto.FLOAT, [1, 7, 3])],
+            [numpy_helper.from_array(predictions, 'predictions'),
+             numpy_helper.from_array(np.array(0, dtype=np.float32), 'zero')],
+        )
+        model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+        model.ir_version = 8
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        model_path = os.path.join(directory, 'best.onnx')
+        onnx.save(model, model_path)
+
+        backend = OnnxRuntimeBackend(model_path)
+        results = backend([np.zeros((720, 1280, 3), dtype=np.uint8)] * 2)
+
+        # 1280x720 is letterboxed at half scale with 140 pixels of padding above
+        self.assertEqual(len(results), 2)
+        np.testing.assert_allclose(results[0].boxes.xyxy, [[620, 320, 660, 400]])
+        np.testing.assert_allclose(results[0].boxes.cls, [1])
+        np.testing.assert_allclose(results[0].boxes.conf, [0.9], rtol=1e-6)
+
+    def test_engines_agree_on_plate_text(self):
+        engines = [engine for engine, module in (('onnx', 'onnxruntime'), ('openvino', 'openvino'))
+                   if _installed(module) and os.path.exists(model_registry.get_model_path(engine))]
+        images = sorted(glob.glob(os.path.join(settings.BASE_DIR, 'snapshots', '*.jpg')))
+        if not _installed('ultralytics') or not os.path.exists(model_registry.get_weights_path()):
+            self.skipTest('ultralytics and best.pt are needed')
+        if not engines or not images:
+            self.skipTest('no exported model (manage.py export_model) or sample images')
+
+        torch_detector = LicensePlateDetector(engine='torch')
+        for engine in engines:
+            detector = LicensePlateDetector(engine=engine)
+            for image_path in images:
+                with self.subTest(engine=engine, image=os.path.basename(image_path)):
+                    frame = cv2.imread(image_path)
+                    self.assertEqual(detector._process_frame(frame.copy()).text,
+                                     torch_detector._process_frame(frame.copy()).text)
+
+    def test_half_precision_export_is_openvino_only(self):
+        with self.assertRaisesMessage(CommandError, '--half is only supported with --format openvino'):
+            call_command('export_model', format='onnx', half=True)
+
+
+class StartupImportTests(SimpleTestCase):
+    """Web workers must not load the ML stack until a detection is requested"""
+
+    HEAVY_MODULES = ['torch', 'cv2', 'ultralytics', 'onnxruntime', 'openvino']
+
+    def loaded_heavy_modules(self, code):
+        script = (
+            'import os, sys\n'
+            "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'auth_otp.settings')\n"
+            f'{code}\n'
+            f'print("loaded:" + ",".join(module for module in {self.HEAVY_MODULES!r} if module in sys.modules))\n'
+        )
+        completed = subprocess.run([sys.executable, '-c', script], cwd=settings.BASE_DIR,
+                                   capture_output=True, text=True, timeout=120)
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        loaded = completed.stdout.strip().splitlines()[-1]
+        self.assertTrue(loaded.startswith('loaded:'), completed.stdout)
+        return [module for module in loaded[len('loaded:'):].split(',') if module]
+
+    def test_importing_views_skips_ml_modules(self):
+        self.assertEqual(self.loaded_heavy_modules('import django; django.setup(); import accounts.views'), [])
+
+    def test_check_command_skips_ml_modules(self):
+        code = ("from django.core.management import execute_from_command_line; "
+                "execute_from_command_line(['manage.py', 'check'])")
+        self.assertEqual(self.loaded_heavy_modules(code), [])
+
+
+class SqlitePragmaTests(SimpleTestCase):
+    def test_new_connections_get_the_configured_pragmas(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        default = connections['default']
+        connection = default.__class__({**default.settings_dict, 'NAME': os.path.join(root, 'plates.sqlite3')},
+                                       alias='pragma-test')
+        self.addCleanup(connection.close)
+
+        with connection.cursor() as cursor:
+            values = {}
+            for name in ['journal_mode', 'busy_timeout', 'synchronous']:
+                cursor.execute(f'PRAGMA {name}')
+                values[name] = cursor.fetchone()[0]
+
+        # synchronous=NORMAL reads back as 1
+        self.assertEqual(values, {'journal_mode': 'wal', 'busy_timeout': 20000, 'synchronous': 1})
+
+
+class DetectionBufferTests(TestCase):
+    def test_rows_are_written_in_batches_and_on_flush(self):
+        buffer = DetectionBuffer(batch_size=3, flush_interval_ms=0)
+        # The membership set outlives the test's transaction
+        self.addCleanup(detected_plates.clear)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for plate_number in ['AB 12', 'CD-34', 'EF56', 'GH78', 'IJ90']:
+                buffer.add(plate_number, 'snapshots/plate.jpg')
+
+            # One full batch written, the rest still waiting
+            self.assertEqual(AIDetectedLicense.objects.count(), 3)
+            self.assertEqual(buffer.pending(), 2)
+
+            self.assertEqual(buffer.flush(), 2)
+
+        self.assertEqual(AIDetectedLicense.objects.count(), 5)
+        self.assertEqual(buffer.flushes, 2)
+        self.assertTrue(AIDetectedLicense.objects.filter(plate_key='CD34').exists())
+        self.assertTrue(detected_plates.contains('AB12'))
+
+    def test_rejected_row_does_not_block_the_rest(self):
+        buffer = DetectionBuffer(batch_size=3, flush_interval_ms=0, max_pending=4)
+        self.addCleanup(detected_plates.clear)
+
+        # plate_number is NOT NULL; alone, the row looks like an outage and is kept
+        buffer.add(None)
+        self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.pending(), 1)
+
+        for plate_number in ['AB12', 'CD34', 'EF56', 'GH78']:
+            buffer.add(plate_number)
+        buffer.flush()
+
+        self.assertEqual(AIDetectedLicense.objects.count(), 4)
+        self.assertEqual(buffer.pending(), 0)
+        self.assertEqual(buffer.dropped, 1)
+
+    def test_pending_rows_are_capped(self):
+        buffer = DetectionBuffer(batch_size=2, flush_interval_ms=0, max_pending=3)
+        buffer._write = Mock(side_effect=OperationalError('database is locked'))
+
+        # add() never raises; the rows wait for the database to come back
+        for plate_number in ['AB12', 'CD34', 'EF56', 'GH78']:
+            buffer.add(plate_number)
+
+        self.assertEqual(buffer.pending(), 3)
+        self.assertEqual(buffer.dropped, 1)
+        # Rows were lost, so an explicit flush reports the outage
+        with self.assertRaises(OperationalError):
+            buffer.flush()
+        self.assertEqual(buffer.pending(), 3)
+
+
+class FuzzyVerifyTests(TestCase):
+    def setUp(self):
+        User.objects.create(email='driver@example.com', is_verified=True)
+        self.addCleanup(detected_plates.clear)
+        # The set is loaded on first use, after the rows below exist
+        detected_plates.clear()
+
+    def test_index_weights_model_confusions(self):
+        index = FuzzyPlateIndex(['DHK1234', 'DHK1235', 'XYZ999'])
+
+        # O/0 and I/1 misreads are cheap, a different digit costs a full edit
+        self.assertEqual(index.search('DHKI234'), [('DHK1234', 0.2)])
+        self.assertEqual(index.search('0HKI234'), [('DHK1234', 0.6)])
+        self.assertEqual([key for key, _ in index.search('DHK1236')], ['DHK1234', 'DHK1235'])
+        self.assertEqual(index.search('ABC123'), [])
+
+    def test_fuzzy_verify_returns_candidates_without_verifying(self):
+        AIDetectedLicense.objects.create(plate_number='DHK 1234')
+        AIDetectedLicense.objects.create(plate_number='XYZ 999')
+        data = {'email': 'driver@example.com', 'plate_number': 'DHK I234'}
+
+        exact = self.client.post('/api/auth/verify-plate', data).json()
+        self.assertEqual(exact['status'], 404)
+        self.assertNotIn('candidates', exact)
+
+        fuzzy = self.client.post('/api/auth/verify-plate', {**data, 'fuzzy': 'true'}).json()
+        self.assertEqual(fuzzy['status'], 404)
+        self.assertFalse(fuzzy['verified'])
+        self.assertEqual(fuzzy['candidates'], [{'plate_key': 'DHK1234', 'distance': 0.2}])
+
+        for max_distance in ['nan', 'inf', '-1', 'far']:
+            response = self.client.post('/api/auth/verify-plate', {**data, 'fuzzy': 'true', 'max_distance': max_distance})
+            self.assertEqual(response.json()['status'], 400)
+
+
+class WindowedVerifyTests(TestCase):
+    def setUp(self):
+        User.objects.create(email='driver@example.com', is_verified=True)
+        self.addCleanup(detected_plates.clear)
+        # The set is loaded on first use, after the rows below exist
+        detected_plates.clear()
+        AIDetectedLicense.objects.create(plate_number='DHK 1234', source='gate-1')
+        old = AIDetectedLicense.objects.create(plate_number='XYZ 999', source='gate-1')
+        AIDetectedLicense.objects.filter(pk=old.pk).update(
+            detection_timestamp=old.detection_timestamp - timedelta(hours=2))
+
+    def verify(self, plate_number, **data):
+        return self.client.post('/api/auth/verify-plate',
+                                {'email': 'driver@example.com', 'plate_number': plate_number, **data}).json()
+
+    def test_only_recent_detections_count(self):
+        self.assertTrue(self.verify('XYZ 999')['verified'])
+        self.assertFalse(self.verify('XYZ 999', within_minutes=30)['verified'])
+        self.assertTrue(self.verify('XYZ 999', within_minutes=180)['verified'])
+        self.assertTrue(self.verify('DHK 1234', within_minutes=30, source='gate-1')['verified'])
+        self.assertFalse(self.verify('DHK 1234', within_minutes=30, source='gate-2')['verified'])
+        for within_minutes in ['soon', '0', 'nan', '1e12']:
+            self.assertEqual(self.verify('DHK 1234', within_minutes=within_minutes)['status'], 400)
+
+    def test_window_probe_uses_composite_index(self):
+        window_start = timezone.now() - timedelta(minutes=30)
+        plan = (AIDetectedLicense.objects
+                .filter(plate_key='DHK1234', source='gate-1', detection_timestamp__gte=window_start)
+                .explain())
+        self.assertIn('aidetected_key_src_time_idx', plan)
+
+
+class CachedIdentityTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='driver@example.com', is_verified=True)
+        self.token = Token.objects.create(user=self.user)
+        self.addCleanup(token_identities.clear)
+        self.addCleanup(detected_plates.clear)
+        detected_plates.clear()
+        AIDetectedLicense.objects.create(plate_number='AB 12')
+
+    def get_detections(self):
+        return self.client.get('/api/auth/ai-detected-plates', {'email': 'driver@example.com'},
+                               HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_identity_is_resolved_once_and_cached(self):
+        self.get_detections()
+        # Token and permission check come from the cache, only the listing queries remain
+        with self.assertNumQueries(1):
+            response = self.get_detections()
+        self.assertEqual(response.json()['status'], 200)
+
+    def test_cached_user_answers_permission_checks_without_queries(self):
+        self.user.is_staff = True
+        self.user.save()
+        authentication = CachedTokenAuthentication()
+        authentication.authenticate_credentials(self.token.key)
+
+        with self.assertNumQueries(0):
+            user, _ = authentication.authenticate_credentials(self.token.key)
+            self.assertEqual((user.pk, user.email, user.is_verified), (self.user.pk, 'driver@example.com', True))
+            self.assertTrue(user.is_active and user.is_staff)
+            self.assertFalse(user.is_superuser)
+
+    def test_saving_the_user_evicts_its_tokens(self):
+        self.get_detections()
+        self.user.is_verified = False
+        self.user.save()
+        self.assertEqual(self.get_detections().status_code, 403)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='driver@example.com', is_verified=True)
+        self.addCleanup(token_identities.clear)
+
+    def export(self, token=None, **params):
+        headers = {'HTTP_AUTHORIZATION': f'Token {token.key}'} if token else {}
+        return self.client.get('/api/auth/ai-detected-plates/export',
+                               {'email': 'driver@example.com', **params}, **headers)
+
+    def test_only_staff_can_export_submitted_plates(self):
+        LicensePlate.objects.create(user=self.user, plate_number='AB12')
+
+        self.assertEqual(self.export(model='plates').json()['status'], 403)
+        user_token = Token.objects.create(user=self.user)
+        self.assertEqual(self.export(user_token, model='plates').json()['status'], 403)
+
+        staff = User.objects.create(email='staff@example.com', is_verified=True, is_staff=True)
+        response = self.export(Token.objects.create(user=staff), model='plates', output='csv')
+        self.assertIn('driver@example.com', b''.join(response.streaming_content).decode())
+
+    def create_detections(self):
+        old = AIDetectedLicense.objects.create(plate_number='AB 12', snapshot_path='snapshots/old.jpg')
+        AIDetectedLicense.objects.create(plate_number='CD 34', source='gate-1')
+        cutoff = timezone.now() - timedelta(hours=1)
+        AIDetectedLicense.objects.filter(pk=old.pk).update(detection_timestamp=cutoff - timedelta(hours=1))
+        return cutoff
+
+    def test_ndjson_and_csv_exports(self):
+        cutoff = self.create_detections()
+
+        response = self.export()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['plate_number'] for row in rows], ['AB 12', 'CD 34'])
+        self.assertEqual(set(rows[0]), {'id', 'plate_number', 'detection_timestamp', 'snapshot_path', 'source'})
+
+        response = self.export(output='csv', since=cutoff.isoformat())
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([(row['plate_number'], row['source']) for row in rows], [('CD 34', 'gate-1')])
+
+        self.assertEqual(self.export(since='yesterday').json()['status'], 400)
+
+    def test_export_command(self):
+        cutoff = self.create_detections()
+        output = os.path.join(tempfile.mkdtemp(), 'detections')
+        self.addCleanup(shutil.rmtree, os.path.dirname(output))
+
+        call_command('export_detections', output=output, stderr=io.StringIO())
+        with open(output) as export_file:
+            self.assertEqual([json.loads(line)['plate_number'] for line in export_file], ['AB 12', 'CD 34'])
+
+        call_command('export_detections', format='csv', since=cutoff.isoformat(), output=output,
+                     stderr=io.StringIO())
+        with open(output, newline='') as export_file:
+            self.assertEqual([row['plate_number'] for row in csv.DictReader(export_file)], ['CD 34'])
+
+
+class DetectSavePermissionTests(TestCase):
+    def setUp(self):
+        self.addCleanup(token_identities.clear)
+        _, encoded = cv2.imencode('.jpg', np.zeros((32, 32, 3), dtype=np.uint8))
+        self.image = encoded.tobytes()
+
+    def detect(self, user, **params):
+        token = Token.objects.create(user=user)
+        query = '?' + '&'.join(f'{key}={value}' for key, value in params.items()) if params else ''
+        with patch('accounts.views._run_detection', return_value={'text': '', 'timing': {}}) as run:
+            response = self.client.post(f'/api/auth/detect{query}', self.image, content_type='image/jpeg',
+                                        HTTP_AUTHORIZATION=f'Token {token.key}').json()
+        return response, run
+
+    def test_only_staff_and_devices_save_by_default(self):
+        driver = User.objects.create(email='driver@example.com', is_verified=True)
+        response, run = self.detect(driver)
+        self.assertEqual(response['status'], 200)
+        self.assertFalse(run.call_args.args[1])
+
+        response, run = self.detect(User.objects.create(email='other@example.com'), save=1)
+        self.assertEqual(response['status'], 403)
+        run.assert_not_called()
+
+        device = User.objects.create(email='gate-1@example.com')
+        device.groups.add(Group.objects.create(name=settings.LICENSE_PLATE_DEVICE_GROUP))
+        response, run = self.detect(device)
+        self.assertTrue(run.call_args.args[1])
+
+        staff = User.objects.create(email='staff@example.com', is_staff=True)
+        response, run = self.detect(staff, save=0)
+        self.assertFalse(run.call_args.args[1])
+
+
+class DetectUploadTests(TestCase):
+    def setUp(self):
+        self.addCleanup(token_identities.clear)
+        user = User.objects.create(email='driver@example.com', is_verified=True)
+        self.auth = {'HTTP_AUTHORIZATION': f'Token {Token.objects.create(user=user).key}'}
+        _, encoded = cv2.imencode('.jpg', synthetic_frames(1, 160, 120)[0])
+        self.image = encoded.tobytes()
+        # Start from a fresh pool built from the settings under test
+        inference_pool.shutdown()
+        self.addCleanup(inference_pool.shutdown)
+
+    def fake_detection(self, frame, save_to_db, submitted_at):
+        self.frames.append(frame)
+        return {'text': 'AB12', 'timing': {}}
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=1)
+    def test_raw_and_multipart_bodies_are_decoded_in_memory(self):
+        self.frames = []
+        # The default handlers would spool anything over 1 byte to a temp file
+        with patch('accounts.views._run_detection', self.fake_detection), \
+                patch('django.core.files.uploadhandler.TemporaryUploadedFile') as temporary_file:
+            raw = self.client.post('/api/auth/detect', self.image, content_type='image/jpeg', **self.auth).json()
+            multipart = self.client.post('/api/auth/detect', {'image': ContentFile(self.image, name='gate.jpg')},
+                                         **self.auth).json()
+
+        self.assertEqual(raw['status'], 200)
+        self.assertEqual(multipart['status'], 200)
+        self.assertEqual(raw['data']['text'], 'AB12')
+        temporary_file.assert_not_called()
+        self.assertEqual([frame.shape for frame in self.frames], [(120, 160, 3), (120, 160, 3)])
+
+    @override_settings(LICENSE_PLATE_INFERENCE_WORKERS=1, LICENSE_PLATE_INFERENCE_QUEUE=0)
+    def test_saturated_pool_answers_429(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        inference_pool.submit(release.wait)
+
+        with patch('accounts.views._run_detection') as run:
+            response = self.client.post('/api/auth/detect', self.image, content_type='image/jpeg', **self.auth)
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(response.json()['status'], 429)
+        run.assert_not_called()
+
+    @override_settings(LICENSE_PLATE_MAX_UPLOAD_BYTES=1024)
+    def test_large_upload_answers_413(self):
+        self.assertGreater(len(self.image), 1024)
+        with patch('accounts.views._run_detection') as run:
+            response = self.client.post('/api/auth/detect', self.image, content_type='image/jpeg', **self.auth)
+
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json()['status'], 413)
+        run.assert_not_called()
+
+
+@override_settings(LICENSE_PLATE_CACHE_REFRESH=0)
+class DetectedPlateCacheTests(TestCase):
+    def setUp(self):
+        detected_plates.clear()
+        self.addCleanup(detected_plates.clear)
+
+    def test_refresh_picks_up_rows_committed_out_of_id_order(self):
+        AIDetectedLicense.objects.create(id=100, plate_number='AB12')
+        self.assertTrue(detected_plates.contains('AB12'))
+
+        # Another writer's lower id commits after the set has seen id 100
+        AIDetectedLicense.objects.bulk_create([AIDetectedLicense(id=50, plate_number='CD34', plate_key='CD34')])
+        self.assertTrue(detected_plates.contains('CD34'))
+
+    def test_rolled_back_rows_are_not_added(self):
+        self.assertFalse(detected_plates.contains('AB12'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    AIDetectedLicense.objects.create(plate_number='AB12')
+                    raise IntegrityError('rolled back')
+            except IntegrityError:
+                pass
+            AIDetectedLicense.objects.create(plate_number='CD34')
+
+        self.assertEqual(detected_plates._keys, {'CD34'})
+
+
+@override_settings(LICENSE_PLATE_CACHE_REFRESH=0)
+class DetectedPlateReloadTests(TransactionTestCase):
+    def setUp(self):
+        self.addCleanup(detected_plates.clear)
+        AIDetectedLicense.objects.create(plate_number='AB12')
+        AIDetectedLicense.objects.create(plate_number='CD34')
+
+    def test_delete_in_another_process_reloads_without_blocking_readers(self):
+        # A worker's set, loaded at startup
+        worker = DetectedPlateCache()
+        worker.preload(background=True).join()
+        self.assertTrue(worker.contains('AB12'))
+
+        # Another process deletes the row; only the database is shared
+        AIDetectedLicense.objects.filter(plate_key='AB12').delete()
+        self.assertEqual(DetectedPlateVersion.objects.get().version, 1)
+
+        # Readers keep answering from the current set while it reloads
+        with worker._lock:
+            self.assertTrue(worker.contains('CD34'))
+        self.assertTrue(worker.contains('AB12'))
+        worker._reload_thread.join()
+
+        self.assertFalse(worker.contains('AB12'))
+        self.assertTrue(worker.contains('CD34'))
+
+
+class ImporterTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.detected_dir = os.path.join(self.root, 'detected_texts')
+        self.snapshot_dir = os.path.join(self.root, 'snapshots')
+        os.makedirs(self.detected_dir)
+        detected_plates.clear()
+        self.addCleanup(detected_plates.clear)
+
+    def write_text(self, text, timestamp=None, legacy=False):
+        timestamp = int(timestamp if timestamp is not None else time.time() - 60)
+        if legacy:
+            # Flat layout, no suffix
+            path = os.path.join(self.detected_dir, f'license_plate_{timestamp}.txt')
+        else:
+            _, text_path = new_artifact_paths(timestamp)
+            path = os.path.join(self.detected_dir, os.path.relpath(text_path, 'detected_texts'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as text_file:
+            text_file.write(text)
+        return path
+
+    def run_import(self, **kwargs):
+        return import_detected_texts(self.detected_dir, self.snapshot_dir, **kwargs)
+
+    def test_files_written_after_the_mark_are_still_imported(self):
+        self.write_text('AB12')
+        self.assertEqual(self.run_import()['imported'], 1)
+
+        # Named before the mark, but written by a lagging writer only now
+        self.write_text('CD34', time.time() - 30)
+        self.assertEqual(self.run_import(), {'scanned': 1, 'imported': 1, 'skipped': 0})
+        self.assertEqual(self.run_import()['scanned'], 0)
+
+    def test_second_run_imports_nothing_and_full_rescans(self):
+        self.write_text('AB12')
+        self.assertEqual(self.run_import(), {'scanned': 1, 'imported': 1, 'skipped': 0})
+        self.assertEqual(self.run_import(), {'scanned': 0, 'imported': 0, 'skipped': 0})
+
+        # A full run reads everything again but finds the plate known
+        self.assertEqual(self.run_import(full=True), {'scanned': 1, 'imported': 0, 'skipped': 1})
+        self.assertEqual(AIDetectedLicense.objects.count(), 1)
+
+    def test_shards_that_ended_before_the_mark_are_skipped(self):
+        self.run_import()
+        # The name is recent, so only skipping the 2020 shard unread keeps it out
+        path = os.path.join(self.detected_dir, '2020', '01', '01', '00',
+                            f'license_plate_{int(time.time()) - 60}_abc.txt')
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as text_file:
+            text_file.write('AB12')
+
+        self.assertEqual(self.run_import()['scanned'], 0)
+        self.assertEqual(self.run_import(full=True)['imported'], 1)
+
+    def test_legacy_flat_files_are_imported(self):
+        self.write_text('AB12', legacy=True)
+        # Files without a timestamp in the name use their mtime
+        other = os.path.join(self.detected_dir, 'manual.txt')
+        with open(other, 'w') as text_file:
+            text_file.write('CD34')
+        os.utime(other, (time.time() - 60, time.time() - 60))
+
+        self.assertEqual(self.run_import()['imported'], 2)
+        self.assertEqual(set(AIDetectedLicense.objects.values_list('plate_key', flat=True)), {'AB12', 'CD34'})
+
+    def test_rerun_after_a_crash_does_not_duplicate_rows(self):
+        self.write_text('AB12')
+        # Rows committed, state file never written
+        with patch('accounts.importer.save_state', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                self.run_import()
+
+        self.assertEqual(self.run_import(), {'scanned': 1, 'imported': 0, 'skipped': 1})
+        self.assertEqual(AIDetectedLicense.objects.count(), 1)
+
+    def test_runs_on_the_same_directory_wait_for_each_other(self):
+        self.write_text('AB12')
+        with open(os.path.join(self.detected_dir, '.import_state.lock'), 'a') as lock_file:
+            # Another importer holds the lock for a moment
+            locks.lock(lock_file, locks.LOCK_EX)
+            release = threading.Timer(0.3, locks.unlock, [lock_file])
+            release.start()
+            started = time.monotonic()
+            self.assertEqual(self.run_import()['imported'], 1)
+            release.join()
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.3)
+
+    def test_every_line_of_a_file_is_a_plate(self):
+        self.write_text('AB12\nCD-34\n\nab 12\n')
+
+        self.assertEqual(self.run_import(), {'scanned': 1, 'imported': 2, 'skipped': 1})
+        self.assertEqual(sorted(AIDetectedLicense.objects.values_list('plate_number', flat=True)), ['AB12', 'CD-34'])
+
+
+class PlateKeyTests(TestCase):
+    def test_normalize_plate_ignores_case_and_separators(self):
+        for plate_number in ['dhk-12 34', 'DHK 1234', ' DHK.12/34_', 'DHK1234']:
+            self.assertEqual(normalize_plate(plate_number), 'DHK1234')
+        self.assertEqual(normalize_plate(None), '')
+        self.assertEqual(normalize_plate(' - '), '')
+
+    def test_save_fills_plate_key(self):
+        detection = AIDetectedLicense.objects.create(plate_number='ab-12')
+        self.assertEqual(detection.plate_key, 'AB12')
+
+        # update_fields naming plate_number writes the key too
+        detection.plate_number = 'cd 34'
+        detection.save(update_fields=['plate_number'])
+        detection.refresh_from_db()
+        self.assertEqual(detection.plate_key, 'CD34')
+
+    def test_migration_backfills_existing_rows(self):
+        migration = importlib.import_module('accounts.migrations.0003_aidetectedlicense_plate_key')
+        AIDetectedLicense.objects.bulk_create([
+            AIDetectedLicense(plate_number=plate_number) for plate_number in ['ab 12', 'CD-34']
+        ])
+        self.assertEqual(set(AIDetectedLicense.objects.values_list('plate_key', flat=True)), {''})
+
+        migration.backfill_plate_keys(django_apps, None)
+
+        self.assertEqual(set(AIDetectedLicense.objects.values_list('plate_key', flat=True)), {'AB12', 'CD34'})
+
+
+class DetectionListingTests(TestCase):
+    def setUp(self):
+        User.objects.create(email='driver@example.com', is_verified=True)
+        AIDetectedLicense.objects.bulk_create([
+            AIDetectedLicense(plate_number=plate_number, plate_key=normalize_plate(plate_number))
+            for plate_number in ['AB 12', 'AB 13', 'CD 34', 'AB 14', 'EF 56']
+        ])
+        # Every row in the same instant, so only the id orders them
+        AIDetectedLicense.objects.update(detection_timestamp=timezone.now())
+
+    def list_page(self, **params):
+        return self.client.get('/api/auth/ai-detected-plates', {'email': 'driver@example.com', **params}).json()
+
+    def test_pages_cover_rows_sharing_a_timestamp(self):
+        ids, cursor = [], None
+        while True:
+            page = self.list_page(limit=2, **({'cursor': cursor} if cursor else {}))
+            self.assertLessEqual(len(page['data']), 2)
+            ids.extend(row['id'] for row in page['data'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+
+        self.assertEqual(ids, sorted(AIDetectedLicense.objects.values_list('id', flat=True)))
+
+    def test_invalid_cursor_is_rejected(self):
+        self.assertEqual(self.list_page(cursor='not-a-cursor')['status'], 400)
+
+    def test_fields_and_plate_prefix(self):
+        page = self.list_page(fields='plate_number', plate_prefix='ab-1')
+
+        self.assertEqual(page['data'], [{'plate_number': 'AB 12'}, {'plate_number': 'AB 13'}, {'plate_number': 'AB 14'}])
+        self.assertEqual(self.list_page(fields='plate_number,otp')['status'], 400)
+
+
+class PlateGroupingTests(SimpleTestCase):
+    def characters(self, *rows):
+        """(text, x, y) rows of 20 x 20 characters -> boxes, labels, scores sorted by x"""
+        characters = []
+        for text, x, y in rows:
+            for offset, label in enumerate(text):
+                characters.append(([x + offset * 22, y, x + offset * 22 + 20, y + 20], label))
+        characters.sort(key=lambda character: character[0][0])
+        return ([box for box, _ in characters], [label for _, label in characters],
+                [0.9] * len(characters))
+
+    def test_two_row_plate_reads_top_row_first(self):
+        plates = group_characters(*self.characters(('DHK', 10, 0), ('1234', 0, 30)))
+
+        self.assertEqual(len(plates), 1)
+        self.assertEqual(plates[0].rows, ['DHK', '1234'])
+        self.assertEqual(plates[0].text, 'DHK1234')
+
+    def test_two_vehicles_in_one_frame_are_separate_plates(self):
+        plates = group_characters(*self.characters(('AB12', 0, 0), ('CD345', 400, 200)))
+
+        self.assertEqual([plate.text for plate in plates], ['AB12', 'CD345'])
+        self.assertEqual(plates[1].box, (400, 200, 508, 220))
+        self.assertEqual(primary_plate(plates).text, 'CD345')
+
+
+def use_temporary_artifacts(test_case):
+    """
+    Give the test fresh artifact writer and detection buffer singletons,
+    writing under a temporary storage root (returned)
+    """
+    root = tempfile.mkdtemp()
+    test_case.addCleanup(shutil.rmtree, root)
+    test_case.addCleanup(detected_plates.clear)
+    storage = FileSystemStorage(location=root, allow_overwrite=True)
+    for target, instance in [('accounts.artifact_writer._writer', ArtifactWriter(storage=storage)),
+                             ('accounts.detection_buffer._buffer', DetectionBuffer(flush_interval_ms=0))]:
+        patcher = patch(target, instance)
+        patcher.start()
+        test_case.addCleanup(patcher.stop)
+        test_case.addCleanup(instance.close)
+    settings_override = override_settings(LICENSE_PLATE_STORAGE_ROOT=root)
+    settings_override.enable()
+    test_case.addCleanup(settings_override.disable)
+    return root
+
+
+class StreamPipelineTests(TransactionTestCase):
+    def setUp(self):
+        self.root = use_temporary_artifacts(self)
+
+    def write_video(self, frame_count):
+        path = os.path.join(self.root, 'gate.avi')
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (160, 120))
+        for frame in synthetic_frames(frame_count, 160, 120):
+            writer.write(frame)
+        writer.release()
+        return path
+
+    def test_video_file_is_processed_to_the_end_and_flushed(self):
+        pipeline = StreamPipeline(StubDetector(), self.write_video(12))
+        self.assertFalse(pipeline.live)
+
+        # Returns on its own once the file ends
+        stats = pipeline.run()
+
+        # Files are read with backpressure, so no frame is dropped
+        self.assertEqual(stats['frames_captured'], 12)
+        self.assertEqual(stats['frames_processed'], 12)
+        self.assertEqual(stats['frames_dropped'], 0)
+        self.assertEqual(stats['detections'], 12)
+
+        # The final flush wrote every row and snapshot before run() returned
+        self.assertEqual(AIDetectedLicense.objects.count(), 12)
+        snapshots = glob.glob(os.path.join(self.root, 'snapshots', '**', '*.jpg'), recursive=True)
+        self.assertEqual(len(snapshots), 12)
+
+    def test_database_outage_does_not_stop_the_stream(self):
+        buffer = DetectionBuffer(batch_size=4, flush_interval_ms=0)
+        self.addCleanup(buffer.close)
+        write = buffer._write
+        failures = []
+
+        def locked_three_times(rows):
+            if len(failures) < 3:
+                failures.append(len(rows))
+                raise OperationalError('database is locked')
+            write(rows)
+
+        buffer._write = locked_three_times
+        with patch('accounts.detection_buffer._buffer', buffer):
+            stats = StreamPipeline(StubDetector(), self.write_video(12)).run()
+
+        self.assertEqual(len(failures), 3)
+        self.assertEqual(stats['detections'], 12)
+        # The rows kept through the outage were written once it ended
+        self.assertEqual(AIDetectedLicense.objects.count(), 12)
+        self.assertEqual(buffer.pending(), 0)
+        self.assertEqual(buffer.dropped, 0)
+
+
+class DetectBatchTests(TestCase):
+    def setUp(self):
+        self.root = use_temporary_artifacts(self)
+
+    def test_results_keep_input_order_and_skip_unreadable_images(self):
+        # Each input has its own width, so results can be matched to inputs
+        def frame(width):
+            return synthetic_frames(1, width, 120)[0]
+
+        def image_file(width):
+            path = os.path.join(self.root, f'input_{width}.jpg')
+            cv2.imwrite(path, frame(width))
+            return path
+
+        missing = os.path.join(self.root, 'missing.jpg')
+        items = [frame(160), image_file(240), missing, frame(200), image_file(280)]
+        detections = StubDetector().detect_batch(items, batch_size=2, save_to_db=False)
+
+        self.assertEqual([detection['source'] for detection in detections],
+                         [None, items[1], missing, None, items[4]])
+        self.assertIn('Could not read image', detections[2]['error'])
+        self.assertEqual(detections[2]['plates'], [])
+
+        for detection, width in zip(detections[:2] + detections[3:], [160, 240, 200, 280]):
+            self.assertIsNone(detection['error'])
+            self.assertTrue(detection['plate_text'])
+            # The stub puts the plate in the middle of the image
+            box = detection['plates'][0]['box']
+            self.assertAlmostEqual((box[0] + box[2]) / 2, width / 2, delta=width * 0.05)
+
+    def test_each_chunk_is_one_model_call(self):
+        model = Mock(wraps=StubModel())
+        detections = StubDetector(model=model).detect_batch(synthetic_frames(10, 160, 120), batch_size=4,
+                                                            save_to_db=False)
+
+        self.assertEqual(len(detections), 10)
+        self.assertEqual([len(call.args[0]) for call in model.call_args_list], [4, 4, 2])
+
+    def test_command_reports_each_chunk_and_keeps_results_of_other_chunks(self):
+        image_dir = os.path.join(self.root, 'images')
+        os.makedirs(image_dir)
+        paths = sorted(generate_images(image_dir, 5, 160, 120))
+        detector = StubDetector()
+        detect_batch = detector.detect_batch
+
+        def fail_second_chunk(chunk, **kwargs):
+            if paths[2] in chunk:
+                raise RuntimeError('model crashed')
+            return detect_batch(chunk, **kwargs)
+
+        detector.detect_batch = Mock(side_effect=fail_second_chunk)
+        stdout = io.StringIO()
+        with patch('accounts.management.commands.detect_license_plates.LicensePlateDetector', return_value=detector):
+            call_command('detect_license_plates', mode='images', path=image_dir, batch_size=2, stdout=stdout)
+
+        self.assertEqual([len(call.args[0]) for call in detector.detect_batch.call_args_list], [2, 2, 1])
+        lines = stdout.getvalue().splitlines()[1:]
+        self.assertEqual([line.split(':')[0] for line in lines],
+                         [f'Processed {paths[0]}', f'Processed {paths[1]}',
+                          f'Error processing {paths[2]}', f'Error processing {paths[3]}',
+                          f'Processed {paths[4]}'])
+        self.assertIn('model crashed', lines[2])
+        self.assertEqual(AIDetectedLicense.objects.count(), 3)
+
+
+@override_settings(LICENSE_PLATE_STORAGE_ROOT='/srv/plates')
+class ArtifactPathTests(SimpleTestCase):
+    def test_paths_in_the_same_second_are_unique(self):
+        timestamp = calendar.timegm((2026, 10, 18, 9, 30, 0))
+        paths = {new_artifact_paths(timestamp) for _ in range(100)}
+
+        self.assertEqual(len(paths), 100)
+        snapshot_path, text_path = paths.pop()
+        self.assertTrue(snapshot_path.startswith(os.path.join('snapshots', '2026', '10', '18', '09', '')))
+        self.assertTrue(text_path.startswith(os.path.join('detected_texts', '2026', '10', '18', '09', '')))
+        # Snapshot and text file share their name
+        self.assertEqual(os.path.splitext(os.path.basename(snapshot_path))[0],
+                         os.path.splitext(os.path.basename(text_path))[0])
+
+    def test_shard_end_across_month_and_year_boundaries(self):
+        def epoch(*parts):
+            return calendar.timegm(parts + (0,) * (6 - len(parts)))
+
+        self.assertEqual(shard_end(['2026']), epoch(2027, 1, 1))
+        self.assertEqual(shard_end(['2026', '12']), epoch(2027, 1, 1))
+        self.assertEqual(shard_end(['2026', '02']), epoch(2026, 3, 1))
+        self.assertEqual(shard_end(['2026', '12', '31']), epoch(2027, 1, 1))
+        self.assertEqual(shard_end(['2024', '02', '29']), epoch(2024, 3, 1))
+        self.assertEqual(shard_end(['2026', '12', '31', '23']), epoch(2027, 1, 1))
+        self.assertEqual(shard_end(['2026', '10', '18', '09']), epoch(2026, 10, 18, 10))
+        self.assertIsNone(shard_end(['tmp']))
+        self.assertIsNone(shard_end(['2026', '13', '01']))
+
+    def test_to_relative_only_strips_the_storage_root(self):
+        self.assertEqual(to_relative('/srv/plates/snapshots/2026/plate.jpg'), os.path.join('snapshots', '2026', 'plate.jpg'))
+        self.assertEqual(to_relative('/mnt/elsewhere/plate.jpg'), '/mnt/elsewhere/plate.jpg')
+
+
+class ModelRegistryTests(SimpleTestCase):
+    def setUp(self):
+        model_registry.reset()
+        self.addCleanup(model_registry.reset)
+        weights = tempfile.NamedTemporaryFile(suffix='.pt', delete=False)
+        weights.close()
+        self.addCleanup(os.remove, weights.name)
+        settings_override = override_settings(LICENSE_PLATE_MODEL_PATH=weights.name, LICENSE_PLATE_INFERENCE_ENGINE='torch',
+                                              LICENSE_PLATE_WARMUP_RUNS=2, LICENSE_PLATE_WARMUP_SIZE=64)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_model_loads_once_and_is_warmed_up(self):
+        model = Mock(return_value=[])
+        with patch('accounts.model_registry.load_backend', return_value=model) as load_backend:
+            self.assertFalse(model_registry.is_ready())
+
+            thread = model_registry.preload(background=True)
+            self.assertTrue(model_registry.wait_until_ready(timeout=5))
+            thread.join()
+            # Later callers, on any thread, share the loaded model
+            threads = [threading.Thread(target=model_registry.get_model) for _ in range(4)]
+            for worker in threads:
+                worker.start()
+            for worker in threads:
+                worker.join()
+
+        self.assertIs(model_registry.get_model(), model)
+        load_backend.assert_called_once_with('torch', model_registry.get_weights_path())
+        # LICENSE_PLATE_WARMUP_RUNS runs on a blank LICENSE_PLATE_WARMUP_SIZE frame
+        self.assertEqual(model.call_count, 2)
+        self.assertEqual(model.call_args.args[0].shape, (64, 64, 3))
+        self.assertTrue(model_registry.is_ready())
+
+
+class ArtifactWriterTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.storage = FileSystemStorage(location=self.root, allow_overwrite=True)
+
+    def test_wide_snapshots_are_downscaled(self):
+        writer = ArtifactWriter(storage=self.storage, max_width=40)
+        self.addCleanup(writer.close)
+        writer.submit(np.zeros((60, 100, 3), dtype=np.uint8), 'wide.jpg')
+        writer.submit(np.zeros((30, 20, 3), dtype=np.uint8), 'narrow.jpg')
+        writer.flush()
+
+        self.assertEqual(cv2.imread(self.storage.path('wide.jpg')).shape, (24, 40, 3))
+        self.assertEqual(cv2.imread(self.storage.path('narrow.jpg')).shape, (30, 20, 3))
+
+    def test_flush_artifacts_waits_for_queued_files(self):
+        writer = ArtifactWriter(storage=self.storage, threads=2)
+        self.addCleanup(writer.close)
+        with patch('accounts.artifact_writer._writer', writer):
+            for index in range(20):
+                writer.submit(np.zeros((48, 64, 3), dtype=np.uint8), f'snapshots/{index}.jpg',
+                              f'AB{index}', os.path.join(self.root, 'detected_texts', f'{index}.txt'))
+            flush_artifacts()
+
+        # Everything is on disk once flush returns, before the writer is closed
+        self.assertEqual(len(os.listdir(os.path.join(self.root, 'snapshots'))), 20)
+        # Text files were renamed into place, with no .tmp left behind
+        self.assertEqual(len(os.listdir(os.path.join(self.root, 'detected_texts'))), 20)
+        with open(os.path.join(self.root, 'detected_texts', '19.txt')) as text_file:
+            self.assertEqual(text_file.read(), 'AB19')
+        self.assertEqual(writer.failures, 0)
+
+    def test_text_is_written_when_the_snapshot_fails(self):
+        writer = ArtifactWriter(storage=self.storage)
+        self.addCleanup(writer.close)
+        text_path = os.path.join(self.root, 'detected_texts', 'plate.txt')
+
+        with patch.object(self.storage, 'save', side_effect=OSError('upload failed')), \
+                self.assertLogs('accounts.artifact_writer', 'ERROR') as logs:
+            writer.submit(np.zeros((48, 64, 3), dtype=np.uint8), 'snapshots/plate.jpg', 'AB12', text_path)
+            writer.flush()
+
+        self.assertEqual(writer.failures, 1)
+        self.assertIn('Failed to write snapshot snapshots/plate.jpg', logs.output[0])
+        with open(text_path) as text_file:
+            self.assertEqual(text_file.read(), 'AB12')
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import RegisterApi, VerifyOTP, LicensePlateAPI, AIDetectedLicenseAPI, VerifyLicensePlateAPI, ImportAIDetectedLicensesAPI
+from .views import RegisterApi, VerifyOTP, LicensePlateAPI, AIDetectedLicenseAPI, VerifyLicensePlateAPI, ImportAIDetectedLicensesAPI, DetectLicensePlateAPI, ExportDetectionsAPI
 
 
 urlpatterns = [
@@ -9,6 +9,8 @@ urlpatterns = [
     # License plate endpoints
     path('license-plates', LicensePlateAPI.as_view(), name='license-plates'),
     path('ai-detected-plates', AIDetectedLicenseAPI.as_view(), name='ai-detected-plates'),
+    path('ai-detected-plates/export', ExportDetectionsAPI.as_view(), name='ai-detected-plates-export'),
     path('verify-plate', VerifyLicensePlateAPI.as_view(), name='verify-plate'),
     path('import-ai-plates', ImportAIDetectedLicensesAPI.as_view(), name='import-ai-plates'),
+    path('detect', DetectLicensePlateAPI.as_view(), name='detect'),
 ]
\ No newline at end of file
@@ -1,16 +1,33 @@
-from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .serializers import UserSerializer, VerifyAccountSerializer, LicensePlateSerializer, AIDetectedLicenseSerializer
+from .serializers import UserSerializer, VerifyAccountSerializer, LicensePlateSerializer
 from .emails import *
 from rest_framework.permissions import IsAuthenticated
 from .models import AIDetectedLicense, LicensePlate
+from .plates import normalize_plate
+from .plate_cache import detected_plates
+from .importer import import_detected_texts, get_default_dirs
+from .pagination import keyset_page, parse_since, InvalidCursor
+from .exporters import EXPORTS, FORMATS, stream_export
+from django.http import HttpResponse, StreamingHttpResponse
+import math
 import os
-from .permissions import IsVerifiedUser
-from django.contrib.auth import login
+from .permissions import IsVerifiedUser, can_save_detections
+from .authentication import resolve_user
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from rest_framework.authtoken.models import Token
+from rest_framework.parsers import MultiPartParser, FormParser
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.db import close_old_connections
+from django.core.files.uploadhandler import MemoryFileUploadHandler
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import time
+from datetime import timedelta
+from django.utils import timezone
+from . import inference_pool
+from . import metrics
 
 # Create your views here.
 @method_decorator(csrf_exempt, name='dispatch')
@@ -123,15 +140,14 @@ class LicensePlateAPI(APIView):
             if not email:
                 return Response({'status': 400, 'message': 'Email is required'})
 
-            try:
-                user = User.objects.get(email=email)
-            except User.DoesNotExist:
+            user = resolve_user(request)
+            if user is None:
                 return Response({'status': 404, 'message': 'User not found'})
 
             serializer = LicensePlateSerializer(data=request.data)
             if serializer.is_valid():
                 plate_number = serializer.validated_data['plate_number'].strip().upper()
-                ai_detected = AIDetectedLicense.objects.filter(plate_number=plate_number).exists()
+                ai_detected = detected_plates.contains(normalize_plate(plate_number))
                 
                 # Save with user and verified
                 license_plate = LicensePlate.objects.create(
@@ -173,9 +189,8 @@ class LicensePlateAPI(APIView):
                     'message': 'Email is required'
                 })
 
-            try:
-                user = User.objects.get(email=email)
-            except User.DoesNotExist:
+            user = resolve_user(request)
+            if user is None:
                 return Response({
                     'status': 404,
                     'message': 'User not found'
@@ -200,16 +215,78 @@ class LicensePlateAPI(APIView):
 class AIDetectedLicenseAPI(APIView):
     permission_classes = [IsVerifiedUser]
     
+    # Fields that may be requested with ?fields=
+    LISTABLE_FIELDS = ['id', 'plate_number', 'detection_timestamp', 'snapshot_path']
+    DEFAULT_LIMIT = 100
+    MAX_LIMIT = 1000
+    
     def get(self, request):
-        """Get all AI detected license plates"""
+        """
+        Get AI detected license plates, one page at a time
+
+        Query parameters:
+            limit         page size (default 100, max 1000)
+            cursor        next_cursor from the previous page
+            since         only detections at or after this ISO 8601 time
+            plate_prefix  only plates whose normalized number starts with this
+            fields        comma separated subset of the listed fields
+        """
         try:
-            detected_plates = AIDetectedLicense.objects.all()
-            serializer = AIDetectedLicenseSerializer(detected_plates, many=True)
+            params = request.query_params
+            
+            fields = self.LISTABLE_FIELDS
+            if params.get('fields'):
+                fields = [field.strip() for field in params['fields'].split(',') if field.strip()]
+                unknown = [field for field in fields if field not in self.LISTABLE_FIELDS]
+                if unknown or not fields:
+                    return Response({
+                        'status': 400,
+                        'message': f'Unknown fields: {", ".join(unknown)}' if unknown else 'No fields requested',
+                    })
+            
+            try:
+                limit = min(int(params.get('limit', self.DEFAULT_LIMIT)), self.MAX_LIMIT)
+                if limit < 1:
+                    raise ValueError
+            except ValueError:
+                return Response({
+                    'status': 400,
+                    'message': 'limit must be a positive integer',
+                })
+            
+            # .values() skips model instantiation and serializer overhead; the
+            # cursor columns are always fetched and dropped again if unwanted
+            query_fields = list(dict.fromkeys(fields + ['id', 'detection_timestamp']))
+            detected_plates = AIDetectedLicense.objects.values(*query_fields)
+            
+            if params.get('since'):
+                try:
+                    detected_plates = detected_plates.filter(detection_timestamp__gte=parse_since(params['since']))
+                except ValueError as e:
+                    return Response({
+                        'status': 400,
+                        'message': str(e),
+                    })
+            
+            if params.get('plate_prefix'):
+                detected_plates = detected_plates.filter(plate_key__startswith=normalize_plate(params['plate_prefix']))
+            
+            try:
+                rows, next_cursor = keyset_page(detected_plates, params.get('cursor'), limit)
+            except InvalidCursor as e:
+                return Response({
+                    'status': 400,
+                    'message': str(e),
+                })
+            
+            if len(query_fields) != len(fields):
+                rows = [{field: row[field] for field in fields} for row in rows]
             
             return Response({
                 'status': 200,
                 'message': 'AI detected license plates retrieved successfully',
-                'data': serializer.data
+                'data': rows,
+                'next_cursor': next_cursor
             })
         
         except Exception as e:
@@ -220,14 +297,94 @@ class AIDetectedLicenseAPI(APIView):
             })
 
 
+class ExportDetectionsAPI(APIView):
+    permission_classes = [IsVerifiedUser]
+    
+    def get(self, request):
+        """
+        Stream every AI detection (or user submitted plate) as NDJSON or CSV
+
+        Query parameters:
+            model   detections (default) or plates
+            output  ndjson (default) or csv (``format`` is taken by DRF)
+            since   only rows at or after this ISO 8601 time
+
+        Plates hold every user's email and submissions, so only staff
+        (authenticated by token) may export them.
+        """
+        try:
+            model_name = request.query_params.get('model', 'detections')
+            export_format = request.query_params.get('output', 'ndjson')
+            
+            if model_name not in EXPORTS or export_format not in FORMATS:
+                return Response({
+                    'status': 400,
+                    'message': f'model must be one of {", ".join(EXPORTS)} and output one of {", ".join(FORMATS)}',
+                })
+
+            if model_name == 'plates' and not request.user.is_staff:
+                return Response({
+                    'status': 403,
+                    'message': 'Permission denied. Only staff can export submitted plates.'
+                })
+            
+            since = None
+            if request.query_params.get('since'):
+                try:
+                    since = parse_since(request.query_params['since'])
+                except ValueError as e:
+                    return Response({
+                        'status': 400,
+                        'message': str(e),
+                    })
+            
+            response = StreamingHttpResponse(
+                stream_export(model_name, export_format, since=since),
+                content_type=FORMATS[export_format],
+            )
+            response['Content-Disposition'] = f'attachment; filename="{model_name}.{export_format}"'
+            return response
+        
+        except Exception as e:
+            return Response({
+                'status': 500,
+                'message': 'Internal Server Error',
+                'error': str(e)
+            })
+
+
+def _detections_in_window(window_start, source):
+    """Detections a time-windowed or per-source verification may match"""
+    detections = AIDetectedLicense.objects.all()
+    if source:
+        detections = detections.filter(source=source)
+    if window_start is not None:
+        detections = detections.filter(detection_timestamp__gte=window_start)
+    return detections
+
+
 class VerifyLicensePlateAPI(APIView):
     #permission_classes = [IsVerifiedUser]
     
     def post(self, request):
-        """Verify if a specific license plate exists in AI detected plates"""
+        """
+        Verify if a specific license plate exists in AI detected plates
+
+        With "fuzzy": true, a plate that is not found exactly is looked up
+        among detected plates within "max_distance" (confusion-weighted, see
+        accounts.plate_fuzzy) and the closest are returned as candidates.
+        Candidates are only suggestions; the plate stays unverified.
+
+        By default any detection ever counts. "within_minutes" only counts
+        detections from the last N minutes and "source" only those from one
+        camera or gate; either is answered from the database with a single
+        range probe on the (plate_key[, source], detection_timestamp) index.
+        """
         try:
             email = request.data.get('email')
             plate_number = request.data.get('plate_number')
+            fuzzy = str(request.data.get('fuzzy', '')).lower() in ('1', 'true')
+            source = request.data.get('source') or ''
             
             if not email:
                 return Response({
@@ -240,11 +397,37 @@ class VerifyLicensePlateAPI(APIView):
                     'status': 400,
                     'message': 'License plate number is required',
                 })
+
+            max_distance = None
+            if fuzzy and request.data.get('max_distance') not in (None, ''):
+                try:
+                    max_distance = float(request.data.get('max_distance'))
+                except (TypeError, ValueError):
+                    max_distance = math.nan
+                if not math.isfinite(max_distance) or max_distance < 0:
+                    return Response({
+                        'status': 400,
+                        'message': 'max_distance must be a non-negative number',
+                    })
+
+            window_start = None
+            if request.data.get('within_minutes') not in (None, ''):
+                try:
+                    within_minutes = float(request.data.get('within_minutes'))
+                    if not math.isfinite(within_minutes) or within_minutes <= 0:
+                        raise ValueError
+                    window_start = timezone.now() - timedelta(minutes=within_minutes)
+                except (TypeError, ValueError, OverflowError):
+                    # Not a number, or a window reaching past year 1
+                    return Response({
+                        'status': 400,
+                        'message': 'within_minutes must be a positive number of minutes',
+                    })
+            windowed = window_start is not None or bool(source)
             
-            # Get the user
-            try:
-                user = User.objects.get(email=email)
-            except User.DoesNotExist:
+            # Get the user (shared with the permission check, if any)
+            user = resolve_user(request)
+            if user is None:
                 return Response({
                     'status': 404,
                     'message': 'User not found',
@@ -253,8 +436,15 @@ class VerifyLicensePlateAPI(APIView):
             # Format plate number (strip spaces and convert to uppercase)
             plate_number = plate_number.strip().upper()
             
-            # Check if the license plate exists in AI detected plates
-            ai_detected = AIDetectedLicense.objects.filter(plate_number=plate_number).exists()
+            plate_key = normalize_plate(plate_number)
+            if windowed:
+                # Not the in-memory set: it holds no timestamps and can trail
+                # other processes' latest detections by a few seconds
+                detections = _detections_in_window(window_start, source)
+                ai_detected = detections.filter(plate_key=plate_key).exists()
+            else:
+                # Check if the license plate exists in AI detected plates (in-memory set)
+                ai_detected = detected_plates.contains(plate_key)
             
             # Store the user's submission regardless of verification result
             license_plate, created = LicensePlate.objects.get_or_create(
@@ -274,6 +464,25 @@ class VerifyLicensePlateAPI(APIView):
                     'message': 'License plate verified successfully',
                     'verified': True
                 })
+            elif fuzzy:
+                limit = getattr(settings, 'LICENSE_PLATE_FUZZY_MAX_CANDIDATES', 5)
+                if windowed:
+                    # Rank among all detected keys, then keep those seen in the window
+                    matches = detected_plates.search(plate_key, max_cost=max_distance)
+                    in_window = set(_detections_in_window(window_start, source)
+                                    .filter(plate_key__in=[key for key, _ in matches])
+                                    .values_list('plate_key', flat=True))
+                    matches = [match for match in matches if match[0] in in_window][:limit]
+                else:
+                    matches = detected_plates.search(plate_key, max_cost=max_distance, limit=limit)
+                candidates = [{'plate_key': key, 'distance': cost} for key, cost in matches]
+                return Response({
+                    'status': 404,
+                    'message': ('License plate not found, but similar plates were detected' if candidates
+                                else 'License plate not found in AI detected plates'),
+                    'verified': False,
+                    'candidates': candidates
+                })
             else:
                 return Response({
                     'status': 404,
@@ -302,11 +511,7 @@ class ImportAIDetectedLicensesAPI(APIView):
                     'message': 'Permission denied. Only staff can import AI detected licenses.'
                 })
             
-            # Get paths from settings or use default
-            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            detected_dir = os.path.join(base_dir, 'detected_texts')
-            snapshot_dir = os.path.join(base_dir, 'snapshots')
-            counter = 0
+            detected_dir, snapshot_dir = get_default_dirs()
             
             if not os.path.exists(detected_dir):
                 return Response({
@@ -314,31 +519,10 @@ class ImportAIDetectedLicensesAPI(APIView):
                     'message': f'Directory {detected_dir} not found'
                 })
             
-            # Get all text files in the detected_texts directory
-            for filename in os.listdir(detected_dir):
-                if filename.endswith('.txt'):
-                    file_path = os.path.join(detected_dir, filename)
-                    
-                    # Extract timestamp from filename
-                    timestamp_str = filename.replace('license_plate_', '').replace('.txt', '')
-                    
-                    # Read the license plate text
-                    with open(file_path, 'r') as file:
-                        plate_number = file.read().strip().upper()
-                    
-                    # Check for corresponding snapshot
-                    snapshot_path = None
-                    snapshot_filename = f'license_plate_{timestamp_str}.jpg'
-                    if os.path.exists(os.path.join(snapshot_dir, snapshot_filename)):
-                        snapshot_path = os.path.join(snapshot_dir, snapshot_filename)
-                    
-                    # Create AI detected license if it doesn't exist already
-                    if plate_number and not AIDetectedLicense.objects.filter(plate_number=plate_number).exists():
-                        AIDetectedLicense.objects.create(
-                            plate_number=plate_number,
-                            snapshot_path=snapshot_path
-                        )
-                        counter += 1
+            # Only files newer than the last import are read
+            full = str(request.data.get('full', '')).lower() in ('1', 'true')
+            result = import_detected_texts(detected_dir, snapshot_dir, full=full)
+            counter = result['imported']
             
             return Response({
                 'status': 200,
@@ -350,4 +534,150 @@ class ImportAIDetectedLicensesAPI(APIView):
                 'status': 500,
                 'message': 'Internal Server Error',
                 'error': str(e)
-            })
\ No newline at end of file
+            })
+
+
+class InMemoryUploadHandler(MemoryFileUploadHandler):
+    """Keep uploaded images in memory whatever their size, never in a temp file"""
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.activated = True
+
+
+def _run_detection(frame, save_to_db, submitted_at):
+    """Runs on an inference worker; returns the detection and its timings"""
+    from .license_detector import LicensePlateDetector
+
+    started_at = time.perf_counter()
+    close_old_connections()
+    try:
+        detection = LicensePlateDetector().detect_frame(frame, save_to_db=save_to_db)
+    finally:
+        close_old_connections()
+    finished_at = time.perf_counter()
+    detection['timing'] = {
+        'queue_ms': round((started_at - submitted_at) * 1000, 2),
+        'inference_ms': round((finished_at - started_at) * 1000, 2),
+    }
+    return detection
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class DetectLicensePlateAPI(APIView):
+    """
+    Detect a license plate in an uploaded image
+
+    Accepts either a multipart upload in the ``image`` field or the raw image
+    bytes as the body (``Content-Type: image/jpeg`` etc). Inference runs on the
+    bounded inference pool; when it is saturated the request is refused with
+    429 rather than queued.
+
+    Detections are saved (``?save=1``, the default) only for staff and
+    device accounts; for other users ``save`` defaults to off and asking
+    for it is refused.
+
+    Like the other endpoints, validation, permission and server errors keep
+    the legacy convention of HTTP 200 with the code in the body's
+    ``status``, which existing clients read. Only 413 (too large), 429 (pool
+    saturated, with Retry-After) and 504 (inference timed out) are also sent
+    as the HTTP status, since proxies and retrying clients act on those.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def initial(self, request, *args, **kwargs):
+        request._request.upload_handlers = [InMemoryUploadHandler(request._request)]
+        super().initial(request, *args, **kwargs)
+
+    def post(self, request):
+        # The detector pulls in OpenCV and the model runtime; import it on the
+        # first detection so workers serving other endpoints never load them
+        from .license_detector import decode_image
+
+        try:
+            received_at = time.perf_counter()
+            save_param = request.query_params.get('save')
+            if save_param in ('0', 'false', 'False'):
+                save_to_db = False
+            else:
+                save_to_db = can_save_detections(request.user)
+                if save_param is not None and not save_to_db:
+                    return Response({
+                        'status': 403,
+                        'message': 'Permission denied. Only staff and device accounts can save detections.'
+                    })
+
+            max_bytes = getattr(settings, 'LICENSE_PLATE_MAX_UPLOAD_BYTES', 10 * 1024 * 1024)
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+            if content_length > max_bytes:
+                return Response({
+                    'status': 413,
+                    'message': f'Image is larger than {max_bytes} bytes',
+                }, status=413)
+
+            # Raw image bytes as the body, otherwise a multipart upload
+            content_type = request.content_type or ''
+            if content_type.startswith('image/') or content_type == 'application/octet-stream':
+                data = request.stream.read() if request.stream else b''
+            else:
+                upload = request.FILES.get('image')
+                if upload is None:
+                    return Response({
+                        'status': 400,
+                        'message': 'An image upload or raw image body is required',
+                    })
+                data = upload.read()
+
+            with metrics.stage_timer('decode'):
+                frame = decode_image(data)
+            if frame is None:
+                return Response({
+                    'status': 400,
+                    'message': 'Could not decode image',
+                })
+            decoded_at = time.perf_counter()
+
+            try:
+                future = inference_pool.submit(_run_detection, frame, save_to_db, decoded_at)
+            except inference_pool.InferencePoolBusy:
+                return Response({
+                    'status': 429,
+                    'message': 'Detection is busy, retry shortly',
+                }, status=429, headers={'Retry-After': '1'})
+
+            timeout = getattr(settings, 'LICENSE_PLATE_INFERENCE_TIMEOUT', 30)
+            try:
+                detection = future.result(timeout=timeout)
+            except FutureTimeoutError:
+                return Response({
+                    'status': 504,
+                    'message': 'Detection timed out',
+                }, status=504)
+
+            detection['timing']['decode_ms'] = round((decoded_at - received_at) * 1000, 2)
+            detection['timing']['total_ms'] = round((time.perf_counter() - received_at) * 1000, 2)
+            detection.pop('source', None)
+            detection.pop('error', None)
+
+            return Response({
+                'status': 200,
+                'message': 'Detection completed',
+                'data': detection
+            })
+
+        except RequestDataTooBig:
+            return Response({
+                'status': 413,
+                'message': 'Image is too large',
+            }, status=413)
+
+        except Exception as e:
+            return Response({
+                'status': 500,
+                'message': 'Internal Server Error',
+                'error': str(e)
+            })
+
+def metrics_view(request):
+    """Stage and request timings in the Prometheus text format"""
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'auth_otp.settings')
 
 application = get_asgi_application()
+
+# Load the detected plate set before the first verify request needs it
+from accounts.plate_cache import detected_plates  # noqa: E402
+
+detected_plates.preload(background=True)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -52,6 +53,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'accounts.middleware.RequestMetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'auth_otp.urls'
@@ -77,12 +79,51 @@ WSGI_APPLICATION = 'auth_otp.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DATABASE_PROFILE=postgres switches from the local SQLite file to Postgres,
+# configured by the POSTGRES_* environment variables
+
+DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'sqlite')
+
+if DATABASE_PROFILE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'auth_otp'),
+            'USER': os.environ.get('POSTGRES_USER', 'postgres'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            # Reuse connections across requests instead of reconnecting
+            'CONN_MAX_AGE': int(os.environ.get('POSTGRES_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if os.environ.get('POSTGRES_POOL_MAX_SIZE'):
+        # psycopg 3 connection pool (needs psycopg[pool]); replaces CONN_MAX_AGE
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('POSTGRES_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ['POSTGRES_POOL_MAX_SIZE']),
+            'timeout': 10,
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # Take the write lock when a transaction starts, so it waits
+                # out busy_timeout instead of failing on a lock upgrade
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
     }
-}
+
+# Every new SQLite connection runs accounts.db.DEFAULT_SQLITE_PRAGMAS (WAL,
+# synchronous=NORMAL, busy_timeout, mmap); set SQLITE_PRAGMAS to override them,
+# or to {} to keep SQLite's defaults. WAL mode is stored in the database file
+# itself, which is one reason db.sqlite3 is not tracked (run migrate to create it).
 
 
 
@@ -138,6 +179,116 @@ DEFAULT_FROM_EMAIL = 'mir.tanim.ahmed98@gmail.com'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication'
+        'accounts.authentication.CachedTokenAuthentication'
     ],
-}
\ No newline at end of file
+}
+
+# Seconds a token's user stays cached in each process (0 disables); saving
+# the user evicts it in the same process straight away
+LICENSE_PLATE_AUTH_CACHE_TTL = 30
+
+# License plate detection
+# The model is loaded lazily once per process by accounts.model_registry
+
+# torch runs best.pt through ultralytics; onnx and openvino run an export
+# made with `manage.py export_model` and need neither torch nor ultralytics
+LICENSE_PLATE_INFERENCE_ENGINE = os.environ.get('LICENSE_PLATE_INFERENCE_ENGINE', 'torch')
+LICENSE_PLATE_MODEL_PATH = BASE_DIR / 'best.pt'
+LICENSE_PLATE_LABELS_PATH = BASE_DIR / 'labels.txt'
+LICENSE_PLATE_WARMUP_RUNS = 1
+LICENSE_PLATE_WARMUP_SIZE = None  # defaults to LICENSE_PLATE_INFERENCE_SIZE or 640
+
+# POST /api/auth/detect runs inference on a bounded pool; requests beyond
+# workers + queue are refused with 429
+LICENSE_PLATE_INFERENCE_WORKERS = 2
+LICENSE_PLATE_INFERENCE_QUEUE = 4
+LICENSE_PLATE_INFERENCE_TIMEOUT = 30
+LICENSE_PLATE_MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+# Besides staff, only members of this group (camera/gate device accounts) may
+# save detections through the detect API
+LICENSE_PLATE_DEVICE_GROUP = 'detection-devices'
+
+# Seconds between incremental refreshes of the in-memory detected plate set
+# (accounts.plate_cache). Deletes and edits reach every worker through the
+# DetectedPlateVersion table at their next refresh.
+LICENSE_PLATE_CACHE_REFRESH = 5.0
+# Each refresh also re-reads rows detected this many seconds before the
+# previous one, catching rows committed out of id order by concurrent writers
+LICENSE_PLATE_CACHE_REFRESH_MARGIN = 60
+
+# Character detections below this confidence are ignored
+LICENSE_PLATE_MIN_CONFIDENCE = 0.25
+
+# Frames are cropped to the source's region of interest and shrunk so their
+# longest side is at most LICENSE_PLATE_INFERENCE_SIZE (a multiple of 32)
+# before inference (accounts.roi). Keys are detect_license_plates --source
+# values; 'default' covers the rest. Ints are pixels, floats frame fractions:
+#   LICENSE_PLATE_ROIS = {'default': (0.0, 0.5, 1.0, 1.0), 'rtsp://gate-1/live': (320, 400, 1600, 1080)}
+LICENSE_PLATE_ROIS = {}
+LICENSE_PLATE_INFERENCE_SIZE = None
+
+# Snapshots and text sidecars are written by a background thread
+# (accounts.artifact_writer)
+LICENSE_PLATE_ARTIFACT_QUEUE_SIZE = 64
+LICENSE_PLATE_SNAPSHOT_JPEG_QUALITY = 90
+LICENSE_PLATE_SNAPSHOT_MAX_WIDTH = None
+LICENSE_PLATE_WRITE_TEXT_FILES = True
+
+# Detection rows are inserted in bulk by a write-behind buffer
+# (accounts.detection_buffer): every LICENSE_PLATE_DB_BATCH_SIZE rows, or once
+# a row has waited LICENSE_PLATE_DB_FLUSH_INTERVAL_MS. While the database
+# cannot be written, at most LICENSE_PLATE_DB_MAX_PENDING rows are kept
+LICENSE_PLATE_DB_BATCH_SIZE = 100
+LICENSE_PLATE_DB_FLUSH_INTERVAL_MS = 500
+LICENSE_PLATE_DB_MAX_PENDING = 10000
+
+# Root for snapshots/ and detected_texts/ (hour-sharded, see
+# accounts.artifact_paths); stored snapshot paths are relative to it
+LICENSE_PLATE_STORAGE_ROOT = BASE_DIR
+
+# Snapshots are saved through the 'snapshots' storage (accounts.storage).
+# Set LICENSE_PLATE_SNAPSHOT_STORAGE=s3 to use an S3-compatible object store
+# instead of the local storage root.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    'snapshots': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {
+            'location': LICENSE_PLATE_STORAGE_ROOT,
+            'allow_overwrite': True,
+        },
+    },
+}
+
+if os.environ.get('LICENSE_PLATE_SNAPSHOT_STORAGE') == 's3':
+    STORAGES['snapshots'] = {
+        'BACKEND': 'accounts.storage.S3CompatibleStorage',
+        'OPTIONS': {
+            'bucket_name': os.environ['LICENSE_PLATE_S3_BUCKET'],
+            'endpoint_url': os.environ.get('LICENSE_PLATE_S3_ENDPOINT_URL'),
+            'access_key': os.environ.get('LICENSE_PLATE_S3_ACCESS_KEY'),
+            'secret_key': os.environ.get('LICENSE_PLATE_S3_SECRET_KEY'),
+            'region_name': os.environ.get('LICENSE_PLATE_S3_REGION'),
+            'location': os.environ.get('LICENSE_PLATE_S3_PREFIX', ''),
+            'max_concurrency': int(os.environ.get('LICENSE_PLATE_S3_MAX_CONCURRENCY', 4)),
+        },
+    }
+
+# Threads uploading snapshots; raise for object stores, where each upload
+# waits on the network
+LICENSE_PLATE_ARTIFACT_WRITER_THREADS = int(os.environ.get('LICENSE_PLATE_ARTIFACT_WRITER_THREADS', 1))
+
+# Detection stage and API request timings are served at /metrics
+# (accounts.metrics); also send them per request in a Server-Timing header
+LICENSE_PLATE_SERVER_TIMING = False
+
+# Fuzzy verification (verify-plate with "fuzzy": true) suggests detected plates
+# within this confusion-weighted edit distance (accounts.plate_fuzzy); an O/0
+# or I/1 swap costs 0.2, any other edit 1
+LICENSE_PLATE_FUZZY_MAX_COST = 1.0
+LICENSE_PLATE_FUZZY_MAX_CANDIDATES = 5
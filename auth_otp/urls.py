@@ -1,7 +1,9 @@
 from django.contrib import admin
 from django.urls import path, include
+from accounts.views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/auth/', include('accounts.urls'))
+    path('api/auth/', include('accounts.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]